@@ -0,0 +1,123 @@
+import os
+import re
+import csv
+import json
+import hashlib
+import threading
+import importlib.util
+
+SAMPLE_BYTES = 64 * 1024
+LAYOUT_CACHE_FILE = "layouts.json"
+LAYOUT_VERSION = 3
+DELIMITERS = ";,\t|"
+CSV_ENGINE = "pyarrow" if importlib.util.find_spec("pyarrow") else "c"
+DOT_DECIMAL = re.compile(r'^-?\d*\.(\d{1,2}|\d{4,})$')
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def find_columns(columns):
+    col_id = next((c for c in columns if any(x in c for x in ['CNPJ', 'REG_ANS', 'ID_OPERADORA'])), None)
+    col_desc = next((c for c in columns if any(x in c for x in ['DESC', 'RAZAO', 'NOME', 'CONTA'])), None)
+    col_valor = next((c for c in columns if any(x in c for x in ['VALOR', 'VL_SALDO', 'VL_EVENTO'])), None)
+    return col_id, col_desc, col_valor
+
+def file_pattern(file_name):
+    return re.sub(r'\d', '#', os.path.basename(file_name).upper())
+
+def read_sample(file_path, zip_ref=None):
+    with (zip_ref.open(file_path) if zip_ref else open(file_path, 'rb')) as f:
+        sample = f.read(SAMPLE_BYTES)
+    end = sample.rfind(b'\n')
+    return sample[:end + 1] if end > 0 else sample
+
+def detect_encoding(sample):
+    if sample.startswith(b'\xef\xbb\xbf'):
+        return 'utf-8-sig'
+    if sample.isascii():
+        return 'latin1'
+    try:
+        sample.decode('utf-8')
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return 'latin1'
+
+def detect_decimal(values):
+    if any(',' in v for v in values):
+        return ','
+    if any(DOT_DECIMAL.match(v.strip()) for v in values):
+        return '.'
+    return None
+
+def detect_layout(sample):
+    encoding = detect_encoding(sample)
+    lines = sample.decode(encoding).splitlines()
+    if not lines:
+        return None
+
+    try:
+        sep = csv.Sniffer().sniff("\n".join(lines[:20]), delimiters=DELIMITERS).delimiter
+    except csv.Error:
+        sep = max(DELIMITERS, key=lines[0].count)
+
+    raw_header = next(csv.reader([lines[0]], delimiter=sep))
+    header = [h.upper().strip() for h in raw_header]
+    col_id, col_desc, col_valor = find_columns(header)
+    if not col_id or not col_valor:
+        return None
+
+    idx_valor = header.index(col_valor)
+    valores = [r[idx_valor] for r in csv.reader(lines[1:], delimiter=sep) if len(r) > idx_valor]
+    decimal = detect_decimal(valores)
+
+    return {
+        'sep': sep,
+        'encoding': encoding,
+        'decimal': decimal,
+        'thousands': '.' if decimal == ',' else None,
+        'col_id': col_id,
+        'col_desc': col_desc,
+        'col_valor': col_valor,
+        'usecols': sorted({header.index(c) for c in (col_id, col_desc, col_valor) if c}),
+        'names': raw_header,
+        'valor_index': idx_valor,
+    }
+
+def _cache_path(temp_dir):
+    return os.path.join(temp_dir, LAYOUT_CACHE_FILE)
+
+def load_cache(temp_dir):
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            try:
+                with open(_cache_path(temp_dir), 'r', encoding='utf-8') as f:
+                    _cache = json.load(f)
+            except (OSError, ValueError):
+                _cache = {}
+        return _cache
+
+def save_cache(temp_dir, key, layout):
+    cache = load_cache(temp_dir)
+    path = _cache_path(temp_dir)
+    with _cache_lock:
+        cache[key] = layout
+        os.makedirs(temp_dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, indent=2)
+        os.replace(tmp_path, path)
+
+def get_layout(file_path, temp_dir, zip_ref=None):
+    sample = read_sample(file_path, zip_ref)
+    header_line = sample.split(b'\n', 1)[0].rstrip(b'\r')
+    key = f"v{LAYOUT_VERSION}|{file_pattern(file_path)}|{hashlib.md5(header_line).hexdigest()}"
+
+    cache = load_cache(temp_dir)
+    if key in cache:
+        return cache[key]
+
+    layout = detect_layout(sample)
+    if layout and layout['decimal']:
+        save_cache(temp_dir, key, layout)
+    return layout
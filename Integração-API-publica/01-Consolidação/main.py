@@ -1,139 +1,651 @@
 import os
+import json
+import glob
+import hashlib
+import argparse
+import shutil
+import codecs
+import threading
 import requests
 import zipfile
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import re
 from bs4 import BeautifulSoup
+from pandas.api.types import union_categoricals
 from urllib.parse import urljoin
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from requests.adapters import HTTPAdapter
+from layout import CSV_ENGINE, find_columns, get_layout
+import relatorio
 
-BASE_URL = "https://dadosabertos.ans.gov.br/FTP/PDA/demonstracoes_contabeis/"
+BASE_URL = os.getenv("ANS_BASE_URL", "https://dadosabertos.ans.gov.br/FTP/PDA/demonstracoes_contabeis/")
 TEMP_DIR = "temp-file"
 OUTPUT_FILE = "consolidado_despesas.csv"
+MANIFEST_FILE = "downloads.json"
+DOWNLOAD_WORKERS = int(os.getenv("DOWNLOAD_WORKERS", "4"))
+CHUNK_SIZE = 1024 * 1024
+MAX_TENTATIVAS = 3
+STREAM_CHUNK_ROWS = int(os.getenv("STREAM_CHUNK_ROWS", "200000"))
+CONSOLIDACAO_WORKERS = int(os.getenv("CONSOLIDACAO_WORKERS", "1"))
+PARQUET_DIR = "consolidado_despesas"
+INGESTAO_MANIFEST = "_ingestao.json"
+COMPACT_DTYPES = {'CNPJ': 'category', 'RazaoSocial': 'category', 'Trimestre': np.int8, 'Ano': np.int16}
+PARQUET_SCHEMA = pa.schema([('CNPJ', pa.string()), ('RazaoSocial', pa.string()), ('ValorDespesas', pa.float64())])
 
-if not os.path.exists(TEMP_DIR):
-    os.makedirs(TEMP_DIR)
+_session = None
+_manifest_lock = threading.Lock()
+
+def get_session():
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=DOWNLOAD_WORKERS, pool_maxsize=DOWNLOAD_WORKERS, max_retries=0)
+        _session.mount("http://", adapter)
+        _session.mount("https://", adapter)
+    return _session
+
+def load_manifest():
+    path = os.path.join(TEMP_DIR, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        relatorio.erro(f"Manifesto de downloads ignorado: {e}")
+        return {}
+
+def update_manifest(manifest, zip_url, entry):
+    path = os.path.join(TEMP_DIR, MANIFEST_FILE)
+    with _manifest_lock:
+        manifest[zip_url] = entry
+        with open(path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(path + ".tmp", path)
+
+def list_zips(year_url):
+    resp = get_session().get(year_url, timeout=30)
+    s = BeautifulSoup(resp.text, 'html.parser')
+    zips = [urljoin(year_url, a['href']) for a in s.find_all('a') 
+            if a['href'].lower().endswith('.zip') and re.search(r'[1-4]\s?T', a['href'].upper())]
+    return sorted(zips, reverse=True)
 
 def get_latest_zips(limit=3):
     try:
-        response = requests.get(BASE_URL, timeout=30)
+        response = get_session().get(BASE_URL, timeout=30)
         soup = BeautifulSoup(response.text, 'html.parser')
 
         years = [urljoin(BASE_URL, a['href']) for a in soup.find_all('a') 
                  if a['href'].endswith('/') and a['href'].strip('/').isdigit()]
+        years = sorted(years, reverse=True)
         
         target_zips = []
-        for year_url in sorted(years, reverse=True):
-            print(f"Verificando ano: {year_url}")
-            resp = requests.get(year_url, timeout=30)
-            s = BeautifulSoup(resp.text, 'html.parser')
-            zips = [urljoin(year_url, a['href']) for a in s.find_all('a') 
-                    if a['href'].lower().endswith('.zip') and re.search(r'[1-4]\s?T', a['href'].upper())]
-        
-            target_zips.extend(sorted(zips, reverse=True))
-            if len(target_zips) >= limit:
-                break
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as executor:
+            for i in range(0, len(years), DOWNLOAD_WORKERS):
+                batch = years[i:i + DOWNLOAD_WORKERS]
+                for year_url, zips in zip(batch, executor.map(list_zips, batch)):
+                    print(f"Verificando ano: {year_url}")
+                    target_zips.extend(zips)
+                if len(target_zips) >= limit:
+                    break
         return target_zips[:limit]
     except Exception as e:
-        print(f"Erro ao buscar arquivos: {e}")
+        relatorio.erro(f"Erro ao buscar arquivos: {e}")
         return []
 
-def download_and_extract_zip(zip_url):
+def range_start(content_range):
+    match = re.match(r"bytes (\d+)-", content_range or "")
+    return int(match.group(1)) if match else None
+
+def download_zip(zip_url, manifest):
+    file_name = zip_url.split('/')[-1]
+    file_path = os.path.join(TEMP_DIR, file_name)
+    part_path = file_path + ".part"
+
+    with relatorio.etapa('download', file_name) as medidas:
+        for tentativa in range(1, MAX_TENTATIVAS + 1):
+            entry = manifest.get(zip_url, {})
+            headers = {}
+            offset = None
+            if os.path.exists(file_path) and entry.get('completo'):
+                if entry.get('etag'):
+                    headers['If-None-Match'] = entry['etag']
+                if entry.get('last_modified'):
+                    headers['If-Modified-Since'] = entry['last_modified']
+            elif os.path.exists(part_path) and (entry.get('etag') or entry.get('last_modified')):
+                offset = os.path.getsize(part_path)
+                headers['Range'] = f"bytes={offset}-"
+                headers['If-Range'] = entry.get('etag') or entry.get('last_modified')
+
+            try:
+                with get_session().get(zip_url, headers=headers, stream=True, timeout=60) as r:
+                    if r.status_code == 304:
+                        print(f"  Sem alterações: {file_name}")
+                        medidas['nao_modificados'] = 1
+                        return file_path
+                    if r.status_code == 416:
+                        os.remove(part_path)
+                        continue
+                    r.raise_for_status()
+
+                    resumed = r.status_code == 206
+                    if resumed and range_start(r.headers.get('Content-Range')) != offset:
+                        if os.path.exists(part_path):
+                            os.remove(part_path)
+                        continue
+                    print(f"  {'Retomando' if resumed else 'Baixando'}: {file_name}")
+                    entry = {
+                        'arquivo': file_name,
+                        'etag': r.headers.get('ETag'),
+                        'last_modified': r.headers.get('Last-Modified'),
+                        'completo': False,
+                    }
+                    update_manifest(manifest, zip_url, entry)
+
+                    with open(part_path, 'ab' if resumed else 'wb') as f:
+                        for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                            f.write(chunk)
+                            medidas['bytes_entrada'] += len(chunk)
+
+                os.replace(part_path, file_path)
+                medidas['bytes_saida'] = os.path.getsize(file_path)
+                update_manifest(manifest, zip_url, {**entry, 'completo': True, 'tamanho': os.path.getsize(file_path)})
+                return file_path
+            except Exception as e:
+                relatorio.erro(f"  Erro no download {zip_url} (tentativa {tentativa}/{MAX_TENTATIVAS}): {e}")
+    return None
+
+def download_zips(zip_urls):
+    os.makedirs(TEMP_DIR, exist_ok=True)
+    manifest = load_manifest()
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as executor:
+        return list(executor.map(lambda u: download_zip(u, manifest), zip_urls))
+
+def extract_zip(file_path, zip_url):
     extracted_files = []
-    try:
-        file_name = zip_url.split('/')[-1]
-        file_path = os.path.join(TEMP_DIR, file_name)
-        
-        print(f"  Baixando: {file_name}")
-        r = requests.get(zip_url, timeout=60)
-        with open(file_path, 'wb') as f:
-            f.write(r.content)
-        
+    with relatorio.etapa('extracao', os.path.basename(file_path)) as medidas:
         try:
+            medidas['bytes_entrada'] = os.path.getsize(file_path)
             with zipfile.ZipFile(file_path, 'r') as zip_ref:
                 zip_ref.extractall(TEMP_DIR)
-                for n in zip_ref.namelist():
-                    extracted_files.append((os.path.join(TEMP_DIR, n), zip_url))
+                for info in zip_ref.infolist():
+                    extracted_files.append((os.path.join(TEMP_DIR, info.filename), zip_url))
+                    medidas['bytes_saida'] += info.file_size
         except Exception as e:
-            print(f"  Erro ao extrair {file_name}: {e}")
-    except Exception as e:
-        print(f"  Erro no download {zip_url}: {e}")
+            relatorio.erro(f"  Erro ao extrair {os.path.basename(file_path)}: {e}")
     return extracted_files
 
-def process_file(file_path, source_url):
+def download_and_extract_zip(zip_url):
+    os.makedirs(TEMP_DIR, exist_ok=True)
+    file_path = download_zip(zip_url, load_manifest())
+    if not file_path:
+        return []
+    return extract_zip(file_path, zip_url)
+
+def extract_period(source_url, file_name):
+    context_text = (source_url + "_" + os.path.basename(file_name)).upper()
+    
+    tri_match = re.search(r'([1-4])\s?T|/([1-4])/', context_text)
+    ano_match = re.search(r'(20\d{2})', context_text)
+    
+    extracted_tri = (tri_match.group(1) or tri_match.group(2)) if tri_match else "1"
+    extracted_ano = ano_match.group(1) if ano_match else "2024"
+    return extracted_tri, extracted_ano
+
+def normalize_chunk(df, extracted_tri, extracted_ano, layout=None):
+    df.columns = [str(c).upper().strip() for c in df.columns]
+    if layout:
+        col_id, col_desc, col_valor = layout['col_id'], layout['col_desc'], layout['col_valor']
+    else:
+        col_id, col_desc, col_valor = find_columns(df.columns)
+
+    if not col_id or not col_valor:
+        relatorio.descartar('colunas_nao_encontradas', len(df))
+        return None
+
+    temp_df = pd.DataFrame()
+    temp_df['CNPJ'] = df[col_id].astype(str).str.replace(r'\D', '', regex=True)
+    temp_df['RazaoSocial'] = df[col_desc].fillna('DESPESA') if col_desc else 'DESPESA'
+    
+    if layout:
+        decimal = '.' if pd.api.types.is_numeric_dtype(df[col_valor]) else layout['decimal']
+        if decimal != ',' and df[col_valor].astype(str).str.contains(',', regex=False).any():
+            decimal = ','
+    else:
+        decimal = ',' if df[col_valor].dtype == object else '.'
+    if decimal == ',':
+        val_str = df[col_valor].astype(str).str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
+        temp_df['ValorDespesas'] = pd.to_numeric(val_str, errors='coerce')
+    else:
+        temp_df['ValorDespesas'] = pd.to_numeric(df[col_valor], errors='coerce')
+
+    invalid = int(temp_df['ValorDespesas'].isna().sum())
+    positive = temp_df['ValorDespesas'] > 0
+    relatorio.descartar('valor_invalido', invalid)
+    relatorio.descartar('valor_nao_positivo', len(temp_df) - int(positive.sum()) - invalid)
+    temp_df = temp_df[positive]
+    temp_df['Trimestre'] = int(extracted_tri)
+    temp_df['Ano'] = int(extracted_ano)
+    return temp_df.astype(COMPACT_DTYPES)
+
+def concat_compact(dfs):
+    for col, dtype in COMPACT_DTYPES.items():
+        if dtype == 'category':
+            categories = union_categoricals([df[col] for df in dfs]).categories
+            for df in dfs:
+                df[col] = df[col].cat.set_categories(categories)
+    return pd.concat(dfs, ignore_index=True)
+
+def memory_report(stage, df):
+    print(f"  Memória ({stage}): {len(df)} linhas, {df.memory_usage(deep=True).sum() / 1024 ** 2:.1f} MB")
+
+def read_file(file_path, zip_ref=None, chunksize=None):
+    if file_path.lower().endswith('.xlsx'):
+        df = pd.read_excel(zip_ref.open(file_path) if zip_ref else file_path)
+        return (iter([df]) if chunksize else df), None
+
+    layout = None
+    try:
+        layout = get_layout(file_path, TEMP_DIR, zip_ref)
+    except Exception as e:
+        relatorio.erro(f"    Layout não detectado para {os.path.basename(file_path)}: {e}")
+
+    source = zip_ref.open(file_path) if zip_ref else file_path
+    if not layout:
+        return pd.read_csv(source, sep=None, engine='python', encoding='latin1', on_bad_lines='skip', chunksize=chunksize), None
+
+    options = dict(sep=layout['sep'], encoding=layout['encoding'], usecols=layout['usecols'], on_bad_lines='skip')
+    if not chunksize and layout['decimal']:
+        try:
+            dtypes = {i: str for i in layout['usecols']}
+            dtypes[layout['valor_index']] = 'float64'
+            return pd.read_csv(source, dtype=dtypes, decimal=layout['decimal'], thousands=layout['thousands'],
+                               float_precision='round_trip', **options), layout
+        except ValueError:
+            if zip_ref:
+                source.close()
+                source = zip_ref.open(file_path)
+
+    engine = 'c' if chunksize else CSV_ENGINE
+    if engine == 'pyarrow':
+        options['usecols'] = [layout['names'][i] for i in layout['usecols']]
+    reader = pd.read_csv(source, dtype=str, engine=engine, chunksize=chunksize, **options)
+    return reader, layout
+
+def source_size(file_path, zip_ref=None):
+    return zip_ref.getinfo(file_path).file_size if zip_ref else os.path.getsize(file_path)
+
+def normalize_file(df, file_path, extracted_tri, extracted_ano, layout):
+    with relatorio.etapa('normalizacao', os.path.basename(file_path)) as medidas:
+        medidas['linhas_entrada'] = len(df)
+        temp_df = normalize_chunk(df, extracted_tri, extracted_ano, layout)
+        medidas['linhas_saida'] = 0 if temp_df is None else len(temp_df)
+    return temp_df
+
+def iter_chunks(file_path, source_url, zip_ref, chunksize):
+    extracted_tri, extracted_ano = extract_period(source_url, file_path)
+    file_name = os.path.basename(file_path)
+    try:
+        with relatorio.etapa('leitura', file_name) as medidas:
+            medidas['bytes_entrada'] = source_size(file_path, zip_ref)
+            reader, layout = read_file(file_path, zip_ref, chunksize)
+            chunks = iter(reader)
+        while True:
+            with relatorio.etapa('leitura', file_name) as medidas:
+                chunk = next(chunks, None)
+                medidas['linhas_saida'] = 0 if chunk is None else len(chunk)
+            if chunk is None:
+                return
+            temp_df = normalize_file(chunk, file_path, extracted_tri, extracted_ano, layout)
+            if temp_df is None:
+                return
+            if not temp_df.empty:
+                yield temp_df
+    except Exception as e:
+        relatorio.erro(f"    Falha na leitura de {file_name}: {e}")
+
+def process_file(file_path, source_url, zip_ref=None, chunksize=None):
     if not file_path.lower().endswith(('.csv', '.txt', '.xlsx')):
         return None
 
+    if chunksize:
+        return iter_chunks(file_path, source_url, zip_ref, chunksize)
+
     try:
-        context_text = (source_url + "_" + os.path.basename(file_path)).upper()
-        
-        tri_match = re.search(r'([1-4])\s?T|/([1-4])/', context_text)
-        ano_match = re.search(r'(20\d{2})', context_text)
-        
-        extracted_tri = (tri_match.group(1) or tri_match.group(2)) if tri_match else "1"
-        extracted_ano = ano_match.group(1) if ano_match else "2024"
+        extracted_tri, extracted_ano = extract_period(source_url, file_path)
 
         try:
-            if file_path.lower().endswith('.xlsx'):
-                df = pd.read_excel(file_path)
-            else:
-                df = pd.read_csv(file_path, sep=None, engine='python', encoding='latin1', on_bad_lines='skip')
+            with relatorio.etapa('leitura', os.path.basename(file_path)) as medidas:
+                medidas['bytes_entrada'] = source_size(file_path, zip_ref)
+                df, layout = read_file(file_path, zip_ref)
+                medidas['linhas_saida'] = len(df)
         except Exception as e:
-            print(f"    Falha na leitura de {os.path.basename(file_path)}: {e}")
+            relatorio.erro(f"    Falha na leitura de {os.path.basename(file_path)}: {e}")
             return None
         
-        df.columns = [str(c).upper().strip() for c in df.columns]
-        
-        col_id = next((c for c in df.columns if any(x in c for x in ['CNPJ', 'REG_ANS', 'ID_OPERADORA'])), None)
-        col_desc = next((c for c in df.columns if any(x in c for x in ['DESC', 'RAZAO', 'NOME', 'CONTA'])), None)
-        col_valor = next((c for c in df.columns if any(x in c for x in ['VALOR', 'VL_SALDO', 'VL_EVENTO'])), None)
+        return normalize_file(df, file_path, extracted_tri, extracted_ano, layout)
+    except Exception as e:
+        relatorio.erro(f"  Erro no processamento {os.path.basename(file_path)}: {e}")
+        return None
 
-        if not col_id or not col_valor:
-            return None
+def write_chunk(chunk, out, header=True, stage='escrita'):
+    with relatorio.etapa(stage) as medidas:
+        start = out.tell()
+        chunk.to_csv(out, sep=';', index=False, header=header)
+        medidas['linhas_entrada'] = medidas['linhas_saida'] = len(chunk)
+        medidas['bytes_saida'] = out.tell() - start
 
-        temp_df = pd.DataFrame()
-        temp_df['CNPJ'] = df[col_id].astype(str).str.replace(r'\D', '', regex=True)
-        temp_df['RazaoSocial'] = df[col_desc].fillna('DESPESA') if col_desc else 'DESPESA'
-        
-        if df[col_valor].dtype == object:
-            val_str = df[col_valor].astype(str).str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
-            temp_df['ValorDespesas'] = pd.to_numeric(val_str, errors='coerce').fillna(0)
+def consolidate_streaming(zip_urls, zip_paths, chunksize=STREAM_CHUNK_ROWS):
+    total = 0
+    with open(OUTPUT_FILE, 'w', encoding='utf-8-sig', newline='') as out:
+        for z_url, z_path in zip(zip_urls, zip_paths):
+            if not z_path:
+                continue
+            try:
+                with zipfile.ZipFile(z_path, 'r') as zip_ref:
+                    for member in zip_ref.namelist():
+                        rows = 0
+                        for chunk in process_file(member, z_url, zip_ref=zip_ref, chunksize=chunksize) or []:
+                            write_chunk(chunk, out, header=(total == 0))
+                            rows += len(chunk)
+                            total += len(chunk)
+                        if rows:
+                            tri, ano = extract_period(z_url, member)
+                            print(f"    + {rows} registros de {os.path.basename(member)} ({tri}T/{ano})")
+            except Exception as e:
+                relatorio.erro(f"  Erro ao ler {os.path.basename(z_path)}: {e}")
+
+    if total == 0:
+        os.remove(OUTPUT_FILE)
+    return total
+
+def consolidate(zip_urls, zip_paths):
+    all_dfs = []
+    for z_url, z_path in zip(zip_urls, zip_paths):
+        if not z_path:
+            continue
+        for f_path, url in extract_zip(z_path, z_url):
+            df = process_file(f_path, url)
+            if df is not None and not df.empty:
+                print(f"    + {len(df)} registros de {os.path.basename(f_path)} ({df['Trimestre'].iloc[0]}T/{df['Ano'].iloc[0]})")
+                all_dfs.append(df)
+
+    if not all_dfs:
+        return 0
+    with relatorio.etapa('merge') as medidas:
+        medidas['linhas_entrada'] = sum(len(df) for df in all_dfs)
+        final_df = concat_compact(all_dfs)
+        medidas['linhas_saida'] = len(final_df)
+    memory_report("consolidado", final_df)
+    with open(OUTPUT_FILE, 'w', encoding='utf-8-sig', newline='') as out:
+        write_chunk(final_df, out)
+    return len(final_df)
+
+def build_jobs(zip_urls, zip_paths, streaming):
+    jobs = []
+    for z_url, z_path in zip(zip_urls, zip_paths):
+        if not z_path:
+            continue
+        if streaming:
+            try:
+                with zipfile.ZipFile(z_path, 'r') as zip_ref:
+                    jobs.extend((z_path, member, z_url) for member in zip_ref.namelist())
+            except Exception as e:
+                relatorio.erro(f"  Erro ao ler {os.path.basename(z_path)}: {e}")
         else:
-            temp_df['ValorDespesas'] = pd.to_numeric(df[col_valor], errors='coerce').fillna(0)
-            
-        temp_df = temp_df[temp_df['ValorDespesas'] > 0]
-        temp_df['Trimestre'] = extracted_tri
-        temp_df['Ano'] = extracted_ano
+            jobs.extend((None, f_path, url) for f_path, url in extract_zip(z_path, z_url))
+    return jobs
 
-        return temp_df
-    except Exception as e:
-        print(f"  Erro no processamento {os.path.basename(file_path)}: {e}")
-        return None
+def process_part(zip_path, file_path, source_url, part_path, chunksize=None):
+    rows = 0
+    with open(part_path, 'w', encoding='utf-8', newline='') as out:
+        if zip_path:
+            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+                for chunk in process_file(file_path, source_url, zip_ref=zip_ref, chunksize=chunksize) or []:
+                    write_chunk(chunk, out, header=(rows == 0), stage='escrita_parte')
+                    rows += len(chunk)
+        else:
+            df = process_file(file_path, source_url)
+            if df is not None and not df.empty:
+                write_chunk(df, out, stage='escrita_parte')
+                rows = len(df)
+    return rows
+
+def merge_parts(part_paths, counts):
+    total = 0
+    with relatorio.etapa('merge') as medidas, open(OUTPUT_FILE, 'wb') as out:
+        out.write(codecs.BOM_UTF8)
+        for part_path, rows in zip(part_paths, counts):
+            if rows:
+                medidas['bytes_entrada'] += os.path.getsize(part_path)
+                with open(part_path, 'rb') as f:
+                    header = f.readline()
+                    if total == 0:
+                        out.write(header)
+                    shutil.copyfileobj(f, out)
+                total += rows
+            if os.path.exists(part_path):
+                os.remove(part_path)
+        medidas['linhas_entrada'] = medidas['linhas_saida'] = total
+        medidas['bytes_saida'] = out.tell()
+
+    if total == 0:
+        os.remove(OUTPUT_FILE)
+    return total
+
+def consolidate_parallel(zip_urls, zip_paths, workers, streaming=False, chunksize=STREAM_CHUNK_ROWS):
+    parts_dir = os.path.join(TEMP_DIR, "parts")
+    os.makedirs(parts_dir, exist_ok=True)
+
+    jobs = build_jobs(zip_urls, zip_paths, streaming)
+    part_paths = [os.path.join(parts_dir, f"part_{i:05d}.csv") for i in range(len(jobs))]
+
+    counts = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(relatorio.isolado, process_part, z_path, f_path, url, part_path, chunksize if streaming else None)
+                   for (z_path, f_path, url), part_path in zip(jobs, part_paths)]
+        for (z_path, f_path, url), future in zip(jobs, futures):
+            try:
+                rows, parcial = future.result()
+                relatorio.incorporar(parcial)
+            except Exception as e:
+                relatorio.erro(f"  Erro no processamento {os.path.basename(f_path)}: {e}")
+                rows = 0
+            if rows:
+                tri, ano = extract_period(url, f_path)
+                print(f"    + {rows} registros de {os.path.basename(f_path)} ({tri}T/{ano})")
+            counts.append(rows)
+
+    return merge_parts(part_paths, counts)
+
+def file_checksum(path):
+    digest = hashlib.sha256()
+    with relatorio.etapa('checksum', os.path.basename(path)) as medidas, open(path, 'rb') as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(block)
+            medidas['bytes_entrada'] += len(block)
+    return digest.hexdigest()
 
-def main():
+def load_ingestion_manifest():
+    path = os.path.join(PARQUET_DIR, INGESTAO_MANIFEST)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_ingestion_manifest(manifest):
+    path = os.path.join(PARQUET_DIR, INGESTAO_MANIFEST)
+    with open(path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+def to_arrow(df):
+    df = df[['CNPJ', 'RazaoSocial', 'ValorDespesas']].astype({'CNPJ': str, 'RazaoSocial': str})
+    return pa.Table.from_pandas(df, schema=PARQUET_SCHEMA, preserve_index=False)
+
+def temp_partition(path):
+    return os.path.join(os.path.dirname(path), f"_{os.path.basename(path)}.tmp")
+
+def ingest_zip(zip_path, zip_url, chunksize=None):
+    stem = os.path.splitext(os.path.basename(zip_path))[0]
+    writers, partitions, rows = {}, {}, 0
+    try:
+        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+            for member in zip_ref.namelist():
+                result = process_file(member, zip_url, zip_ref=zip_ref, chunksize=chunksize)
+                for chunk in (result if chunksize else [result]) or []:
+                    if chunk is None or chunk.empty:
+                        continue
+                    key = (chunk['Ano'].iloc[0], chunk['Trimestre'].iloc[0])
+                    if key not in writers:
+                        part_dir = os.path.join(PARQUET_DIR, f"Ano={key[0]}", f"Trimestre={key[1]}")
+                        os.makedirs(part_dir, exist_ok=True)
+                        partitions[key] = os.path.join(part_dir, f"{stem}.parquet")
+                        writers[key] = pq.ParquetWriter(temp_partition(partitions[key]), PARQUET_SCHEMA)
+                    with relatorio.etapa('escrita', stem) as medidas:
+                        writers[key].write_table(to_arrow(chunk))
+                        medidas['linhas_entrada'] = medidas['linhas_saida'] = len(chunk)
+                    rows += len(chunk)
+    except Exception:
+        for key, writer in writers.items():
+            writer.close()
+            os.remove(temp_partition(partitions[key]))
+        raise
+
+    with relatorio.etapa('escrita', stem) as medidas:
+        for key, writer in writers.items():
+            writer.close()
+            os.replace(temp_partition(partitions[key]), partitions[key])
+            medidas['bytes_saida'] += os.path.getsize(partitions[key])
+    return {
+        'linhas': rows,
+        'periodos': [{'ano': int(a), 'trimestre': int(t)} for a, t in partitions],
+        'particoes': sorted(os.path.relpath(p, PARQUET_DIR) for p in partitions.values()),
+    }
+
+def consolidate_incremental(zip_urls, zip_paths, workers=1, streaming=False, chunksize=STREAM_CHUNK_ROWS):
+    os.makedirs(PARQUET_DIR, exist_ok=True)
+    manifest = load_ingestion_manifest()
+
+    pending = []
+    for z_url, z_path in zip(zip_urls, zip_paths):
+        if not z_path:
+            continue
+        checksum = file_checksum(z_path)
+        entry = manifest.get(z_url)
+        if entry and entry['sha256'] == checksum and all(os.path.exists(os.path.join(PARQUET_DIR, p)) for p in entry['particoes']):
+            print(f"  Já consolidado: {os.path.basename(z_path)}")
+            continue
+        pending.append((z_url, z_path, checksum))
+
+    total = 0
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        futures = [executor.submit(relatorio.isolado, ingest_zip, z_path, z_url, chunksize if streaming else None)
+                   for z_url, z_path, _ in pending] if executor else None
+        for i, (z_url, z_path, checksum) in enumerate(pending):
+            try:
+                if executor:
+                    result, parcial = futures[i].result()
+                    relatorio.incorporar(parcial)
+                else:
+                    result = ingest_zip(z_path, z_url, chunksize if streaming else None)
+            except Exception as e:
+                relatorio.erro(f"  Erro na consolidação de {os.path.basename(z_path)}: {e}")
+                continue
+
+            for old in set(manifest.get(z_url, {}).get('particoes', [])) - set(result['particoes']):
+                old_path = os.path.join(PARQUET_DIR, old)
+                if os.path.exists(old_path):
+                    os.remove(old_path)
+
+            manifest[z_url] = {'arquivo': os.path.basename(z_path), 'sha256': checksum, **result}
+            save_ingestion_manifest(manifest)
+            periodos = ", ".join(f"{p['trimestre']}T/{p['ano']}" for p in result['periodos'])
+            print(f"    + {result['linhas']} registros de {os.path.basename(z_path)} ({periodos})")
+            total += result['linhas']
+    finally:
+        if executor:
+            executor.shutdown()
+    return total
+
+def partition_key(path):
+    ano = re.search(r'Ano=(\d+)', path).group(1)
+    tri = re.search(r'Trimestre=(\d+)', path).group(1)
+    return int(ano), int(tri), os.path.basename(path)
+
+def export_csv():
+    files = sorted(glob.glob(os.path.join(PARQUET_DIR, "Ano=*", "Trimestre=*", "*.parquet")), key=partition_key, reverse=True)
+    total = 0
+    with open(OUTPUT_FILE, 'w', encoding='utf-8-sig', newline='') as out:
+        for path in files:
+            ano, tri, _ = partition_key(path)
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=STREAM_CHUNK_ROWS):
+                df = batch.to_pandas()
+                df['Trimestre'] = tri
+                df['Ano'] = ano
+                write_chunk(df, out, header=(total == 0), stage='exportacao')
+                total += len(df)
+    return total
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Consolidação das demonstrações contábeis da ANS")
+    parser.add_argument("--limit", type=int, default=3, help="Quantidade de trimestres mais recentes")
+    parser.add_argument("--streaming", action="store_true", default=os.getenv("CONSOLIDACAO_STREAMING") == "1",
+                        help="Lê os CSVs direto do ZIP em blocos, sem extrair para o disco")
+    parser.add_argument("--workers", type=int, default=CONSOLIDACAO_WORKERS,
+                        help="Processos usados para processar os arquivos em paralelo")
+    parser.add_argument("--incremental", action="store_true", default=os.getenv("CONSOLIDACAO_INCREMENTAL") == "1",
+                        help=f"Processa apenas trimestres novos ou alterados e grava Parquet particionado em {PARQUET_DIR}/")
+    parser.add_argument("--csv", action="store_true",
+                        help=f"No modo incremental, exporta também o {OUTPUT_FILE} a partir do Parquet")
+    parser.add_argument("--relatorio", help=f"Arquivo JSON do relatório da execução (padrão: {relatorio.RELATORIOS_DIR}/consolidacao-<data>.json)")
+    parser.add_argument("--perfil", default=os.getenv("CONSOLIDACAO_PERFIL"),
+                        help="Grava um perfil cProfile da thread principal neste arquivo e resume as funções mais caras no relatório")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    with relatorio.execucao('consolidacao', vars(args), args.relatorio, args.perfil) as execucao:
+        execucao['linhas'] = run(args)
+
+def run(args):
     print("Iniciando Consolidação de Dados ANS...")
-    zip_urls = get_latest_zips(limit=3)
+    with relatorio.etapa('listagem') as medidas:
+        zip_urls = get_latest_zips(limit=args.limit)
+        medidas['linhas_saida'] = len(zip_urls)
     
     if not zip_urls:
-        print("Nenhum arquivo encontrado.")
-        return
+        relatorio.erro("Nenhum arquivo encontrado.")
+        return 0
 
     print(f"Arquivos para processar: {len(zip_urls)}")
     
-    all_dfs = []
-    for z_url in zip_urls:
-        files = download_and_extract_zip(z_url)
-        for f_path, url in files:
-            df = process_file(f_path, url)
-            if df is not None and not df.empty:
-                print(f"    + {len(df)} registros de {os.path.basename(f_path)} ({df['Trimestre'].iloc[0]}T/{df['Ano'].iloc[0]})")
-                all_dfs.append(df)
+    zip_paths = download_zips(zip_urls)
+
+    if args.incremental:
+        total = consolidate_incremental(zip_urls, zip_paths, args.workers, streaming=args.streaming)
+        print(f"\n{total} novos registros consolidados em {PARQUET_DIR}/")
+        if args.csv:
+            exported = export_csv()
+            print(f"{exported} registros exportados para {OUTPUT_FILE}")
+        return total
+
+    if args.workers > 1:
+        total = consolidate_parallel(zip_urls, zip_paths, args.workers, streaming=args.streaming)
+    elif args.streaming:
+        total = consolidate_streaming(zip_urls, zip_paths)
+    else:
+        total = consolidate(zip_urls, zip_paths)
 
-    if all_dfs:
-        final_df = pd.concat(all_dfs, ignore_index=True)
-        final_df.to_csv(OUTPUT_FILE, sep=';', index=False, encoding='utf-8-sig')
-        print(f"\nSucesso! {len(final_df)} registros salvos em {OUTPUT_FILE}")
+    if total:
+        print(f"\nSucesso! {total} registros salvos em {OUTPUT_FILE}")
     else:
-        print("\nNenhum registro extraído.")
+        relatorio.erro("\nNenhum registro extraído.")
+    return total
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
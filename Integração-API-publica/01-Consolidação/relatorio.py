@@ -0,0 +1,216 @@
+import os
+import json
+import time
+import pstats
+import cProfile
+import platform
+import threading
+import contextlib
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+RELATORIOS_DIR = os.getenv("RELATORIOS_DIR", "relatorios")
+CONTADORES = ('linhas_entrada', 'linhas_saida', 'bytes_entrada', 'bytes_saida')
+TOP_PERFIL = 25
+MAXIMOS = ('pico_rss_mb',)
+PAGINA = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+AMOSTRA_RSS_SEGUNDOS = float(os.getenv("AMOSTRA_RSS_SEGUNDOS", "0.005"))
+
+_lock = threading.Lock()
+_local = threading.local()
+_picos = {}
+_picos_lock = threading.Lock()
+_amostrador = None
+
+def novo_relatorio():
+    return {'etapas': {}, 'arquivos': {}, 'erros': []}
+
+_relatorio = novo_relatorio()
+
+def reiniciar():
+    global _relatorio
+    _relatorio = novo_relatorio()
+    return _relatorio
+
+def pico_rss_mb(filhos=False):
+    if resource is None:
+        return None
+    uso = resource.getrusage(resource.RUSAGE_CHILDREN if filhos else resource.RUSAGE_SELF).ru_maxrss
+    return uso / (1024 ** 2 if platform.system() == 'Darwin' else 1024)
+
+def rss_atual_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * PAGINA / 1024 ** 2
+    except (OSError, ValueError, IndexError):
+        return None
+
+def _amostrar():
+    global _amostrador
+    while True:
+        rss = rss_atual_mb()
+        with _picos_lock:
+            if not _picos:
+                _amostrador = None
+                return
+            for pico in _picos.values():
+                pico[0] = max(pico[0], rss)
+        time.sleep(AMOSTRA_RSS_SEGUNDOS)
+
+def _reiniciar_amostrador():
+    global _picos_lock, _amostrador
+    _picos.clear()
+    _picos_lock = threading.Lock()
+    _amostrador = None
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reiniciar_amostrador)
+
+def abrir_pico():
+    global _amostrador
+    rss = rss_atual_mb()
+    if rss is None:
+        return None
+    pico = [rss]
+    with _picos_lock:
+        _picos[id(pico)] = pico
+        if _amostrador is None:
+            _amostrador = threading.Thread(target=_amostrar, name='relatorio-rss', daemon=True)
+            _amostrador.start()
+    return pico
+
+def fechar_pico(pico):
+    if pico is None:
+        return None
+    with _picos_lock:
+        _picos.pop(id(pico), None)
+    return max(pico[0], rss_atual_mb())
+
+def mesclar(destino, medidas):
+    for chave, valor in medidas.items():
+        if chave == 'descartes':
+            descartes = destino.setdefault('descartes', {})
+            for motivo, linhas in valor.items():
+                descartes[motivo] = descartes.get(motivo, 0) + linhas
+        elif valor is None:
+            continue
+        elif chave in MAXIMOS:
+            destino[chave] = max(destino.get(chave, valor), valor)
+        else:
+            destino[chave] = destino.get(chave, 0) + valor
+
+def registrar(nome, medidas, arquivo=None):
+    with _lock:
+        mesclar(_relatorio['etapas'].setdefault(nome, {}), medidas)
+        if arquivo:
+            mesclar(_relatorio['arquivos'].setdefault(arquivo, {}).setdefault(nome, {}), medidas)
+
+@contextlib.contextmanager
+def etapa(nome, arquivo=None):
+    medidas = {**dict.fromkeys(CONTADORES, 0), 'descartes': {}}
+    pilha = _local.__dict__.setdefault('pilha', [])
+    pilha.append(medidas)
+    inicio, cpu, pico = time.perf_counter(), time.thread_time(), abrir_pico()
+    try:
+        yield medidas
+    finally:
+        pilha.pop()
+        medidas.update(
+            chamadas=1,
+            segundos=time.perf_counter() - inicio,
+            cpu_segundos=time.thread_time() - cpu,
+            pico_rss_mb=fechar_pico(pico),
+        )
+        registrar(nome, medidas, arquivo)
+
+def descartar(motivo, linhas):
+    pilha = getattr(_local, 'pilha', None)
+    if pilha and linhas:
+        descartes = pilha[-1]['descartes']
+        descartes[motivo] = descartes.get(motivo, 0) + int(linhas)
+
+def erro(mensagem):
+    print(mensagem)
+    pilha = getattr(_local, 'pilha', None)
+    if pilha:
+        pilha[-1]['erros'] = pilha[-1].get('erros', 0) + 1
+    with _lock:
+        _relatorio['erros'].append(mensagem.strip())
+
+def isolado(funcao, *args, **kwargs):
+    reiniciar()
+    return funcao(*args, **kwargs), _relatorio
+
+def incorporar(parcial):
+    with _lock:
+        for nome, medidas in parcial['etapas'].items():
+            mesclar(_relatorio['etapas'].setdefault(nome, {}), medidas)
+        for arquivo, etapas in parcial['arquivos'].items():
+            for nome, medidas in etapas.items():
+                mesclar(_relatorio['arquivos'].setdefault(arquivo, {}).setdefault(nome, {}), medidas)
+        _relatorio['erros'].extend(parcial['erros'])
+
+def resumo_perfil(profiler, caminho):
+    profiler.dump_stats(caminho)
+    estatisticas = pstats.Stats(profiler).stats
+    funcoes = sorted(estatisticas.items(), key=lambda item: item[1][3], reverse=True)[:TOP_PERFIL]
+    return {
+        'arquivo': caminho,
+        'funcoes': [
+            {'funcao': f"{os.path.basename(arquivo)}:{linha}({nome})", 'chamadas': nc, 'tottime': tt, 'cumtime': ct}
+            for (arquivo, linha, nome), (_, nc, tt, ct, _) in funcoes
+        ],
+    }
+
+def salvar(relatorio, caminho=None):
+    if caminho is None:
+        os.makedirs(RELATORIOS_DIR, exist_ok=True)
+        carimbo = datetime.now().strftime("%Y%m%d-%H%M%S")
+        caminho = os.path.join(RELATORIOS_DIR, f"{relatorio['script']}-{carimbo}.json")
+    with open(caminho, 'w', encoding='utf-8') as f:
+        json.dump(relatorio, f, indent=2, ensure_ascii=False)
+    return caminho
+
+@contextlib.contextmanager
+def execucao(script, parametros=None, caminho=None, perfil=None):
+    relatorio = reiniciar()
+    relatorio.update({
+        'script': script,
+        'parametros': parametros or {},
+        'inicio': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'status': 'ok',
+    })
+    profiler = cProfile.Profile() if perfil else None
+    inicio, cpu = time.perf_counter(), time.process_time()
+    filhos = resource.getrusage(resource.RUSAGE_CHILDREN) if resource else None
+    if profiler:
+        profiler.enable()
+    try:
+        yield relatorio
+    except BaseException as e:
+        relatorio['status'] = 'falha'
+        relatorio['erros'].append(f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        if profiler:
+            profiler.disable()
+            relatorio['perfil'] = resumo_perfil(profiler, perfil)
+        if relatorio['status'] == 'ok' and relatorio['erros']:
+            relatorio['status'] = 'com_erros'
+        relatorio.update({
+            'fim': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'segundos': time.perf_counter() - inicio,
+            'cpu_segundos': time.process_time() - cpu,
+            'pico_rss_mb': pico_rss_mb(),
+        })
+        if resource:
+            uso = resource.getrusage(resource.RUSAGE_CHILDREN)
+            relatorio['cpu_segundos_filhos'] = uso.ru_utime + uso.ru_stime - filhos.ru_utime - filhos.ru_stime
+            relatorio['pico_rss_filhos_mb'] = pico_rss_mb(filhos=True)
+        print(f"Relatório de execução: {salvar(relatorio, caminho)}")
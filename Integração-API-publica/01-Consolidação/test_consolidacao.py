@@ -0,0 +1,274 @@
+import os
+import io
+import hashlib
+import zipfile
+import threading
+import time
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import main
+import layout
+
+CSV_ANS = (
+    '"DATA";"REG_ANS";"CD_CONTA_CONTABIL";"DESCRICAO";"VL_SALDO_INICIAL";"VL_SALDO_FINAL"\n'
+    '"2025-07-01";"344915";"1277";"EVENTOS INDENIZÁVEIS";"1798,00";"2000,00"\n'
+    '"2025-07-01";"326305";"411";"DESPESAS ASSISTENCIAIS";"1.234.567,89";"0,00"\n'
+    '"2025-07-01";"326305";"412";"ESTORNO";"0,00";"10,00"\n'
+)
+
+
+class ANSHandler(SimpleHTTPRequestHandler):
+    requests_log = []
+    content_range_shift = 0
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        path = self.translate_path(self.path)
+        if os.path.isdir(path):
+            return super().do_GET()
+
+        with open(path, 'rb') as f:
+            body = f.read()
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        self.requests_log.append((self.path, dict(self.headers)))
+
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        start = 0
+        range_header = self.headers.get('Range')
+        if range_header and self.headers.get('If-Range', etag) == etag:
+            start = int(range_header.split('=')[1].rstrip('-'))
+            self.send_response(206)
+            self.send_header('Content-Range', f"bytes {start + self.content_range_shift}-{len(body) - 1}/{len(body)}")
+        else:
+            self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body) - start))
+        self.end_headers()
+        self.wfile.write(body[start:])
+
+
+def make_zip(path, name, content):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as z:
+        z.writestr(name, content.encode('latin1'))
+    path.write_bytes(buffer.getvalue())
+
+
+@pytest.fixture
+def ans_server(tmp_path, monkeypatch):
+    root = tmp_path / "site"
+    for ano in ("2024", "2025"):
+        (root / ano).mkdir(parents=True)
+        for tri in ("1", "2", "3"):
+            make_zip(root / ano / f"{tri}T{ano}.zip", f"{tri}T{ano}.csv", CSV_ANS)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(ANSHandler, directory=str(root)))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    ANSHandler.requests_log = []
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(main, "BASE_URL", f"http://127.0.0.1:{server.server_address[1]}/")
+    yield root
+    server.shutdown()
+
+
+def test_get_latest_zips_orders_by_year_and_quarter(ans_server):
+    zips = main.get_latest_zips(limit=4)
+    assert [z.split('/')[-1] for z in zips] == ["3T2025.zip", "2T2025.zip", "1T2025.zip", "3T2024.zip"]
+
+
+def test_download_skips_unchanged_archives(ans_server):
+    urls = main.get_latest_zips(limit=2)
+    first = main.download_zips(urls)
+    assert all(os.path.exists(p) for p in first)
+
+    ANSHandler.requests_log = []
+    second = main.download_zips(urls)
+    assert second == first
+    assert len(ANSHandler.requests_log) == 2
+    assert all('If-None-Match' in headers for _, headers in ANSHandler.requests_log)
+
+
+def test_download_resumes_partial_file(ans_server):
+    url = main.get_latest_zips(limit=1)[0]
+    expected = (ans_server / "2025" / "3T2025.zip").read_bytes()
+    etag = '"' + hashlib.md5(expected).hexdigest() + '"'
+
+    os.makedirs(main.TEMP_DIR, exist_ok=True)
+    part_path = os.path.join(main.TEMP_DIR, "3T2025.zip.part")
+    with open(part_path, 'wb') as f:
+        f.write(expected[:100])
+    manifest = {url: {'arquivo': "3T2025.zip", 'etag': etag, 'last_modified': None, 'completo': False}}
+
+    ANSHandler.requests_log = []
+    path = main.download_zip(url, manifest)
+
+    with open(path, 'rb') as f:
+        assert f.read() == expected
+    assert ANSHandler.requests_log[0][1]['Range'] == "bytes=100-"
+    assert manifest[url]['completo']
+
+
+def test_download_restarts_when_content_range_does_not_match_partial_file(ans_server, monkeypatch):
+    url = main.get_latest_zips(limit=1)[0]
+    expected = (ans_server / "2025" / "3T2025.zip").read_bytes()
+    etag = '"' + hashlib.md5(expected).hexdigest() + '"'
+
+    os.makedirs(main.TEMP_DIR, exist_ok=True)
+    with open(os.path.join(main.TEMP_DIR, "3T2025.zip.part"), 'wb') as f:
+        f.write(expected[:100])
+    manifest = {url: {'arquivo': "3T2025.zip", 'etag': etag, 'last_modified': None, 'completo': False}}
+
+    monkeypatch.setattr(ANSHandler, "content_range_shift", 10)
+    ANSHandler.requests_log = []
+    path = main.download_zip(url, manifest)
+
+    with open(path, 'rb') as f:
+        assert f.read() == expected
+    assert [headers.get('Range') for _, headers in ANSHandler.requests_log] == ["bytes=100-", None]
+    assert main.get_session().get_adapter(url).max_retries.total == 0
+
+
+def test_streaming_matches_extracted_consolidation(ans_server):
+    urls = main.get_latest_zips(limit=3)
+    paths = main.download_zips(urls)
+
+    assert main.consolidate(urls, paths) == 6
+    with open(main.OUTPUT_FILE, 'rb') as f:
+        expected = f.read()
+
+    assert main.consolidate_streaming(urls, paths, chunksize=1) == 6
+    with open(main.OUTPUT_FILE, 'rb') as f:
+        assert f.read() == expected
+
+
+
+def test_chunks_use_compact_dtypes():
+    df = main.normalize_chunk(main.pd.read_csv(io.StringIO(CSV_ANS), sep=';', dtype=str), "3", "2025")
+
+    assert df.dtypes.to_dict() == {
+        'CNPJ': 'category', 'RazaoSocial': 'category', 'ValorDespesas': 'float64', 'Trimestre': 'int8', 'Ano': 'int16',
+    }
+    assert df.to_csv(sep=';', index=False).splitlines() == [
+        "CNPJ;RazaoSocial;ValorDespesas;Trimestre;Ano",
+        "344915;1277;1798.0;3;2025",
+        "326305;411;1234567.89;3;2025",
+    ]
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_parallel_matches_serial_consolidation(ans_server, streaming):
+    urls = main.get_latest_zips(limit=5)
+    paths = main.download_zips(urls)
+
+    main.consolidate(urls, paths)
+    with open(main.OUTPUT_FILE, 'rb') as f:
+        expected = f.read()
+
+    assert main.consolidate_parallel(urls, paths, workers=3, streaming=streaming, chunksize=1) == 10
+    with open(main.OUTPUT_FILE, 'rb') as f:
+        assert f.read() == expected
+
+
+def test_layout_detection_is_cached_per_pattern_and_header(tmp_path, monkeypatch):
+    monkeypatch.setattr(layout, "_cache", None)
+    (tmp_path / "1T2025.csv").write_bytes(CSV_ANS.encode('latin1'))
+    (tmp_path / "2T2025.csv").write_bytes(CSV_ANS.encode('latin1'))
+
+    detected = layout.get_layout(str(tmp_path / "1T2025.csv"), str(tmp_path))
+    assert detected['sep'] == ';'
+    assert detected['encoding'] == 'latin1'
+    assert detected['decimal'] == ','
+    assert (detected['col_id'], detected['col_desc'], detected['col_valor']) == ("REG_ANS", "CD_CONTA_CONTABIL", "VL_SALDO_INICIAL")
+    assert detected['usecols'] == [1, 2, 4]
+
+    monkeypatch.setattr(layout, "detect_layout", lambda sample: pytest.fail("layout should come from cache"))
+    assert layout.get_layout(str(tmp_path / "2T2025.csv"), str(tmp_path)) == detected
+
+
+def test_ambiguous_decimal_is_not_cached_and_decided_per_chunk(tmp_path, monkeypatch):
+    monkeypatch.setattr(layout, "_cache", None)
+    monkeypatch.setattr(main, "TEMP_DIR", str(tmp_path))
+    header = '"DATA";"REG_ANS";"CD_CONTA_CONTABIL";"DESCRICAO";"VL_SALDO_INICIAL";"VL_SALDO_FINAL"\n'
+    inteiros = '"2025-01-01";"344915";"411";"DESPESAS";"1798";"0"\n' * 4000
+    (tmp_path / "1T2025.csv").write_bytes((header + inteiros + '"2025-01-01";"344915";"411";"DESPESAS";"1234.5";"0"\n').encode('latin1'))
+    (tmp_path / "2T2025.csv").write_bytes((header + inteiros + '"2025-04-01";"344915";"411";"DESPESAS";"1.234,56";"0"\n').encode('latin1'))
+
+    assert layout.get_layout(str(tmp_path / "1T2025.csv"), str(tmp_path))['decimal'] is None
+    assert layout.load_cache(str(tmp_path)) == {}
+    assert layout.detect_decimal(["1234.56", "10"]) == '.'
+    assert layout.detect_decimal(["1.234,56"]) == ','
+
+    for nome, esperado in (("1T2025.csv", 1234.5), ("2T2025.csv", 1234.56)):
+        df = main.process_file(str(tmp_path / nome), "http://ans/2025/x.zip")
+        assert len(df) == 4001 and df['ValorDespesas'].iloc[-1] == esperado
+        chunks = list(main.process_file(str(tmp_path / nome), "http://ans/2025/x.zip", chunksize=1000))
+        assert sum(len(c) for c in chunks) == 4001 and chunks[-1]['ValorDespesas'].iloc[-1] == esperado
+
+
+def test_incremental_only_ingests_new_or_changed_quarters(ans_server):
+    urls = main.get_latest_zips(limit=3)
+    paths = main.download_zips(urls)
+    main.consolidate(urls, paths)
+    with open(main.OUTPUT_FILE, 'rb') as f:
+        expected = f.read()
+
+    assert main.consolidate_incremental(urls, paths) == 6
+    particao = os.path.join(main.PARQUET_DIR, "Ano=2025", "Trimestre=3", "3T2025.parquet")
+    assert os.path.exists(particao)
+    assert os.listdir(os.path.dirname(particao)) == ["3T2025.parquet"]
+    assert os.path.basename(main.temp_partition(particao)).startswith("_")
+    assert main.export_csv() == 6
+    with open(main.OUTPUT_FILE, 'rb') as f:
+        assert f.read() == expected
+
+    assert main.consolidate_incremental(urls, paths) == 0
+
+    make_zip(ans_server / "2025" / "2T2025.zip", "2T2025.csv", CSV_ANS.replace("1798,00", "1800,00"))
+    paths = main.download_zips(urls)
+    assert main.consolidate_incremental(urls, paths) == 2
+
+    manifest = main.load_ingestion_manifest()
+    assert manifest[urls[1]]['periodos'] == [{'ano': 2025, 'trimestre': 2}]
+    assert manifest[urls[1]]['sha256'] == main.file_checksum(paths[1])
+
+
+def test_run_report_tracks_stages_rows_and_drops(ans_server):
+    main.main(["--limit", "2", "--workers", "2", "--streaming", "--relatorio", "execucao.json"])
+
+    with open("execucao.json", encoding='utf-8') as f:
+        report = main.json.load(f)
+
+    assert report['status'] == 'ok' and report['linhas'] == 4
+    etapas = report['etapas']
+    assert {'listagem', 'download', 'leitura', 'normalizacao', 'escrita_parte', 'merge'} <= set(etapas)
+    assert etapas['download']['bytes_entrada'] == sum((ans_server / "2025" / f"{t}T2025.zip").stat().st_size for t in (2, 3))
+    assert etapas['normalizacao']['linhas_entrada'] == 6
+    assert etapas['normalizacao']['linhas_saida'] == 4
+    assert etapas['normalizacao']['descartes'] == {'valor_nao_positivo': 2}
+    assert etapas['merge']['linhas_saida'] == 4
+    assert etapas['merge']['bytes_saida'] == os.path.getsize(main.OUTPUT_FILE)
+    assert report['arquivos']['3T2025.csv']['normalizacao']['linhas_saida'] == 2
+    assert all(e['pico_rss_mb'] > 0 and e['segundos'] >= 0 for e in etapas.values())
+
+
+def test_stage_peak_rss_captures_memory_freed_before_the_stage_ends():
+    relatorio = main.relatorio
+    relatorio.reiniciar()
+    antes = relatorio.rss_atual_mb()
+    with relatorio.etapa('alocacao'):
+        bloco = b'\x01' * (128 * 1024 ** 2)
+        time.sleep(0.05)
+        del bloco
+
+    assert relatorio.rss_atual_mb() < antes + 64
+    assert relatorio._relatorio['etapas']['alocacao']['pico_rss_mb'] >= antes + 100
@@ -0,0 +1,10 @@
+import os
+import sys
+import importlib.util
+
+ORIGEM = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "01-Consolidação", "relatorio.py")
+
+_spec = importlib.util.spec_from_file_location(__name__, ORIGEM)
+_modulo = importlib.util.module_from_spec(_spec)
+sys.modules[__name__] = _modulo
+_spec.loader.exec_module(_modulo)
@@ -0,0 +1,145 @@
+import os
+import json
+import sys
+
+import pandas as pd
+import pytest
+import validacao
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_validar_cnpj_lote_matches_validar_cnpj_on_cadastro():
+    cadastro = pd.read_csv(os.path.join(BASE_DIR, "cadastro_operadoras.csv"), sep=';', dtype=str)
+    valores = pd.concat([cadastro['CNPJ'], cadastro['REGISTRO_OPERADORA']], ignore_index=True)
+
+    esperado = valores.apply(validacao.validar_cnpj)
+    assert esperado.any()
+    assert validacao.validar_cnpj_lote(valores).tolist() == esperado.tolist()
+
+
+@pytest.mark.parametrize("valor", [
+    "19541931000125", "19.541.931/0001-25", '"22869997000153"', "22869997000154",
+    "11111111111111", "00000000000000", "", "191", "344915", "123456789012345",
+    "12A45678000199", "+1954193100012", float("nan"), None, 19541931000125, "١٩٥٤١٩٣١٠٠٠١٢٥",
+])
+def test_validar_cnpj_lote_matches_validar_cnpj_on_edge_cases(valor):
+    assert validacao.validar_cnpj_lote([valor]).tolist() == [validacao.validar_cnpj(valor)]
+
+
+def test_enriquecer_operadoras_resolve_cnpj_before_registro(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / validacao.CADASTRO_CSV).write_text(
+        'REGISTRO_OPERADORA;CNPJ;Razao_Social;Modalidade;UF\n'
+        '"419761";"19541931000125";"OPERADORA A";"Cooperativa Médica";"MG"\n'
+        '"421545";"22869997000153";"OPERADORA B";"Odontologia de Grupo";"SP"\n',
+        encoding='latin1',
+    )
+    df = pd.DataFrame({'VALOR_LIMPO': ["421545", "19541931000125", "999999"], 'ValorDespesas': [1.0, 2.0, 3.0]})
+
+    df_cad, indice = validacao.carregar_indice_cadastro()
+    resultado = validacao.enriquecer_operadoras(df, df_cad, indice)
+
+    assert resultado['RAZAO_SOCIAL'].tolist()[:2] == ["OPERADORA B", "OPERADORA A"]
+    assert resultado['RAZAO_SOCIAL'].isna().tolist() == [False, False, True]
+    assert resultado['ValorDespesas'].tolist() == [1.0, 2.0, 3.0]
+
+    monkeypatch.setattr(validacao, "construir_indice_cadastro", lambda: pytest.fail("index should come from disk"))
+    _, indice_salvo = validacao.carregar_indice_cadastro()
+    assert indice_salvo.equals(indice)
+
+
+def test_limpar_identificadores_keeps_categories_and_validation():
+    valores = pd.Series(["19.541.931/0001-25", "344915", "19.541.931/0001-25", None, "344915"])
+
+    limpos, validos = validacao.limpar_identificadores(valores)
+
+    assert limpos.dtype == 'category'
+    assert limpos.tolist() == ["19541931000125", "344915", "19541931000125", "", "344915"]
+    assert validos.tolist() == validacao.validar_cnpj_lote(valores.astype(str)).tolist()
+
+
+def test_processar_transformacao_uses_integer_cents(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / validacao.CADASTRO_CSV).write_text(
+        'REGISTRO_OPERADORA;CNPJ;Razao_Social;Modalidade;UF\n'
+        '"419761";"19541931000125";"OPERADORA A";"Cooperativa Médica";"MG"\n',
+        encoding='latin1',
+    )
+    (tmp_path / validacao.CONSOLIDADO_CSV).write_text(
+        'CNPJ;RazaoSocial;ValorDespesas;Trimestre;Ano\n'
+        + '419761;411;0.1;1;2025\n' * 3 + '419761;411;0.3;2;2025\n',
+        encoding='utf-8-sig',
+    )
+
+    validacao.processar_transformacao()
+
+    agregadas = pd.read_csv(validacao.RESULTADO_FINAL, sep=';', encoding='utf-8-sig')
+    assert agregadas[['RegistroANS', 'TotalDespesas', 'MediaTrimestral', 'DesvioPadrao']].values.tolist() == [
+        [419761.0, 0.6, 0.3, 0.0],
+    ]
+
+
+@pytest.mark.parametrize("parquet", [False, True])
+def test_streaming_matches_in_memory_aggregation(tmp_path, monkeypatch, parquet):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / validacao.CADASTRO_CSV).write_text(
+        'REGISTRO_OPERADORA;CNPJ;Razao_Social;Modalidade;UF\n'
+        '"419761";"19541931000125";"OPERADORA A";"Cooperativa Médica";"MG"\n'
+        '"421545";"22869997000153";"OPERADORA B";"Odontologia de Grupo";"SP"\n',
+        encoding='latin1',
+    )
+    consolidado = pd.DataFrame({
+        'CNPJ': ["419761", "22869997000153", "999999", "419761", "421545", "419761", "421545", "419761"],
+        'RazaoSocial': ["411"] * 8,
+        'ValorDespesas': [1798.0, 0.1, 5.0, 1234567.89, 0.2, 0.1, 0.3, 10.5],
+        'Trimestre': [1, 1, 1, 2, 2, 3, 3, 3],
+        'Ano': [2024, 2024, 2024, 2024, 2024, 2025, 2025, 2025],
+    })
+    if parquet:
+        consolidado.to_parquet(tmp_path / validacao.CONSOLIDADO_PARQUET, partition_cols=['Ano', 'Trimestre'])
+    else:
+        consolidado.to_csv(tmp_path / validacao.CONSOLIDADO_CSV, sep=';', index=False, encoding='utf-8-sig')
+
+    resultados = {}
+    for streaming in (False, True):
+        validacao.processar_transformacao(streaming=streaming, chunksize=1)
+        resultados[streaming] = (
+            pd.read_csv(validacao.RESULTADO_FINAL, sep=';', encoding='utf-8-sig'),
+            (tmp_path / validacao.FIX_CONSOLIDADO).read_bytes(),
+        )
+
+    agregado, fix = resultados[False]
+    assert len(agregado) == 3
+    assert resultados[True][1] == fix
+    pd.testing.assert_frame_equal(resultados[True][0], agregado, check_exact=False, rtol=1e-12)
+
+
+def test_run_report_counts_rows_and_drops_per_stage(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / validacao.CADASTRO_CSV).write_text(
+        'REGISTRO_OPERADORA;CNPJ;Razao_Social;Modalidade;UF\n'
+        '"419761";"19541931000125";"OPERADORA A";"Cooperativa Médica";"MG"\n',
+        encoding='latin1',
+    )
+    (tmp_path / validacao.CONSOLIDADO_CSV).write_text(
+        'CNPJ;RazaoSocial;ValorDespesas;Trimestre;Ano\n'
+        '419761;411;10.0;1;2025\n419761;411;0;1;2025\n419761;;5.0;1;2025\n999999;411;1.0;2;2025\n419761;411;3.0;1;2024\n',
+        encoding='utf-8-sig',
+    )
+
+    assert not any('Consolida' in p for p in sys.path) and 'layout' not in sys.modules
+    with validacao.relatorio.execucao('validacao', caminho="execucao.json"):
+        validacao.processar_transformacao(anos=["2025"], streaming=True, chunksize=2)
+
+    with open("execucao.json", encoding='utf-8') as f:
+        report = json.load(f)
+    etapas = report['etapas']
+    assert report['status'] == 'ok'
+    assert etapas['leitura']['linhas_entrada'] == 5 and etapas['leitura']['linhas_saida'] == 4
+    assert etapas['leitura']['descartes'] == {'fora_do_periodo': 1}
+    assert etapas['leitura']['bytes_entrada'] == os.path.getsize(validacao.CONSOLIDADO_CSV)
+    assert etapas['limpeza']['descartes'] == {'valor_nao_positivo': 1, 'razao_social_vazia': 1}
+    assert etapas['enriquecimento']['linhas_saida'] == 2 and etapas['enriquecimento']['sem_cadastro'] == 1
+    assert etapas['escrita']['bytes_saida'] == sum(os.path.getsize(a) for a in (validacao.FIX_CONSOLIDADO, validacao.RESULTADO_FINAL))
+    assert report['arquivos'][validacao.RESULTADO_FINAL]['escrita']['linhas_saida'] == 2
@@ -1,11 +1,28 @@
+import numpy as np
 import pandas as pd
+import pyarrow.dataset as ds
 import requests
+import argparse
+import hashlib
 import os
+import relatorio
 
 CONSOLIDADO_CSV = "consolidado_despesas.csv"
+CONSOLIDADO_PARQUET = "consolidado_despesas"
 OPERADORAS_URL = "https://dadosabertos.ans.gov.br/FTP/PDA/operadoras_de_plano_de_saude_ativas/Relatorio_cadop.csv"
 CADASTRO_CSV = "cadastro_operadoras.csv"
 RESULTADO_FINAL = "despesas_agregadas.csv"
+FIX_CONSOLIDADO = "fix_consolidado.csv"
+INDICE_CADASTRO = "cadastro_indice.pkl"
+COLUNAS_CADASTRO = ['CNPJ_KEY', 'REG_KEY', 'REGISTRO_OPERADORA', 'MODALIDADE', 'UF', 'RAZAO_SOCIAL']
+TIPOS_CADASTRO = {'CNPJ_KEY': 'category', 'REG_KEY': 'category', 'REGISTRO_OPERADORA': 'Int32', 'MODALIDADE': 'category', 'UF': 'category', 'RAZAO_SOCIAL': 'category'}
+TIPOS_PERIODO = {'Trimestre': 'int8', 'Ano': 'int16'}
+VERSAO_INDICE = "2"
+STREAM_CHUNK_ROWS = int(os.getenv("STREAM_CHUNK_ROWS", "200000"))
+CHAVES_OPERADORA = ['RegistroANS', 'RAZAO_SOCIAL', 'UF']
+COLUNAS_FIX = ['CNPJ_KEY', 'RegistroANS', 'Trimestre', 'Ano', 'ValorDespesas', 'RazaoSocial']
+PESOS_CNPJ_1 = np.array([5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2])
+PESOS_CNPJ_2 = np.array([6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2])
 
 def validar_cnpj(valor):
     cnpj = str(valor).replace('.', '').replace('-', '').replace('/', '').replace(' ', '').replace('"', '').zfill(14)
@@ -23,74 +40,346 @@ def validar_cnpj(valor):
     except: return False
     return True
 
+def digito_verificador(digitos, pesos):
+    resto = (digitos @ pesos) % 11
+    return np.where(resto < 2, 0, 11 - resto)
+
+def validar_cnpj_lote(valores):
+    textos = pd.Series(valores).astype(str)
+    codigos = textos.to_numpy(dtype=str)
+    matriz = codigos.view(np.uint32).reshape(len(codigos), codigos.dtype.itemsize // 4)
+
+    com_pontuacao = np.isin(matriz, [ord(c) for c in '.-/ "']).any(axis=1)
+    if com_pontuacao.any():
+        textos = textos.copy()
+        textos[com_pontuacao] = textos[com_pontuacao].str.replace(r'[.\-/ "]', '', regex=True)
+        codigos = textos.to_numpy(dtype=str)
+        matriz = codigos.view(np.uint32).reshape(len(codigos), codigos.dtype.itemsize // 4)
+
+    resultado = np.zeros(len(codigos), dtype=bool)
+    nao_ascii = (matriz > 127).any(axis=1)
+    if nao_ascii.any():
+        resultado[nao_ascii] = textos[nao_ascii].map(validar_cnpj).to_numpy(dtype=bool)
+
+    so_digitos = (((matriz >= ord('0')) & (matriz <= ord('9'))) | (matriz == 0)).all(axis=1)
+    candidatos = ~nao_ascii & so_digitos & ((matriz != 0).sum(axis=1) <= 14)
+    if candidatos.any():
+        completos = np.char.zfill(codigos[candidatos], 14).astype('U14')
+        digitos = completos.view(np.uint32).reshape(-1, 14).astype(np.int64) - ord('0')
+        repetidos = (digitos == digitos[:, :1]).all(axis=1)
+        resultado[candidatos] = (
+            (digitos[:, 12] == digito_verificador(digitos[:, :12], PESOS_CNPJ_1)) &
+            (digitos[:, 13] == digito_verificador(digitos[:, :13], PESOS_CNPJ_2)) &
+            ~repetidos
+        )
+
+    return pd.Series(resultado, index=textos.index)
+
+def limpar_identificadores(valores):
+    categorias = valores.astype('category')
+    textos = pd.Series(categorias.cat.categories.astype(str).append(pd.Index(['nan'])))
+    limpos = textos.str.replace(r'\D', '', regex=True)
+    codigos_limpos, unicos = pd.factorize(limpos)
+    codigos = categorias.cat.codes.to_numpy()
+    valor_limpo = pd.Categorical.from_codes(codigos_limpos[codigos], categories=unicos)
+    validos = validar_cnpj_lote(pd.Series(unicos)).to_numpy()[codigos_limpos[codigos]]
+    return pd.Series(valor_limpo, index=valores.index), pd.Series(validos, index=valores.index)
+
+def para_centavos(valores):
+    return np.rint(valores.to_numpy(dtype=np.float64) * 100).astype(np.int64)
+
+def compactar_consolidado(df):
+    textos = {c: 'category' for c in ('CNPJ', 'RazaoSocial') if df[c].dtype == object}
+    return df.astype({**textos, **TIPOS_PERIODO})
+
+def uso_memoria(etapa, df):
+    print(f"  Memória ({etapa}): {len(df)} linhas, {df.memory_usage(deep=True).sum() / 1024 ** 2:.1f} MB")
+
 def baixar_cadastro():
-    try:
-        r = requests.get(OPERADORAS_URL, timeout=30)
-        if r.status_code == 200:
-            with open(CADASTRO_CSV, 'wb') as f:
-                f.write(r.content)
-            return True
-        return False
-    except: return False
+    with relatorio.etapa('download', CADASTRO_CSV) as medidas:
+        try:
+            r = requests.get(OPERADORAS_URL, timeout=30)
+            if r.status_code == 200:
+                with open(CADASTRO_CSV, 'wb') as f:
+                    f.write(r.content)
+                medidas['bytes_entrada'] = medidas['bytes_saida'] = len(r.content)
+                return True
+            relatorio.erro(f"Cadastro de operadoras indisponível: HTTP {r.status_code}")
+            return False
+        except Exception as e:
+            relatorio.erro(f"Falha ao baixar o cadastro de operadoras: {e}")
+            return False
 
-def processar_transformacao():
-    if not os.path.exists(CONSOLIDADO_CSV): return
-    if not os.path.exists(CADASTRO_CSV): baixar_cadastro()
+def hash_arquivo(caminho):
+    digest = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(bloco)
+    return digest.hexdigest()
 
-    df = pd.read_csv(CONSOLIDADO_CSV, sep=';', encoding='utf-8-sig')
-    
-    df['VALOR_LIMPO'] = df['CNPJ'].astype(str).str.replace(r'\D', '', regex=True)
-    df['IS_CNPJ_VALIDO'] = df['VALOR_LIMPO'].apply(validar_cnpj)
+def construir_indice_cadastro():
+    df_cad = pd.read_csv(CADASTRO_CSV, sep=';', encoding='latin1', quotechar='"')
+    df_cad.columns = [str(c).strip().upper() for c in df_cad.columns]
     
-    df = df[df['ValorDespesas'] > 0].copy()
-    df = df[df['RazaoSocial'].notna()]
+    df_cad['CNPJ_KEY'] = df_cad['CNPJ'].astype(str).str.replace(r'\D', '', regex=True).str.zfill(14)
+    df_cad['REG_KEY'] = df_cad['REGISTRO_OPERADORA'].astype(str).str.replace(r'\D', '', regex=True)
+    df_cad['REGISTRO_OPERADORA'] = pd.to_numeric(df_cad['REGISTRO_OPERADORA'], errors='coerce')
+    df_cad = df_cad[COLUNAS_CADASTRO].astype(TIPOS_CADASTRO).reset_index(drop=True)
 
-    try:
-        df_cad = pd.read_csv(CADASTRO_CSV, sep=';', encoding='latin1', quotechar='"')
-        df_cad.columns = [str(c).strip().upper() for c in df_cad.columns]
-        
-        df_cad['CNPJ_KEY'] = df_cad['CNPJ'].astype(str).str.replace(r'\D', '', regex=True).str.zfill(14)
-        df_cad['REG_KEY'] = df_cad['REGISTRO_OPERADORA'].astype(str).str.replace(r'\D', '', regex=True)
-
-        m1 = pd.merge(df, df_cad[['CNPJ_KEY', 'REG_KEY', 'REGISTRO_OPERADORA', 'MODALIDADE', 'UF', 'RAZAO_SOCIAL']], 
-                      left_on='VALOR_LIMPO', right_on='CNPJ_KEY', how='left')
-        
-        
-        m2 = pd.merge(df, df_cad[['REG_KEY', 'REGISTRO_OPERADORA', 'MODALIDADE', 'UF', 'RAZAO_SOCIAL']], 
-                      left_on='VALOR_LIMPO', right_on='REG_KEY', how='left')
-        
-        df_final = m1.copy()
-        mask = df_final['REG_KEY'].isna()
-        df_final.loc[mask, ['REG_KEY', 'REGISTRO_OPERADORA', 'MODALIDADE', 'UF', 'RAZAO_SOCIAL']] = m2.loc[mask, ['REG_KEY', 'REGISTRO_OPERADORA', 'MODALIDADE', 'UF', 'RAZAO_SOCIAL']].values
-
-        df_final = df_final.rename(columns={'REGISTRO_OPERADORA': 'RegistroANS', 'MODALIDADE': 'Modalidade'})
-
-        
-        df_quarterly = df_final.groupby(['RegistroANS', 'RAZAO_SOCIAL', 'UF', 'Ano', 'Trimestre'], dropna=False).agg({
+    linhas = pd.Series(np.arange(len(df_cad)))
+    por_cnpj = linhas.set_axis(df_cad['CNPJ_KEY'])[~df_cad['CNPJ_KEY'].duplicated().to_numpy()]
+    por_reg = linhas.set_axis(df_cad['REG_KEY'])[~df_cad['REG_KEY'].duplicated().to_numpy()]
+    indice = pd.concat([por_cnpj, por_reg[~por_reg.index.isin(por_cnpj.index)]])
+    return df_cad, indice
+
+def carregar_indice_cadastro():
+    chave = f"{hash_arquivo(CADASTRO_CSV)}:{VERSAO_INDICE}"
+    if os.path.exists(INDICE_CADASTRO):
+        try:
+            salvo = pd.read_pickle(INDICE_CADASTRO)
+            if salvo['hash'] == chave:
+                return salvo['cadastro'], salvo['indice']
+        except Exception as e:
+            relatorio.erro(f"Índice do cadastro ignorado: {e}")
+
+    df_cad, indice = construir_indice_cadastro()
+    pd.to_pickle({'hash': chave, 'cadastro': df_cad, 'indice': indice}, INDICE_CADASTRO)
+    return df_cad, indice
+
+def enriquecer_operadoras(df, df_cad, indice):
+    chaves = df['VALOR_LIMPO'].astype('category')
+    por_chave = indice.reindex(chaves.cat.categories).fillna(len(df_cad)).to_numpy(dtype=np.int64)
+    posicoes = np.append(por_chave, len(df_cad))[chaves.cat.codes.to_numpy()]
+    sem_cadastro = df_cad.reindex([len(df_cad)])
+    operadoras = pd.concat([df_cad, sem_cadastro]).take(posicoes).reset_index(drop=True)
+    return pd.concat([df.reset_index(drop=True), operadoras], axis=1)
+
+def filtro_periodos(anos, trimestres):
+    filtro = None
+    if anos:
+        filtro = ds.field('Ano').isin([int(a) for a in anos])
+    if trimestres:
+        filtro_tri = ds.field('Trimestre').isin([int(t) for t in trimestres])
+        filtro = filtro_tri if filtro is None else filtro & filtro_tri
+    return filtro
+
+def filtrar_periodos(df, anos, trimestres):
+    if anos:
+        df = df[df['Ano'].isin([int(a) for a in anos])]
+    if trimestres:
+        df = df[df['Trimestre'].isin([int(t) for t in trimestres])]
+    return df
+
+def tamanho_consolidado():
+    if os.path.isdir(CONSOLIDADO_PARQUET):
+        return sum(os.path.getsize(os.path.join(pasta, nome)) for pasta, _, nomes in os.walk(CONSOLIDADO_PARQUET) for nome in nomes)
+    return os.path.getsize(CONSOLIDADO_CSV)
+
+def carregar_consolidado(anos=None, trimestres=None):
+    with relatorio.etapa('leitura') as medidas:
+        medidas['bytes_entrada'] = tamanho_consolidado()
+        if os.path.isdir(CONSOLIDADO_PARQUET):
+            dataset = ds.dataset(CONSOLIDADO_PARQUET, format='parquet', partitioning='hive')
+            tabela = dataset.to_table(filter=filtro_periodos(anos, trimestres))
+            df = compactar_consolidado(tabela.to_pandas(strings_to_categorical=True))
+        else:
+            df = compactar_consolidado(pd.read_csv(CONSOLIDADO_CSV, sep=';', encoding='utf-8-sig'))
+            medidas['linhas_entrada'] = len(df)
+            df = filtrar_periodos(df, anos, trimestres)
+            relatorio.descartar('fora_do_periodo', medidas['linhas_entrada'] - len(df))
+        medidas['linhas_saida'] = len(df)
+    return df
+
+def lotes_medidos(lotes, preparar):
+    while True:
+        with relatorio.etapa('leitura') as medidas:
+            lote = next(lotes, None)
+            if lote is not None:
+                medidas['linhas_entrada'] = len(lote)
+                lote = preparar(lote)
+                relatorio.descartar('fora_do_periodo', medidas['linhas_entrada'] - len(lote))
+                medidas['linhas_saida'] = len(lote)
+        if lote is None:
+            return
+        yield lote
+
+def lotes_parquet(fragmentos, ano, trimestre, chunksize):
+    def preparar(lote):
+        df = lote.to_pandas(strings_to_categorical=True)
+        df['Ano'], df['Trimestre'] = ano, trimestre
+        return compactar_consolidado(df)
+    lotes = (lote for fragmento in fragmentos for lote in fragmento.to_batches(batch_size=chunksize))
+    return lotes_medidos(lotes, preparar)
+
+def lotes_csv(anos, trimestres, chunksize):
+    lotes = iter(pd.read_csv(CONSOLIDADO_CSV, sep=';', encoding='utf-8-sig', chunksize=chunksize))
+    return lotes_medidos(lotes, lambda df: filtrar_periodos(compactar_consolidado(df), anos, trimestres))
+
+def grupos_de_lotes(anos=None, trimestres=None, chunksize=STREAM_CHUNK_ROWS):
+    if os.path.isdir(CONSOLIDADO_PARQUET):
+        dataset = ds.dataset(CONSOLIDADO_PARQUET, format='parquet', partitioning='hive')
+        particoes = {}
+        for fragmento in dataset.get_fragments(filter=filtro_periodos(anos, trimestres)):
+            chaves = ds.get_partition_keys(fragmento.partition_expression)
+            particoes.setdefault((chaves['Ano'], chaves['Trimestre']), []).append(fragmento)
+        for (ano, trimestre), fragmentos in sorted(particoes.items()):
+            yield lotes_parquet(fragmentos, ano, trimestre, chunksize)
+    else:
+        yield lotes_csv(anos, trimestres, chunksize)
+
+def preparar_lote(df, df_cad, indice):
+    with relatorio.etapa('limpeza') as medidas:
+        medidas['linhas_entrada'] = len(df)
+        df['VALOR_LIMPO'], df['IS_CNPJ_VALIDO'] = limpar_identificadores(df['CNPJ'])
+        positivo, com_razao = df['ValorDespesas'] > 0, df['RazaoSocial'].notna()
+        relatorio.descartar('valor_nao_positivo', (~positivo).sum())
+        relatorio.descartar('razao_social_vazia', (positivo & ~com_razao).sum())
+        df = df[positivo & com_razao].copy()
+        df['ValorDespesas'] = para_centavos(df['ValorDespesas'])
+        medidas['cnpj_invalido'] = int((~df['IS_CNPJ_VALIDO']).sum())
+        medidas['linhas_saida'] = len(df)
+
+    with relatorio.etapa('enriquecimento') as medidas:
+        medidas['linhas_entrada'] = len(df)
+        df_final = enriquecer_operadoras(df, df_cad, indice)
+        medidas['sem_cadastro'] = int(df_final['REGISTRO_OPERADORA'].isna().sum())
+        medidas['linhas_saida'] = len(df_final)
+    return df_final.rename(columns={'REGISTRO_OPERADORA': 'RegistroANS', 'MODALIDADE': 'Modalidade'})
+
+def somar_trimestres(df):
+    with relatorio.etapa('agrupamento') as medidas:
+        medidas['linhas_entrada'] = len(df)
+        trimestres = df.groupby(CHAVES_OPERADORA + ['Ano', 'Trimestre'], dropna=False, observed=True).agg({
             'ValorDespesas': 'sum'
         }).reset_index()
+        medidas['linhas_saida'] = len(trimestres)
+    return trimestres
 
-        agrupado = df_quarterly.groupby(['RegistroANS', 'RAZAO_SOCIAL', 'UF'], dropna=False).agg({
-            'ValorDespesas': ['sum', 'mean', 'std']
-        }).reset_index()
+def estatisticas_trimestrais(trimestres):
+    return trimestres[CHAVES_OPERADORA].assign(
+        n=1, total=trimestres['ValorDespesas'], media=trimestres['ValorDespesas'] / 100, m2=0.0
+    )
+
+def combinar_estatisticas(*partes):
+    df = pd.concat([p for p in partes if p is not None], ignore_index=True)
+    grupos = df.groupby(CHAVES_OPERADORA, dropna=False, observed=True, sort=False)
+    n = grupos['n'].transform('sum')
+    media = df.assign(peso=df['n'] * df['media']).groupby(CHAVES_OPERADORA, dropna=False, observed=True, sort=False)['peso'].transform('sum') / n
+    df = df.assign(m2=df['m2'] + df['n'] * (df['media'] - media) ** 2)
+    return df.groupby(CHAVES_OPERADORA, dropna=False, observed=True, sort=False).agg(
+        n=('n', 'sum'), total=('total', 'sum'), m2=('m2', 'sum')
+    ).reset_index().assign(media=lambda d: d['total'] / 100 / d['n'])
 
-        agrupado.columns = ['RegistroANS', 'RazaoSocial', 'UF', 'TotalDespesas', 'MediaTrimestral', 'DesvioPadrao']
-        agrupado['DesvioPadrao'] = agrupado['DesvioPadrao'].fillna(0)
-        
+def agregar_estatisticas(estatisticas):
+    desvio = np.sqrt(estatisticas['m2'] / (estatisticas['n'] - 1)).where(estatisticas['n'] > 1, 0.0)
+    return pd.DataFrame({
+        'RegistroANS': estatisticas['RegistroANS'],
+        'RazaoSocial': estatisticas['RAZAO_SOCIAL'],
+        'UF': estatisticas['UF'],
+        'TotalDespesas': estatisticas['total'] / 100,
+        'MediaTrimestral': estatisticas['total'] / 100 / estatisticas['n'],
+        'DesvioPadrao': desvio,
+    })
+
+def escrever_fix(df_final, out, cabecalho=True):
+    with relatorio.etapa('escrita', FIX_CONSOLIDADO) as medidas:
+        inicio = out.tell()
+        saida = df_final[COLUNAS_FIX].astype({'RegistroANS': 'float64'})
+        saida['ValorDespesas'] = saida['ValorDespesas'] / 100
+        saida.to_csv(out, index=False, sep=';', header=cabecalho)
+        medidas['linhas_entrada'] = medidas['linhas_saida'] = len(saida)
+        medidas['bytes_saida'] = out.tell() - inicio
+
+def escrever_agregado(agrupado):
+    with relatorio.etapa('escrita', RESULTADO_FINAL) as medidas:
+        medidas['linhas_entrada'] = len(agrupado)
         agrupado = agrupado.sort_values(by='TotalDespesas', ascending=False)
-        
         agrupado = agrupado.drop_duplicates(subset=['RazaoSocial', 'UF'])
+        relatorio.descartar('razao_social_uf_duplicada', medidas['linhas_entrada'] - len(agrupado))
+        agrupado['RegistroANS'] = agrupado['RegistroANS'].astype('float64')
+        agrupado.to_csv(RESULTADO_FINAL, index=False, sep=';', encoding='utf-8-sig')
+        medidas['linhas_saida'] = len(agrupado)
+        medidas['bytes_saida'] = os.path.getsize(RESULTADO_FINAL)
+
+def processar_em_memoria(anos, trimestres, df_cad, indice):
+    df = carregar_consolidado(anos, trimestres)
+    uso_memoria("consolidado", df)
 
-        CORRECTED_FINAL = "despesas_agregadas.csv"
-        agrupado.to_csv(CORRECTED_FINAL, index=False, sep=';', encoding='utf-8-sig')
-        
-        FIXED_CONSOLIDADO = "fix_consolidado.csv"
-        df_final[['CNPJ_KEY', 'RegistroANS', 'Trimestre', 'Ano', 'ValorDespesas', 'RazaoSocial_x']].to_csv(FIXED_CONSOLIDADO, index=False, sep=';', encoding='utf-8-sig')
-        
-        print(f"Sucesso: {CORRECTED_FINAL} e {FIXED_CONSOLIDADO} gerados.")
+    df_final = preparar_lote(df, df_cad, indice)
+    uso_memoria("enriquecido", df_final)
+
+    df_quarterly = somar_trimestres(df_final)
+    df_quarterly['ValorDespesas'] = df_quarterly['ValorDespesas'] / 100
+    uso_memoria("trimestral", df_quarterly)
+
+    with relatorio.etapa('agrupamento') as medidas:
+        medidas['linhas_entrada'] = len(df_quarterly)
+        agrupado = df_quarterly.groupby(CHAVES_OPERADORA, dropna=False, observed=True).agg({
+            'ValorDespesas': ['sum', 'mean', 'std']
+        }).reset_index()
+        medidas['linhas_saida'] = len(agrupado)
+
+    agrupado.columns = ['RegistroANS', 'RazaoSocial', 'UF', 'TotalDespesas', 'MediaTrimestral', 'DesvioPadrao']
+    agrupado['DesvioPadrao'] = agrupado['DesvioPadrao'].fillna(0)
+    escrever_agregado(agrupado)
+
+    with open(FIX_CONSOLIDADO, 'w', encoding='utf-8-sig', newline='') as out:
+        escrever_fix(df_final, out)
+
+def processar_em_streaming(anos, trimestres, df_cad, indice, chunksize=STREAM_CHUNK_ROWS):
+    estatisticas, linhas, maior_acumulador = None, 0, 0
+    with open(FIX_CONSOLIDADO, 'w', encoding='utf-8-sig', newline='') as out:
+        for lotes in grupos_de_lotes(anos, trimestres, chunksize):
+            acumulado = None
+            for lote in lotes:
+                df_final = preparar_lote(lote, df_cad, indice)
+                escrever_fix(df_final, out, cabecalho=(linhas == 0))
+                linhas += len(df_final)
+                parcial = somar_trimestres(df_final)
+                acumulado = parcial if acumulado is None else somar_trimestres(pd.concat([acumulado, parcial], ignore_index=True))
+            if acumulado is not None:
+                maior_acumulador = max(maior_acumulador, len(acumulado))
+                with relatorio.etapa('agrupamento') as medidas:
+                    medidas['linhas_entrada'] = len(acumulado)
+                    estatisticas = combinar_estatisticas(estatisticas, estatisticas_trimestrais(acumulado))
+                    medidas['linhas_saida'] = len(estatisticas)
+
+    relatorio.registrar('leitura', {'bytes_entrada': tamanho_consolidado()})
+    print(f"  Streaming: {linhas} linhas, maior acumulador trimestral com {maior_acumulador} linhas")
+    if estatisticas is None:
+        estatisticas = pd.DataFrame(columns=CHAVES_OPERADORA + ['n', 'total', 'm2', 'media'], dtype='float64')
+    uso_memoria("estatísticas", estatisticas)
+    escrever_agregado(agregar_estatisticas(estatisticas))
+
+def processar_transformacao(anos=None, trimestres=None, streaming=False, chunksize=STREAM_CHUNK_ROWS):
+    if not os.path.exists(CONSOLIDADO_CSV) and not os.path.isdir(CONSOLIDADO_PARQUET):
+        relatorio.erro(f"Erro: {CONSOLIDADO_CSV} ou {CONSOLIDADO_PARQUET}/ não encontrado.")
+        return
+    if not os.path.exists(CADASTRO_CSV): baixar_cadastro()
+
+    try:
+        with relatorio.etapa('cadastro', CADASTRO_CSV) as medidas:
+            medidas['bytes_entrada'] = os.path.getsize(CADASTRO_CSV)
+            df_cad, indice = carregar_indice_cadastro()
+            medidas['linhas_saida'] = len(df_cad)
+        if streaming:
+            processar_em_streaming(anos, trimestres, df_cad, indice, chunksize)
+        else:
+            processar_em_memoria(anos, trimestres, df_cad, indice)
+        print(f"Sucesso: {RESULTADO_FINAL} e {FIX_CONSOLIDADO} gerados.")
 
     except Exception as e:
-        print(f"Erro: {e}")
+        relatorio.erro(f"Erro: {e}")
 
 if __name__ == "__main__":
-    processar_transformacao()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Validação e agregação das despesas consolidadas")
+    parser.add_argument("--ano", action="append", help="Ano a considerar (pode repetir)")
+    parser.add_argument("--trimestre", action="append", help="Trimestre a considerar (pode repetir)")
+    parser.add_argument("--streaming", action="store_true", default=os.getenv("VALIDACAO_STREAMING") == "1",
+                        help="Agrega em blocos (ou por partição Parquet), sem carregar o consolidado inteiro")
+    parser.add_argument("--relatorio", help=f"Arquivo JSON do relatório da execução (padrão: {relatorio.RELATORIOS_DIR}/validacao-<data>.json)")
+    parser.add_argument("--perfil", default=os.getenv("VALIDACAO_PERFIL"),
+                        help="Grava um perfil cProfile neste arquivo e resume as funções mais caras no relatório")
+    args = parser.parse_args()
+    with relatorio.execucao('validacao', vars(args), args.relatorio, args.perfil):
+        processar_transformacao(args.ano, args.trimestre, streaming=args.streaming)
\ No newline at end of file
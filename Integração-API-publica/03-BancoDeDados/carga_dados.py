@@ -0,0 +1,223 @@
+import os
+import re
+import glob
+import argparse
+import psycopg2
+import pyarrow.parquet as pq
+from dotenv import load_dotenv
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+load_dotenv(os.path.join(BASE_DIR, "..", "04-Interface", "BackEnd", ".env"))
+load_dotenv()
+
+CONSOLIDADO = os.path.join(BASE_DIR, "..", "01-Consolidação", "consolidado_despesas.csv")
+CONSOLIDADO_PARQUET = os.path.join(BASE_DIR, "..", "01-Consolidação", "consolidado_despesas")
+AGREGADAS = os.path.join(BASE_DIR, "..", "02-Validação", "despesas_agregadas.csv")
+CADASTRO = os.path.join(BASE_DIR, "..", "02-Validação", "cadastro_operadoras.csv")
+
+COPY_BUFFER = 64 * 1024
+PARQUET_BATCH = 50000
+LIMIAR_INDICES = int(os.getenv("CARGA_LIMIAR_INDICES", "100000"))
+
+INDICES_DESPESAS = {
+    "idx_despesas_reg_ans": "CREATE INDEX idx_despesas_reg_ans ON despesas_consolidadas(registro_ans)",
+    "idx_despesas_periodo": "CREATE INDEX idx_despesas_periodo ON despesas_consolidadas(ano, trimestre)",
+    "idx_despesas_cnpj": "CREATE INDEX idx_despesas_cnpj ON despesas_consolidadas(cnpj)",
+}
+
+VIEWS_ANALISE = [
+    "resumo_operadora_trimestre",
+    "analise_estatisticas",
+    "analise_top_operadoras",
+    "analise_despesas_uf",
+    "analise_acima_media",
+    "analise_crescimento",
+]
+
+STAGING_DDL = """
+CREATE UNLOGGED TABLE IF NOT EXISTS stg_operadoras (
+    registro_operadora TEXT, cnpj TEXT, razao_social TEXT, nome_fantasia TEXT, modalidade TEXT,
+    logradouro TEXT, numero TEXT, complemento TEXT, bairro TEXT, cidade TEXT, uf TEXT, cep TEXT,
+    ddd TEXT, telefone TEXT, fax TEXT, endereco_eletronico TEXT, representante TEXT,
+    cargo_representante TEXT, regiao_de_comercializacao TEXT, data_registro_ans TEXT
+);
+CREATE UNLOGGED TABLE IF NOT EXISTS stg_despesas (
+    id_operadora TEXT, descricao TEXT, valor TEXT, trimestre TEXT, ano TEXT
+);
+CREATE UNLOGGED TABLE IF NOT EXISTS stg_agregadas (
+    registro_ans TEXT, razaosocial TEXT, uf TEXT, totaldespesas TEXT, mediatrimestral TEXT, desviopadrao TEXT
+);
+TRUNCATE stg_operadoras, stg_despesas, stg_agregadas;
+"""
+
+UPSERT_OPERADORAS = """
+INSERT INTO operadoras (
+    registro_operadora, cnpj, razao_social, nome_fantasia, modalidade, logradouro, numero, complemento,
+    bairro, cidade, uf, cep, ddd, telefone, fax, endereco_eletronico, representante, cargo_representante,
+    regiao_de_comercializacao, data_registro_ans
+)
+SELECT DISTINCT ON (registro_operadora)
+    registro_operadora, cnpj, razao_social, nome_fantasia, modalidade, logradouro, numero, complemento,
+    bairro, cidade, uf, cep, ddd, telefone, fax, endereco_eletronico, representante, cargo_representante,
+    regiao_de_comercializacao, NULLIF(data_registro_ans, '')::timestamp
+FROM stg_operadoras
+WHERE registro_operadora <> ''
+ON CONFLICT (registro_operadora) DO UPDATE SET
+    cnpj = EXCLUDED.cnpj, razao_social = EXCLUDED.razao_social, nome_fantasia = EXCLUDED.nome_fantasia,
+    modalidade = EXCLUDED.modalidade, logradouro = EXCLUDED.logradouro, numero = EXCLUDED.numero,
+    complemento = EXCLUDED.complemento, bairro = EXCLUDED.bairro, cidade = EXCLUDED.cidade, uf = EXCLUDED.uf,
+    cep = EXCLUDED.cep, ddd = EXCLUDED.ddd, telefone = EXCLUDED.telefone, fax = EXCLUDED.fax,
+    endereco_eletronico = EXCLUDED.endereco_eletronico, representante = EXCLUDED.representante,
+    cargo_representante = EXCLUDED.cargo_representante,
+    regiao_de_comercializacao = EXCLUDED.regiao_de_comercializacao, data_registro_ans = EXCLUDED.data_registro_ans
+"""
+
+REMOVE_PERIODOS = """
+DELETE FROM despesas_consolidadas d
+USING (SELECT DISTINCT ano::int AS ano, trimestre::int AS trimestre FROM stg_despesas) p
+WHERE d.ano = p.ano AND d.trimestre = p.trimestre
+"""
+
+INSERE_DESPESAS = """
+INSERT INTO despesas_consolidadas (cnpj, registro_ans, trimestre, ano, valordespesas, descricao_conta)
+SELECT
+    COALESCE(oc.cnpj, orr.cnpj, s.id_operadora),
+    COALESCE(oc.registro_operadora, orr.registro_operadora),
+    s.trimestre::int,
+    s.ano::int,
+    NULLIF(s.valor, '')::numeric,
+    s.descricao
+FROM stg_despesas s
+LEFT JOIN operadoras oc ON oc.cnpj = s.id_operadora
+LEFT JOIN operadoras orr ON orr.registro_operadora = s.id_operadora AND oc.registro_operadora IS NULL
+"""
+
+UPSERT_AGREGADAS = """
+INSERT INTO despesas_agregadas (razaosocial, uf, totaldespesas, mediatrimestral, desviopadrao)
+SELECT DISTINCT ON (razaosocial, uf)
+    razaosocial, uf, totaldespesas::numeric, mediatrimestral::numeric, desviopadrao::numeric
+FROM stg_agregadas
+WHERE razaosocial <> '' AND uf <> ''
+ORDER BY razaosocial, uf, totaldespesas::numeric DESC
+ON CONFLICT (razaosocial, uf) DO UPDATE SET
+    totaldespesas = EXCLUDED.totaldespesas,
+    mediatrimestral = EXCLUDED.mediatrimestral,
+    desviopadrao = EXCLUDED.desviopadrao
+"""
+
+INCREMENTA_VERSAO = "UPDATE versao_dados SET versao = versao + 1, atualizado_em = now() WHERE id = 1"
+
+class FluxoCopy:
+    def __init__(self, blocos):
+        self.blocos = iter(blocos)
+        self.buffer = b''
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            try:
+                self.buffer += next(self.blocos)
+            except StopIteration:
+                break
+        if size < 0:
+            size = len(self.buffer)
+        dados, self.buffer = self.buffer[:size], self.buffer[size:]
+        return dados
+
+def conectar():
+    return psycopg2.connect(
+        host=os.getenv("DB_HOST", "localhost"),
+        port=os.getenv("DB_PORT", "5432"),
+        user=os.getenv("DB_USER", "postgres"),
+        password=os.getenv("DB_PASSWORD"),
+        dbname=os.getenv("DB_NAME", "postgres"),
+    )
+
+def copiar_csv(cur, tabela, caminho, encoding='UTF8'):
+    with open(caminho, 'rb') as f:
+        cur.copy_expert(
+            f"COPY {tabela} FROM STDIN WITH (FORMAT csv, DELIMITER ';', HEADER true, QUOTE '\"', ENCODING '{encoding}')",
+            f, size=COPY_BUFFER,
+        )
+    return cur.rowcount
+
+def blocos_parquet(diretorio):
+    arquivos = glob.glob(os.path.join(diretorio, "Ano=*", "Trimestre=*", "*.parquet"))
+    for caminho in sorted(arquivos):
+        ano = re.search(r'Ano=(\d+)', caminho).group(1)
+        tri = re.search(r'Trimestre=(\d+)', caminho).group(1)
+        for lote in pq.ParquetFile(caminho).iter_batches(batch_size=PARQUET_BATCH):
+            df = lote.to_pandas()
+            df['Trimestre'] = tri
+            df['Ano'] = ano
+            yield df.to_csv(sep=';', index=False, header=False).encode('utf-8')
+
+def copiar_consolidado(cur, origem):
+    if os.path.isdir(origem):
+        cur.copy_expert(
+            "COPY stg_despesas FROM STDIN WITH (FORMAT csv, DELIMITER ';', QUOTE '\"', ENCODING 'UTF8')",
+            FluxoCopy(blocos_parquet(origem)), size=COPY_BUFFER,
+        )
+        return cur.rowcount
+    return copiar_csv(cur, "stg_despesas", origem)
+
+def atualizar_analises(cur):
+    for view in VIEWS_ANALISE:
+        cur.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view}")
+
+def carregar(consolidado=None, agregadas=AGREGADAS, cadastro=CADASTRO, conn=None):
+    if consolidado is None:
+        consolidado = CONSOLIDADO_PARQUET if os.path.isdir(CONSOLIDADO_PARQUET) else CONSOLIDADO
+
+    propria = conn is None
+    conn = conn or conectar()
+    resumo = {}
+    try:
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute(STAGING_DDL)
+                if cadastro and os.path.exists(cadastro):
+                    resumo['stg_operadoras'] = copiar_csv(cur, "stg_operadoras", cadastro)
+                if consolidado and os.path.exists(consolidado):
+                    resumo['stg_despesas'] = copiar_consolidado(cur, consolidado)
+                if agregadas and os.path.exists(agregadas):
+                    resumo['stg_agregadas'] = copiar_csv(cur, "stg_agregadas", agregadas)
+
+                cur.execute(UPSERT_OPERADORAS)
+                resumo['operadoras'] = cur.rowcount
+
+                recriar_indices = resumo.get('stg_despesas', 0) >= LIMIAR_INDICES
+                if recriar_indices:
+                    for nome in INDICES_DESPESAS:
+                        cur.execute(f"DROP INDEX IF EXISTS {nome}")
+
+                cur.execute(REMOVE_PERIODOS)
+                resumo['despesas_removidas'] = cur.rowcount
+                cur.execute(INSERE_DESPESAS)
+                resumo['despesas_consolidadas'] = cur.rowcount
+
+                if recriar_indices:
+                    for ddl in INDICES_DESPESAS.values():
+                        cur.execute(ddl)
+
+                cur.execute(UPSERT_AGREGADAS)
+                resumo['despesas_agregadas'] = cur.rowcount
+
+                cur.execute("TRUNCATE stg_operadoras, stg_despesas, stg_agregadas")
+                cur.execute("ANALYZE operadoras, despesas_consolidadas, despesas_agregadas")
+                atualizar_analises(cur)
+                cur.execute(INCREMENTA_VERSAO)
+    finally:
+        if propria:
+            conn.close()
+    return resumo
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Carga em massa dos arquivos do pipeline no PostgreSQL")
+    parser.add_argument("--consolidado", help="CSV consolidado ou diretório Parquet particionado")
+    parser.add_argument("--agregadas", default=AGREGADAS)
+    parser.add_argument("--cadastro", default=CADASTRO)
+    args = parser.parse_args()
+
+    resumo = carregar(args.consolidado, args.agregadas, args.cadastro)
+    for tabela, linhas in resumo.items():
+        print(f"{tabela}: {linhas} linhas")
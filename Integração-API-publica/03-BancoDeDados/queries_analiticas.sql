@@ -1,3 +1,10 @@
+DROP MATERIALIZED VIEW IF EXISTS analise_crescimento;
+DROP MATERIALIZED VIEW IF EXISTS analise_acima_media;
+DROP MATERIALIZED VIEW IF EXISTS analise_despesas_uf;
+DROP MATERIALIZED VIEW IF EXISTS analise_top_operadoras;
+DROP MATERIALIZED VIEW IF EXISTS analise_estatisticas;
+DROP MATERIALIZED VIEW IF EXISTS resumo_operadora_trimestre;
+DROP TABLE IF EXISTS versao_dados;
 DROP TABLE IF EXISTS despesas_agregadas;
 DROP TABLE IF EXISTS despesas_consolidadas;
 DROP TABLE IF EXISTS operadoras;
@@ -48,6 +55,107 @@ CREATE TABLE despesas_agregadas (
 CREATE INDEX idx_despesas_reg_ans ON despesas_consolidadas(registro_ans);
 CREATE INDEX idx_despesas_periodo ON despesas_consolidadas(ano, trimestre);
 CREATE INDEX idx_despesas_cnpj ON despesas_consolidadas(cnpj);
+CREATE INDEX idx_operadoras_cnpj ON operadoras(cnpj);
+
+-- Versão dos dados: incrementada pela carga e pelas rotas de escrita (ETag/Last-Modified da API)
+CREATE TABLE versao_dados (
+    id INT PRIMARY KEY,
+    versao BIGINT NOT NULL,
+    atualizado_em TIMESTAMPTZ NOT NULL
+);
+
+INSERT INTO versao_dados (id, versao, atualizado_em) VALUES (1, 1, now());
+
+-- Camada de resumo: atualizada pela carga (carga_dados.py) com REFRESH MATERIALIZED VIEW CONCURRENTLY
+CREATE MATERIALIZED VIEW resumo_operadora_trimestre AS
+SELECT
+    registro_ans,
+    ano,
+    trimestre,
+    SUM(valordespesas) AS total_despesa,
+    COUNT(valordespesas) AS qtd_lancamentos
+FROM despesas_consolidadas
+GROUP BY registro_ans, ano, trimestre;
+
+CREATE UNIQUE INDEX ux_resumo_operadora_trimestre ON resumo_operadora_trimestre(registro_ans, ano, trimestre);
+
+CREATE MATERIALIZED VIEW analise_estatisticas AS
+SELECT
+    1 AS id,
+    SUM(total_despesa) AS total_geral,
+    SUM(total_despesa) / NULLIF(SUM(qtd_lancamentos), 0) AS media_geral
+FROM resumo_operadora_trimestre;
+
+CREATE UNIQUE INDEX ux_analise_estatisticas ON analise_estatisticas(id);
+
+CREATE MATERIALIZED VIEW analise_top_operadoras AS
+SELECT
+    ROW_NUMBER() OVER (ORDER BY SUM(r.total_despesa) DESC) AS posicao,
+    o.razao_social,
+    SUM(r.total_despesa) AS total_despesa
+FROM resumo_operadora_trimestre r
+JOIN operadoras o ON o.registro_operadora = r.registro_ans
+GROUP BY o.razao_social
+ORDER BY posicao
+LIMIT 5;
+
+CREATE UNIQUE INDEX ux_analise_top_operadoras ON analise_top_operadoras(posicao);
+
+CREATE MATERIALIZED VIEW analise_despesas_uf AS
+SELECT
+    ROW_NUMBER() OVER (ORDER BY SUM(r.total_despesa) DESC) AS posicao,
+    o.uf,
+    SUM(r.total_despesa) AS total_despesa,
+    SUM(r.total_despesa) / NULLIF(SUM(r.qtd_lancamentos), 0) AS media_por_operadora
+FROM resumo_operadora_trimestre r
+JOIN operadoras o ON o.registro_operadora = r.registro_ans
+GROUP BY o.uf;
+
+CREATE UNIQUE INDEX ux_analise_despesas_uf ON analise_despesas_uf(posicao);
+
+CREATE MATERIALIZED VIEW analise_acima_media AS
+WITH media_geral AS (
+    SELECT SUM(total_despesa) / NULLIF(SUM(qtd_lancamentos), 0) AS media FROM resumo_operadora_trimestre
+)
+SELECT 1 AS id, COUNT(*) AS total_operadoras
+FROM (
+    SELECT r.registro_ans
+    FROM resumo_operadora_trimestre r, media_geral mg
+    WHERE r.total_despesa > mg.media
+    GROUP BY r.registro_ans
+    HAVING COUNT(*) >= 2
+) contagem_acima;
+
+CREATE UNIQUE INDEX ux_analise_acima_media ON analise_acima_media(id);
+
+CREATE MATERIALIZED VIEW analise_crescimento AS
+WITH despesas_inicio AS (
+    SELECT registro_ans, SUM(total_despesa) AS total
+    FROM resumo_operadora_trimestre
+    WHERE ano = 2023
+    GROUP BY registro_ans
+),
+despesas_fim AS (
+    SELECT registro_ans, SUM(total_despesa) AS total
+    FROM resumo_operadora_trimestre
+    WHERE ano = 2024 OR ano = 2025
+    GROUP BY registro_ans
+),
+crescimento AS (
+    SELECT
+        o.razao_social,
+        ((u.total - p.total) / NULLIF(p.total, 0)) * 100 AS crescimento
+    FROM despesas_inicio p
+    JOIN despesas_fim u ON p.registro_ans = u.registro_ans
+    JOIN operadoras o ON o.registro_operadora = p.registro_ans
+    WHERE p.total > 0
+)
+SELECT ROW_NUMBER() OVER (ORDER BY crescimento DESC) AS posicao, razao_social, crescimento
+FROM crescimento
+ORDER BY posicao
+LIMIT 5;
+
+CREATE UNIQUE INDEX ux_analise_crescimento ON analise_crescimento(posicao);
 
 -- Query 1: 5 operadoras com maior crescimento percentual
 WITH despesas_por_periodo AS (
@@ -0,0 +1,111 @@
+import os
+from decimal import Decimal
+
+import pytest
+import psycopg2
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import carga_dados
+
+SCHEMA = "carga_teste"
+
+CADASTRO = (
+    "REGISTRO_OPERADORA;CNPJ;Razao_Social;Nome_Fantasia;Modalidade;Logradouro;Numero;Complemento;Bairro;"
+    "Cidade;UF;CEP;DDD;Telefone;Fax;Endereco_eletronico;Representante;Cargo_Representante;"
+    "Regiao_de_Comercializacao;Data_Registro_ANS\n"
+    "344915;11222333000181;OPERADORA A;;Medicina de Grupo;;;;;SAO PAULO;SP;;;;;;;;1;2005-01-10\n"
+    "326305;44555666000199;OPERADORA B;;Cooperativa Médica;;;;;RECIFE;PE;;;;;;;;2;\n"
+)
+
+CONSOLIDADO = (
+    "CNPJ;RazaoSocial;ValorDespesas;Trimestre;Ano\n"
+    "344915;EVENTOS;1798.0;1;2025\n"
+    "44555666000199;EVENTOS;1234567.89;1;2025\n"
+    "999999;SEM CADASTRO;10.0;2;2025\n"
+)
+
+AGREGADAS = (
+    "REGISTRO_ANS;RazaoSocial;UF;TotalDespesas;MediaTrimestral;DesvioPadrao\n"
+    "344915;OPERADORA A;SP;1798.0;1798.0;0.0\n"
+    "326305;OPERADORA B;PE;1234567.89;1234567.89;0.0\n"
+    ";SEM UF;;10.0;10.0;0.0\n"
+)
+
+
+def ddl_tabelas():
+    with open(os.path.join(carga_dados.BASE_DIR, "queries_analiticas.sql"), encoding='utf-8') as f:
+        return f.read().split("-- Query 1")[0]
+
+
+@pytest.fixture
+def conn():
+    try:
+        conn = carga_dados.conectar()
+    except psycopg2.OperationalError:
+        pytest.skip("PostgreSQL indisponível")
+
+    with conn, conn.cursor() as cur:
+        cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE; CREATE SCHEMA {SCHEMA}")
+        cur.execute(f"SET search_path TO {SCHEMA}")
+        cur.execute(ddl_tabelas())
+    yield conn
+    with conn, conn.cursor() as cur:
+        cur.execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+    conn.close()
+
+
+@pytest.fixture
+def arquivos(tmp_path):
+    caminhos = {}
+    for nome, conteudo in (("cadastro", CADASTRO), ("consolidado", CONSOLIDADO), ("agregadas", AGREGADAS)):
+        caminhos[nome] = tmp_path / f"{nome}.csv"
+        caminhos[nome].write_text(conteudo, encoding='utf-8')
+    return caminhos
+
+
+def consulta(conn, sql):
+    with conn.cursor() as cur:
+        cur.execute(sql)
+        return cur.fetchall()
+
+
+def test_carga_resolve_operadoras_e_idempotente(conn, arquivos):
+    for _ in range(2):
+        resumo = carga_dados.carregar(
+            str(arquivos['consolidado']), str(arquivos['agregadas']), str(arquivos['cadastro']), conn=conn
+        )
+
+    assert resumo['stg_despesas'] == 3
+    assert resumo['despesas_removidas'] == 3
+    assert consulta(conn, "SELECT cnpj, registro_ans, trimestre, ano, valordespesas FROM despesas_consolidadas ORDER BY ano, trimestre, cnpj") == [
+        ("11222333000181", "344915", 1, 2025, Decimal("1798.00")),
+        ("44555666000199", "326305", 1, 2025, Decimal("1234567.89")),
+        ("999999", None, 2, 2025, Decimal("10.00")),
+    ]
+    assert consulta(conn, "SELECT razaosocial, uf FROM despesas_agregadas ORDER BY uf") == [
+        ("OPERADORA B", "PE"), ("OPERADORA A", "SP"),
+    ]
+    assert consulta(conn, "SELECT count(*) FROM operadoras") == [(2,)]
+    assert consulta(conn, "SELECT count(*) FROM stg_despesas") == [(0,)]
+    assert consulta(conn, "SELECT versao FROM versao_dados") == [(3,)]
+    assert consulta(conn, "SELECT registro_ans, total_despesa FROM resumo_operadora_trimestre ORDER BY total_despesa") == [
+        (None, Decimal("10.00")), ("344915", Decimal("1798.00")), ("326305", Decimal("1234567.89")),
+    ]
+
+
+def test_carga_parquet_recria_indices(conn, arquivos, tmp_path, monkeypatch):
+    monkeypatch.setattr(carga_dados, "LIMIAR_INDICES", 1)
+    particao = tmp_path / "consolidado_despesas" / "Ano=2025" / "Trimestre=3"
+    particao.mkdir(parents=True)
+    tabela = pa.table({'CNPJ': ["344915", "326305"], 'RazaoSocial': ["A", "B"], 'ValorDespesas': [1.5, 2.25]})
+    pq.write_table(tabela, particao / "3T2025.parquet")
+
+    resumo = carga_dados.carregar(str(tmp_path / "consolidado_despesas"), None, str(arquivos['cadastro']), conn=conn)
+
+    assert resumo['despesas_consolidadas'] == 2
+    assert consulta(conn, "SELECT registro_ans, ano, trimestre FROM despesas_consolidadas ORDER BY registro_ans") == [
+        ("326305", 2025, 3), ("344915", 2025, 3),
+    ]
+    indices = {nome for (nome,) in consulta(conn, f"SELECT indexname FROM pg_indexes WHERE schemaname = '{SCHEMA}'")}
+    assert set(carga_dados.INDICES_DESPESAS) <= indices
@@ -0,0 +1,93 @@
+import os
+import sqlalchemy
+
+MODO = os.getenv("ANALISE_MODO", "materializado")
+
+CONSULTAS_ADHOC = {
+    "estatisticas": """
+        SELECT SUM(valordespesas) as total, AVG(valordespesas) as media FROM despesas_consolidadas
+    """,
+    "top_operadoras": """
+        SELECT o.razao_social, SUM(d.valordespesas) as total_despesa
+        FROM despesas_consolidadas d
+        JOIN operadoras o ON o.registro_operadora = d.registro_ans
+        GROUP BY o.razao_social
+        ORDER BY total_despesa DESC LIMIT 5
+    """,
+    "despesas_por_uf": """
+        SELECT
+            o.uf,
+            SUM(d.valordespesas) AS total_despesa,
+            AVG(d.valordespesas) AS media_por_operadora
+        FROM despesas_consolidadas d
+        JOIN operadoras o ON o.registro_operadora = d.registro_ans
+        GROUP BY o.uf
+        ORDER BY total_despesa DESC
+        LIMIT 10
+    """,
+    "acima_da_media": """
+        WITH media_geral AS (
+            SELECT AVG(valordespesas) as media FROM despesas_consolidadas
+        ),
+        despesas_trimestre AS (
+            SELECT
+                registro_ans,
+                ano,
+                trimestre,
+                SUM(valordespesas) as total_trimestre
+            FROM despesas_consolidadas
+            GROUP BY registro_ans, ano, trimestre
+        ),
+        contagem_acima AS (
+            SELECT
+                dt.registro_ans,
+                COUNT(*) as trimestres_acima
+            FROM despesas_trimestre dt, media_geral mg
+            WHERE dt.total_trimestre > mg.media
+            GROUP BY dt.registro_ans
+            HAVING COUNT(*) >= 2
+        )
+        SELECT COUNT(*) as total_operadoras FROM contagem_acima
+    """,
+    "crescimento": """
+        WITH despesas_inicio AS (
+            SELECT registro_ans as reg_ans, SUM(valordespesas) as total
+            FROM despesas_consolidadas
+            WHERE ano = 2023
+            GROUP BY registro_ans
+        ),
+        despesas_fim AS (
+            SELECT registro_ans as reg_ans, SUM(valordespesas) as total
+            FROM despesas_consolidadas
+            WHERE ano = 2024 OR ano = 2025
+            GROUP BY registro_ans
+        )
+        SELECT
+            o.razao_social,
+            ((u.total - p.total) / NULLIF(p.total, 0)) * 100 as crescimento
+        FROM despesas_inicio p
+        JOIN despesas_fim u ON p.reg_ans = u.reg_ans
+        JOIN operadoras o ON o.registro_operadora = p.reg_ans
+        WHERE p.total > 0
+        ORDER BY crescimento DESC
+        LIMIT 5
+    """,
+}
+
+CONSULTAS_MATERIALIZADAS = {
+    "estatisticas": "SELECT total_geral as total, media_geral as media FROM analise_estatisticas",
+    "top_operadoras": "SELECT razao_social, total_despesa FROM analise_top_operadoras ORDER BY posicao",
+    "despesas_por_uf": "SELECT uf, total_despesa, media_por_operadora FROM analise_despesas_uf ORDER BY posicao LIMIT 10",
+    "acima_da_media": "SELECT total_operadoras FROM analise_acima_media",
+    "crescimento": "SELECT razao_social, crescimento FROM analise_crescimento ORDER BY posicao",
+}
+
+VIEWS_OPERADORAS = ["analise_top_operadoras", "analise_despesas_uf", "analise_crescimento"]
+
+async def atualizar_views_operadoras(db):
+    for view in VIEWS_OPERADORAS:
+        await db.execute(sqlalchemy.text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view}").execution_options(consulta=f"refresh:{view}"))
+
+def consulta(nome):
+    consultas = CONSULTAS_ADHOC if MODO == "adhoc" else CONSULTAS_MATERIALIZADAS
+    return sqlalchemy.text(consultas[nome]).execution_options(consulta=f"analise:{nome}")
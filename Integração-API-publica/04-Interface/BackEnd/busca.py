@@ -0,0 +1,184 @@
+import re
+import heapq
+import asyncio
+import unicodedata
+from bisect import bisect_left, insort
+import sqlalchemy
+
+TAMANHO_NGRAMA = 3
+SEPARADOR = "\x00"
+SO_DIGITOS = re.compile(r"^[\d.\-/ ]+$")
+NAO_DIGITO = re.compile(r"\D")
+ESPACOS = re.compile(r"\s+")
+CONSULTA_OPERADORAS = sqlalchemy.text(
+    "SELECT *, registro_operadora as registro_ans FROM operadoras"
+).execution_options(consulta="busca:operadoras")
+CONSULTA_POR_CNPJ = sqlalchemy.text(
+    "SELECT *, registro_operadora as registro_ans FROM operadoras WHERE cnpj = :cnpj"
+).execution_options(consulta="busca:operadora")
+
+def normalizar(texto):
+    if texto is None:
+        return ""
+    decomposto = unicodedata.normalize("NFKD", str(texto))
+    sem_acentos = "".join(c for c in decomposto if not unicodedata.combining(c))
+    return ESPACOS.sub(" ", sem_acentos).strip().casefold()
+
+def ngramas(texto):
+    return {texto[i:i + TAMANHO_NGRAMA] for i in range(len(texto) - TAMANHO_NGRAMA + 1)}
+
+def termos_da_busca(termo):
+    normalizado = normalizar(termo)
+    termos = [normalizado] if normalizado else []
+    if SO_DIGITOS.match(normalizado):
+        digitos = NAO_DIGITO.sub("", normalizado)
+        if digitos and digitos != normalizado:
+            termos.append(digitos)
+    return termos
+
+class Documento:
+    __slots__ = ("linha", "nomes", "identificadores", "palavras", "texto", "ordem")
+
+    def __init__(self, linha):
+        self.linha = linha
+        self.nomes = [normalizar(linha.get("razao_social")), normalizar(linha.get("nome_fantasia"))]
+        self.identificadores = [normalizar(linha.get("registro_operadora")), normalizar(linha.get("cnpj"))]
+        self.palavras = [p for nome in self.nomes for p in nome.split()]
+        self.texto = SEPARADOR.join(self.nomes + self.identificadores)
+        self.ordem = (len(self.nomes[0]), self.nomes[0])
+
+    def campos(self):
+        return {c for c in self.nomes + self.identificadores if c}
+
+def com_prefixo(ordenados, prefixo):
+    i = bisect_left(ordenados, (prefixo,))
+    while i < len(ordenados) and ordenados[i][0].startswith(prefixo):
+        yield ordenados[i]
+        i += 1
+
+def remover_ordenado(ordenados, item):
+    i = bisect_left(ordenados, item)
+    if i < len(ordenados) and ordenados[i] == item:
+        ordenados.pop(i)
+
+class IndiceBusca:
+    def __init__(self):
+        self.documentos = {}
+        self.postagens = {}
+        self.campos = []
+        self.palavras = []
+        self.pronto = False
+
+    def carregar(self, linhas):
+        self.documentos, self.postagens, self.campos, self.palavras = {}, {}, [], []
+        for linha in linhas:
+            self.adicionar(linha, ordenar=False)
+        self.campos.sort()
+        self.palavras.sort()
+        self.pronto = True
+
+    def adicionar(self, linha, ordenar=True):
+        registro = linha["registro_operadora"]
+        if registro in self.documentos:
+            self.remover(registro)
+        documento = Documento(linha)
+        self.documentos[registro] = documento
+        for ngrama in ngramas(documento.texto):
+            self.postagens.setdefault(ngrama, set()).add(registro)
+        inserir = insort if ordenar else list.append
+        for campo in documento.campos():
+            inserir(self.campos, (campo, registro))
+        for palavra in set(documento.palavras):
+            inserir(self.palavras, (palavra, registro))
+
+    def remover(self, registro):
+        documento = self.documentos.pop(registro, None)
+        if documento is None:
+            return
+        for ngrama in ngramas(documento.texto):
+            postagem = self.postagens.get(ngrama)
+            if postagem is not None:
+                postagem.discard(registro)
+                if not postagem:
+                    del self.postagens[ngrama]
+        for campo in documento.campos():
+            remover_ordenado(self.campos, (campo, registro))
+        for palavra in set(documento.palavras):
+            remover_ordenado(self.palavras, (palavra, registro))
+
+    def substituir_cnpj(self, cnpj, linhas):
+        for registro in [r for r, d in self.documentos.items() if d.linha.get("cnpj") == cnpj]:
+            self.remover(registro)
+        for linha in linhas:
+            self.adicionar(linha)
+
+    def candidatos(self, termo):
+        grams = ngramas(termo)
+        if not grams:
+            return self.documentos.keys()
+        postagens = sorted((self.postagens.get(g, set()) for g in grams), key=len)
+        return set.intersection(*postagens) if postagens[0] else set()
+
+    def coincidentes(self, termo):
+        registros = set()
+        for variante in termos_da_busca(termo):
+            registros.update(r for r in self.candidatos(variante) if variante in self.documentos[r].texto)
+        return registros
+
+    def buscar(self, termo):
+        return [self.documentos[r].linha for r in sorted(self.coincidentes(termo))]
+
+    def niveis(self, consulta, tokens):
+        exatos, prefixos = set(), set()
+        for campo, registro in com_prefixo(self.campos, consulta):
+            (exatos if campo == consulta else prefixos).add(registro)
+        yield exatos
+        yield prefixos
+        palavras = None
+        for token in tokens:
+            achados = {registro for _, registro in com_prefixo(self.palavras, token)}
+            palavras = achados if palavras is None else palavras & achados
+        yield palavras
+        substrings = None
+        for token in tokens:
+            achados = self.coincidentes(token)
+            substrings = achados if substrings is None else substrings & achados
+        yield substrings
+
+    def sugerir(self, termo, limite=10):
+        consulta = normalizar(termo)
+        tokens = consulta.split()
+        if not tokens:
+            return []
+        escolhidos, vistos = [], set()
+        for nivel in self.niveis(consulta, tokens):
+            novos = nivel - vistos
+            escolhidos.extend(heapq.nsmallest(limite - len(escolhidos), novos, key=lambda r: self.documentos[r].ordem))
+            vistos |= novos
+            if len(escolhidos) >= limite:
+                break
+        return [self.documentos[r].linha for r in escolhidos]
+
+indice = IndiceBusca()
+_carregando = asyncio.Lock()
+
+async def carregar(db):
+    linhas = [dict(r) for r in (await db.execute(CONSULTA_OPERADORAS)).mappings()]
+    indice.carregar(linhas)
+    return len(linhas)
+
+async def garantir(db):
+    if indice.pronto:
+        return
+    async with _carregando:
+        if not indice.pronto:
+            await carregar(db)
+
+async def atualizar_cnpj(db, cnpj):
+    if not indice.pronto:
+        return await garantir(db)
+    linhas = [dict(r) for r in (await db.execute(CONSULTA_POR_CNPJ, {"cnpj": cnpj})).mappings()]
+    indice.substituir_cnpj(cnpj, linhas)
+
+def invalidar():
+    indice.pronto = False
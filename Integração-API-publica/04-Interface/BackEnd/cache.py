@@ -0,0 +1,94 @@
+import os
+import json
+import time
+import asyncio
+from collections import Counter, OrderedDict
+from urllib.parse import urlencode
+from fastapi.encoders import jsonable_encoder
+
+CACHE_TTL_SEGUNDOS = int(os.getenv("CACHE_TTL_SEGUNDOS", "300"))
+CACHE_MAX_ITENS = int(os.getenv("CACHE_MAX_ITENS", "1024"))
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL")
+CACHE_PREFIXO_REDIS = "ans:"
+
+AUSENTE = object()
+
+class CacheLocal:
+    def __init__(self, max_itens=CACHE_MAX_ITENS):
+        self.max_itens = max_itens
+        self.itens = OrderedDict()
+
+    async def get(self, chave):
+        item = self.itens.get(chave)
+        if item is None:
+            return AUSENTE
+        expira, valor = item
+        if expira < time.monotonic():
+            del self.itens[chave]
+            return AUSENTE
+        self.itens.move_to_end(chave)
+        return valor
+
+    async def set(self, chave, valor, ttl):
+        self.itens[chave] = (time.monotonic() + ttl, valor)
+        self.itens.move_to_end(chave)
+        while len(self.itens) > self.max_itens:
+            self.itens.popitem(last=False)
+
+    async def invalidar(self, prefixo=""):
+        for chave in [c for c in self.itens if c.startswith(prefixo)]:
+            del self.itens[chave]
+
+class CacheRedis:
+    def __init__(self, url):
+        import redis.asyncio as redis
+        self.cliente = redis.from_url(url)
+
+    async def get(self, chave):
+        valor = await self.cliente.get(CACHE_PREFIXO_REDIS + chave)
+        return AUSENTE if valor is None else json.loads(valor)
+
+    async def set(self, chave, valor, ttl):
+        await self.cliente.set(CACHE_PREFIXO_REDIS + chave, json.dumps(jsonable_encoder(valor)), ex=ttl)
+
+    async def invalidar(self, prefixo=""):
+        chaves = [c async for c in self.cliente.scan_iter(match=f"{CACHE_PREFIXO_REDIS}{prefixo}*")]
+        if chaves:
+            await self.cliente.delete(*chaves)
+
+backend = CacheRedis(CACHE_REDIS_URL) if CACHE_REDIS_URL else CacheLocal()
+em_voo = {}
+geracao = 0
+consultas = Counter()
+
+def chave(endpoint, **params):
+    return f"{endpoint}?{urlencode(sorted(params.items()))}"
+
+async def obter(chave, carregar, ttl=CACHE_TTL_SEGUNDOS):
+    prefixo = chave.split("?", 1)[0]
+    valor = await backend.get(chave)
+    if valor is not AUSENTE:
+        consultas[(prefixo, "acerto")] += 1
+        return valor
+
+    tarefa = em_voo.get(chave)
+    consultas[(prefixo, "falha" if tarefa is None else "em_voo")] += 1
+    if tarefa is None:
+        tarefa = asyncio.ensure_future(carregar_e_guardar(chave, carregar, ttl, geracao))
+        em_voo[chave] = tarefa
+        tarefa.add_done_callback(lambda t: em_voo.pop(chave) if em_voo.get(chave) is t else None)
+    return await asyncio.shield(tarefa)
+
+async def carregar_e_guardar(chave, carregar, ttl, inicio):
+    valor = await carregar()
+    if inicio == geracao:
+        await backend.set(chave, valor, ttl)
+    return valor
+
+async def invalidar(*prefixos):
+    global geracao
+    geracao += 1
+    for prefixo in prefixos or ("",):
+        for chave_voo in [c for c in em_voo if c.startswith(prefixo)]:
+            del em_voo[chave_voo]
+        await backend.invalidar(prefixo)
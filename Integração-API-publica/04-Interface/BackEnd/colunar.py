@@ -0,0 +1,192 @@
+import os
+import threading
+import numpy as np
+import pandas as pd
+import pyarrow.dataset as ds
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RAIZ = os.path.join(BASE_DIR, "..", "..")
+
+CONSOLIDADO_PARQUET = os.path.join(RAIZ, "01-Consolidação", "consolidado_despesas")
+CONSOLIDADO_CSV = os.path.join(RAIZ, "01-Consolidação", "consolidado_despesas.csv")
+CADASTRO_CSV = os.path.join(RAIZ, "02-Validação", "cadastro_operadoras.csv")
+
+COLUNAR_CONSOLIDADO = os.getenv("COLUNAR_CONSOLIDADO") or (
+    CONSOLIDADO_PARQUET if os.path.isdir(CONSOLIDADO_PARQUET) else CONSOLIDADO_CSV
+)
+COLUNAR_CADASTRO = os.getenv("COLUNAR_CADASTRO", CADASTRO_CSV)
+
+ANO_BASE_CRESCIMENTO = 2023
+ANOS_FIM_CRESCIMENTO = (2024, 2025)
+
+_dados = None
+_carregando = threading.Lock()
+
+def ler_consolidado(caminho):
+    if os.path.isdir(caminho):
+        tabela = ds.dataset(caminho, format="parquet", partitioning="hive").to_table(
+            columns=["CNPJ", "ValorDespesas", "Ano", "Trimestre"]
+        )
+        return tabela.to_pandas()
+    return pd.read_csv(
+        caminho, sep=";", encoding="utf-8-sig", dtype={"CNPJ": str},
+        usecols=["CNPJ", "ValorDespesas", "Trimestre", "Ano"],
+    )
+
+def ler_cadastro(caminho):
+    df = pd.read_csv(
+        caminho, sep=";", encoding="utf-8", dtype=str, keep_default_na=False,
+        usecols=["REGISTRO_OPERADORA", "CNPJ", "Razao_Social", "UF"],
+    )
+    df = df[df["REGISTRO_OPERADORA"] != ""].drop_duplicates("REGISTRO_OPERADORA").reset_index(drop=True)
+    return df.replace("", None)
+
+def resolver_registros(ids, cadastro):
+    posicao_cnpj = pd.Series(cadastro.index, index=cadastro["CNPJ"])
+    posicao_cnpj = posicao_cnpj[~posicao_cnpj.index.duplicated()]
+    posicao_registro = pd.Series(cadastro.index, index=cadastro["REGISTRO_OPERADORA"])
+
+    codigos, unicos = pd.factorize(ids)
+    por_cnpj = posicao_cnpj.reindex(unicos).to_numpy()
+    por_registro = posicao_registro.reindex(unicos).to_numpy()
+    resolvido = np.where(np.isnan(por_cnpj), por_registro, por_cnpj)
+    resolvido = np.where(np.isnan(resolvido), -1, resolvido).astype(np.int32)
+    return resolvido[codigos], codigos, unicos
+
+def somar_grupos(df, chaves):
+    grupos = df.groupby(chaves, sort=False).agg(centavos=("centavos", "sum"), validos=("valido", "sum")).reset_index()
+    grupos["total"] = [int(c) if v else None for c, v in zip(grupos["centavos"], grupos["validos"])]
+    return grupos
+
+def ordenar_desc(linhas, chave, limite):
+    return sorted(linhas, key=lambda l: (l[chave] is not None, -(l[chave] or 0)))[:limite]
+
+def reais(centavos, divisor=1):
+    return None if centavos is None else centavos / (100 * divisor)
+
+def serie(grupos):
+    series = {}
+    for chave, ano, trimestre, total in grupos.itertuples(index=False, name=None):
+        series.setdefault(chave, {})[(int(ano), int(trimestre))] = total
+    return series
+
+def carregar_dados(consolidado=None, cadastro=None):
+    consolidado = consolidado or COLUNAR_CONSOLIDADO
+    cadastro = cadastro or COLUNAR_CADASTRO
+
+    ops = ler_cadastro(cadastro)
+    df = ler_consolidado(consolidado)
+    valores = df["ValorDespesas"].to_numpy(dtype=np.float64)
+
+    reg_code, id_code, ids = resolver_registros(df["CNPJ"].astype(str).to_numpy(), ops)
+    base = pd.DataFrame({
+        "reg": reg_code,
+        "id": id_code,
+        "ano": df["Ano"].to_numpy(dtype=np.int16),
+        "trimestre": df["Trimestre"].to_numpy(dtype=np.int8),
+        "centavos": np.where(np.isnan(valores), 0, np.rint(valores * 100)).astype(np.int64),
+        "valido": ~np.isnan(valores),
+    })
+
+    total = int(base["centavos"].sum())
+    validos = int(base["valido"].sum())
+    resolvidas = base[base["reg"] >= 0]
+
+    razao = ops["Razao_Social"].to_numpy(dtype=object)
+    uf = ops["UF"].to_numpy(dtype=object)
+    registros = ops["REGISTRO_OPERADORA"].to_numpy(dtype=object)
+
+    por_razao = somar_grupos(resolvidas.assign(razao=razao[resolvidas["reg"]]).astype({"razao": str}), ["razao"])
+    top_5 = ordenar_desc(
+        [{"razao_social": r, "total_despesa": reais(t)} for r, t in zip(por_razao["razao"], por_razao["total"])],
+        "total_despesa", 5,
+    )
+
+    por_uf = somar_grupos(resolvidas.assign(uf=pd.array(uf[resolvidas["reg"]], dtype="string")), ["uf"])
+    despesas_uf = ordenar_desc([
+        {"uf": u, "total_despesa": reais(t), "media_por_operadora": reais(t, v) if v else None}
+        for u, t, v in zip(por_uf["uf"], por_uf["total"], por_uf["validos"])
+    ], "total_despesa", 10)
+
+    por_trimestre = somar_grupos(base, ["reg", "ano", "trimestre"])
+    acima = por_trimestre[[t is not None and validos > 0 and t * validos > total for t in por_trimestre["total"]]]
+    acima_da_media = int((acima.groupby("reg").size() >= 2).sum())
+
+    inicio = somar_grupos(resolvidas[resolvidas["ano"] == ANO_BASE_CRESCIMENTO], ["reg"])
+    fim = somar_grupos(resolvidas[resolvidas["ano"].isin(ANOS_FIM_CRESCIMENTO)], ["reg"])
+    pares = inicio.merge(fim, on="reg", suffixes=("_inicio", "_fim"))
+    crescimento = ordenar_desc([
+        {"razao_social": razao[r], "crescimento": None if f is None else (f - i) * 100 / i}
+        for r, i, f in zip(pares["reg"], pares["total_inicio"], pares["total_fim"])
+        if i is not None and i > 0
+    ], "crescimento", 5)
+
+    historico_reg = serie(somar_grupos(resolvidas, ["reg", "ano", "trimestre"])[["reg", "ano", "trimestre", "total"]])
+    sem_registro = base[base["reg"] < 0]
+    historico_id = serie(somar_grupos(sem_registro, ["id", "ano", "trimestre"])[["id", "ano", "trimestre", "total"]])
+
+    cnpj_para_regs = {}
+    for cnpj, registro in zip(ops["CNPJ"], registros):
+        if cnpj is not None:
+            cnpj_para_regs.setdefault(cnpj, []).append(registro)
+
+    mtime = max(os.path.getmtime(p) for p in (consolidado, cadastro))
+    return {
+        "estatisticas": {"total_geral": reais(total) if validos else None, "media_geral": reais(total, validos) if validos else None, "top_5": top_5},
+        "despesas_por_uf": despesas_uf,
+        "acima_da_media": {"total_operadoras": acima_da_media},
+        "crescimento": crescimento,
+        "historico_registro": {registros[r]: s for r, s in historico_reg.items()},
+        "historico_identificador": {ids[i]: s for i, s in historico_id.items()},
+        "posicao_registro": {r: i for i, r in enumerate(registros)},
+        "cnpj_para_regs": cnpj_para_regs,
+        "versao": int(mtime * 1000),
+        "epoch": mtime,
+    }
+
+def dados():
+    global _dados
+    if _dados is None:
+        with _carregando:
+            if _dados is None:
+                _dados = carregar_dados()
+    return _dados
+
+def carregado():
+    return _dados is not None
+
+def estatisticas():
+    return dados()["estatisticas"]
+
+def despesas_por_uf():
+    return dados()["despesas_por_uf"]
+
+def acima_da_media():
+    return dados()["acima_da_media"]
+
+def crescimento():
+    return dados()["crescimento"]
+
+def versao():
+    return dados()["versao"], dados()["epoch"]
+
+def historico_despesas(identificadores):
+    d = dados()
+    resolvidos = {
+        i: sorted(set(d["cnpj_para_regs"].get(i, [])) | ({i} if i in d["posicao_registro"] else set()))
+        for i in identificadores
+    }
+
+    historicos = {}
+    for identificador in identificadores:
+        series = [d["historico_registro"].get(r, {}) for r in resolvidos[identificador]]
+        series.append(d["historico_identificador"].get(identificador, {}))
+        totais = {}
+        for periodo, valor in (item for s in series for item in s.items()):
+            atual = totais.get(periodo)
+            totais[periodo] = valor if atual is None else (atual if valor is None else atual + valor)
+        historicos[identificador] = [
+            {"ano": ano, "trimestre": trimestre, "valordespesas": reais(totais[(ano, trimestre)])}
+            for ano, trimestre in sorted(totais, reverse=True)
+        ]
+    return resolvidos, historicos
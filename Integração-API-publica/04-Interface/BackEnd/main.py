@@ -1,193 +1,651 @@
-from fastapi import FastAPI, Depends, HTTPException
-from sqlalchemy.orm import Session
-from database import get_db
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from contextlib import asynccontextmanager
+from database import get_async_db, async_engine, AsyncSessionLocal, BACKEND_DADOS
 import sqlalchemy
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List
+from fastapi.middleware.gzip import GZipMiddleware
+from email.utils import formatdate, parsedate_to_datetime
+from bisect import bisect_right
+from collections import Counter
+from pydantic import ValidationError
+from typing import List, Literal, Optional
 import schemas
-from datetime import datetime, timedelta
+import analises
+import cache
+import busca
+import io
+import csv
+import base64
+import json
+import os
+import orjson
+import importlib.util
+import re
 
-app = FastAPI(title="API ANS - Case Intuitive Care")
+@asynccontextmanager
+async def lifespan(app):
+    if BACKEND_COLUNAR:
+        await run_in_threadpool(colunar.dados)
+    else:
+        try:
+            async with AsyncSessionLocal() as db:
+                await busca.carregar(db)
+        except Exception as e:
+            print(f"Índice de busca será carregado na primeira consulta: {e}")
+    yield
+    await async_engine.dispose()
 
-cache_data = None
-cache_timestamp = None
-CACHE_TTL_MINUTES = 5
+app = FastAPI(title="API ANS - Case Intuitive Care", lifespan=lifespan)
+
+COMPRESSAO_MIN_BYTES = int(os.getenv("COMPRESSAO_MIN_BYTES", "1024"))
+VERSAO_TTL_SEGUNDOS = int(os.getenv("VERSAO_TTL_SEGUNDOS", "5"))
+INCREMENTA_VERSAO = sqlalchemy.text("UPDATE versao_dados SET versao = versao + 1, atualizado_em = now() WHERE id = 1")
+versao_vista = None
+ESCRITA_LOTE = int(os.getenv("ESCRITA_LOTE", "1000"))
+EXPORTACAO_LOTE = int(os.getenv("EXPORTACAO_LOTE", "10000"))
+EXPORTACAO_GRUPO_PARQUET = int(os.getenv("EXPORTACAO_GRUPO_PARQUET", "100000"))
+PARQUET_DISPONIVEL = importlib.util.find_spec("pyarrow") is not None
+BACKEND_COLUNAR = BACKEND_DADOS == "colunar"
+AUTOCOMPLETE_MAX = 50
+ROTAS_COLUNARES = re.compile(r"^/api/(estatisticas|analise/.+|operadoras/despesas|operadoras/[^/]+/despesas)$")
+ROTAS_SEM_404 = re.compile(r"^/api/(estatisticas|analise/.+|operadoras/[^/]+/despesas)$")
+METRICAS_ATIVAS = os.getenv("METRICAS", "1") == "1" and importlib.util.find_spec("prometheus_client") is not None
+
+if BACKEND_COLUNAR:
+    import colunar
+
+@app.middleware("http")
+async def rotas_colunares(request: Request, call_next):
+    if BACKEND_COLUNAR and request.url.path.startswith("/api/") and not ROTAS_COLUNARES.match(request.url.path):
+        return resposta_json({"detail": "Rota indisponível com BACKEND_DADOS=colunar"}, status_code=503)
+    return await call_next(request)
 
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Last-Modified"],
 )
 
+if importlib.util.find_spec("brotli_asgi"):
+    from brotli_asgi import BrotliMiddleware
+    app.add_middleware(BrotliMiddleware, minimum_size=COMPRESSAO_MIN_BYTES)
+else:
+    app.add_middleware(GZipMiddleware, minimum_size=COMPRESSAO_MIN_BYTES)
+
+async def versao_dados():
+    global versao_vista
+
+    async def carregar():
+        async with AsyncSessionLocal() as db:
+            query = sqlalchemy.text("SELECT versao, EXTRACT(EPOCH FROM atualizado_em)::float8 AS epoch FROM versao_dados WHERE id = 1").execution_options(consulta="versao_dados")
+            linha = (await db.execute(query)).mappings().first()
+        return [linha["versao"], linha["epoch"]]
+
+    versao, epoch = await cache.obter("versao:dados", carregar, ttl=VERSAO_TTL_SEGUNDOS)
+    if versao_vista is not None and versao_vista != versao:
+        await cache.invalidar()
+        busca.invalidar()
+    versao_vista = versao
+    return versao, epoch
+
+def nao_modificado(request, etag, epoch):
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        return if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(epoch) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+@app.middleware("http")
+async def respostas_condicionais(request: Request, call_next):
+    if request.method != "GET" or not request.url.path.startswith("/api/"):
+        return await call_next(request)
+
+    if BACKEND_COLUNAR and not colunar.carregado():
+        await run_in_threadpool(colunar.dados)
+    versao, epoch = colunar.versao() if BACKEND_COLUNAR else await versao_dados()
+    headers = {
+        "ETag": f'W/"{versao}-{int(epoch * 1000)}"',
+        "Last-Modified": formatdate(epoch, usegmt=True),
+        "Cache-Control": "no-cache",
+    }
+    if ROTAS_SEM_404.match(request.url.path) and nao_modificado(request, headers["ETag"], epoch):
+        return Response(status_code=304, headers=headers)
+    response = await call_next(request)
+    if response.status_code != 200:
+        return response
+    if nao_modificado(request, headers["ETag"], epoch):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return response
+
+if METRICAS_ATIVAS:
+    import metricas
+    metricas.instalar(app, async_engine)
+
+def resposta_json(conteudo, status_code=200):
+    return Response(orjson.dumps(conteudo, default=float), status_code=status_code, media_type="application/json")
+
+def codificar_cursor(registro):
+    return base64.urlsafe_b64encode(json.dumps({"r": registro}).encode()).decode()
+
+def decodificar_cursor(cursor):
+    try:
+        return str(json.loads(base64.urlsafe_b64decode(cursor.encode()))["r"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+async def contar_operadoras(db):
+    async def carregar():
+        query = sqlalchemy.text("SELECT COUNT(*) FROM operadoras").execution_options(consulta="operadoras:contagem")
+        return (await db.execute(query)).scalar()
+    return await cache.obter("operadoras:contagem", carregar)
+
+async def estimar_operadoras(db):
+    query = sqlalchemy.text("SELECT GREATEST(reltuples, 0)::bigint FROM pg_class WHERE oid = 'operadoras'::regclass")
+    return (await db.execute(query)).scalar()
+
+def paginar_busca(linhas, page, limit, cursor, after, contagem):
+    next_cursor = None
+    if cursor is not None:
+        inicio = bisect_right(linhas, after, key=lambda l: l["registro_operadora"]) if cursor else 0
+        pagina = linhas[inicio:inicio + limit]
+        if pagina and len(linhas) > inicio + limit:
+            next_cursor = codificar_cursor(pagina[-1]["registro_operadora"])
+    else:
+        pagina = linhas[max(page - 1, 0) * limit:max(page, 0) * limit]
+
+    modo_contagem = contagem or ("nenhuma" if cursor is not None else "exata")
+    return {
+        "data": pagina,
+        "total": None if modo_contagem == "nenhuma" else len(linhas),
+        "page": page if cursor is None else None,
+        "limit": limit,
+        "next_cursor": next_cursor
+    }
+
 @app.get("/api/operadoras", response_model=schemas.PaginatedOperadoras)
-def list_operadoras(page: int = 1, limit: int = 10, search: str = None, db: Session = Depends(get_db)):
-    offset = (page - 1) * limit
-    
-    where_clause = ""
-    params = {"limit": limit, "offset": offset}
-    
+async def list_operadoras(
+    page: int = 1,
+    limit: int = Query(10, ge=1),
+    search: str = None,
+    cursor: Optional[str] = None,
+    contagem: Optional[Literal["exata", "estimada", "nenhuma"]] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    after = decodificar_cursor(cursor) if cursor else None
     if search:
-        where_clause = "WHERE razao_social ILIKE :search OR cnpj LIKE :search OR registro_operadora::text LIKE :search"
-        params["search"] = f"%{search}%"
-        
-    query_str = f"SELECT *, registro_operadora as registro_ans FROM operadoras {where_clause} LIMIT :limit OFFSET :offset"
-    total_str = f"SELECT COUNT(*) FROM operadoras {where_clause}"
-    
-    query = db.execute(sqlalchemy.text(query_str), params).mappings().all()
-    total = db.execute(sqlalchemy.text(total_str), params).scalar()
+        await busca.garantir(db)
+        return paginar_busca(busca.indice.buscar(search), page, limit, cursor, after, contagem)
+
+    chave = cache.chave("operadoras:lista", page=page, limit=limit, cursor=cursor or "", contagem=contagem or "")
+
+    async def carregar():
+        filtro = ""
+        params = {"limit": limit}
+
+        if cursor is not None:
+            if cursor:
+                filtro = "WHERE registro_operadora > :after"
+                params["after"] = after
+            params["limit"] = limit + 1
+            pagina_clause = "LIMIT :limit"
+        else:
+            params["offset"] = (page - 1) * limit
+            pagina_clause = "LIMIT :limit OFFSET :offset"
+
+        query_str = f"SELECT *, registro_operadora as registro_ans FROM operadoras {filtro} ORDER BY registro_operadora {pagina_clause}"
+        query = [dict(r) for r in (await db.execute(sqlalchemy.text(query_str).execution_options(consulta="operadoras:lista"), params)).mappings()]
+
+        next_cursor = None
+        if cursor is not None:
+            if len(query) > limit:
+                query = query[:limit]
+                next_cursor = codificar_cursor(query[-1]["registro_operadora"])
+
+        modo_contagem = contagem or ("nenhuma" if cursor is not None else "exata")
+        total = None
+        if modo_contagem == "exata":
+            total = await contar_operadoras(db)
+        elif modo_contagem == "estimada":
+            total = await estimar_operadoras(db)
     
-    return {
-        "data": query,
-        "total": total,
-        "page": page,
-        "limit": limit
-    }
+        return {
+            "data": query,
+            "total": total,
+            "page": page if cursor is None else None,
+            "limit": limit,
+            "next_cursor": next_cursor
+        }
+
+    return await cache.obter(chave, carregar)
+
+@app.get("/api/operadoras/autocomplete", response_model=List[schemas.OperadoraSugestao])
+async def autocomplete_operadoras(q: str, limit: int = Query(10, ge=1, le=AUTOCOMPLETE_MAX), db: AsyncSession = Depends(get_async_db)):
+    await busca.garantir(db)
+    return busca.indice.sugerir(q, limit)
 
 @app.get("/api/operadoras/{identificador}", response_model=schemas.OperadoraResponse)
-def get_operadora(identificador: str, db: Session = Depends(get_db)):
-    query = sqlalchemy.text("SELECT *, registro_operadora as registro_ans FROM operadoras WHERE cnpj = :id OR registro_operadora::text = :id")
-    result = db.execute(query, {"id": identificador}).mappings().first()
+async def get_operadora(identificador: str, db: AsyncSession = Depends(get_async_db)):
+    async def carregar():
+        query = sqlalchemy.text("SELECT *, registro_operadora as registro_ans FROM operadoras WHERE cnpj = :id OR registro_operadora::text = :id")
+        result = (await db.execute(query, {"id": identificador})).mappings().first()
+        return dict(result) if result else None
+
+    result = await cache.obter(cache.chave("operadoras:detalhe", id=identificador), carregar)
     if not result:
         raise HTTPException(status_code=404, detail="Operadora não encontrada")
     return result
 
 @app.post("/api/operadoras")
-def create_operadora(data: schemas.OperadoraCreate, db: Session = Depends(get_db)):
+async def create_operadora(data: schemas.OperadoraCreate, db: AsyncSession = Depends(get_async_db)):
     query = sqlalchemy.text("""
         INSERT INTO operadoras (registro_operadora, razao_social, cnpj, uf) 
         VALUES (:reg, :rs, :cnpj, :uf)
     """)
-    db.execute(query, {"reg": data.registro_operadora, "rs": data.razao_social, "cnpj": data.cnpj, "uf": data.uf})
-    db.commit()
+    await db.execute(query, {"reg": str(data.registro_operadora), "rs": data.razao_social, "cnpj": data.cnpj, "uf": data.uf})
+    await analises.atualizar_views_operadoras(db)
+    await db.execute(INCREMENTA_VERSAO)
+    await db.commit()
+    await cache.invalidar("operadoras:", "analise:", "versao:")
+    await busca.atualizar_cnpj(db, data.cnpj)
     return {"message": "Operadora criada com sucesso!"}
 
 @app.put("/api/operadoras/{cnpj}")
-def update_operadora(cnpj: str, data: schemas.OperadoraUpdate, db: Session = Depends(get_db)):
+async def update_operadora(cnpj: str, data: schemas.OperadoraUpdate, db: AsyncSession = Depends(get_async_db)):
     query = sqlalchemy.text("UPDATE operadoras SET razao_social = :rs, uf = :uf WHERE cnpj = :cnpj")
-    db.execute(query, {"rs": data.razao_social, "uf": data.uf, "cnpj": cnpj})
-    db.commit()
+    await db.execute(query, {"rs": data.razao_social, "uf": data.uf, "cnpj": cnpj})
+    await analises.atualizar_views_operadoras(db)
+    await db.execute(INCREMENTA_VERSAO)
+    await db.commit()
+    await cache.invalidar("operadoras:", "analise:", "versao:")
+    await busca.atualizar_cnpj(db, cnpj)
     return {"message": "Operadora atualizada!"}
 
 @app.delete("/api/operadoras/{cnpj}")
-def delete_operadora(cnpj: str, db: Session = Depends(get_db)):
+async def delete_operadora(cnpj: str, db: AsyncSession = Depends(get_async_db)):
     query = sqlalchemy.text("DELETE FROM operadoras WHERE cnpj = :cnpj")
-    db.execute(query, {"cnpj": cnpj})
-    db.commit()
+    await db.execute(query, {"cnpj": cnpj})
+    await analises.atualizar_views_operadoras(db)
+    await db.execute(INCREMENTA_VERSAO)
+    await db.commit()
+    await cache.invalidar("operadoras:", "analise:", "versao:")
+    await busca.atualizar_cnpj(db, cnpj)
     return {"message": "Operadora excluída!"}
 
+UPSERT_OPERADORAS = sqlalchemy.text("""
+    INSERT INTO operadoras (registro_operadora, razao_social, cnpj, uf)
+    SELECT * FROM unnest(CAST(:regs AS varchar[]), CAST(:rs AS varchar[]), CAST(:cnpjs AS varchar[]), CAST(:ufs AS varchar[]))
+    ON CONFLICT (registro_operadora) DO UPDATE
+    SET razao_social = EXCLUDED.razao_social, cnpj = EXCLUDED.cnpj, uf = EXCLUDED.uf
+    RETURNING registro_operadora, xmax = 0 AS inserida
+""").execution_options(consulta="operadoras:lote_upsert")
+
+ATUALIZA_OPERADORAS = sqlalchemy.text("""
+    UPDATE operadoras o
+    SET razao_social = COALESCE(v.rs, o.razao_social), uf = COALESCE(v.uf, o.uf)
+    FROM unnest(CAST(:cnpjs AS varchar[]), CAST(:rs AS varchar[]), CAST(:ufs AS varchar[])) AS v(cnpj, rs, uf)
+    WHERE o.cnpj = v.cnpj
+    RETURNING o.cnpj
+""").execution_options(consulta="operadoras:lote_update")
+
+EXCLUI_OPERADORAS = sqlalchemy.text(
+    "DELETE FROM operadoras WHERE cnpj = ANY(:cnpjs) RETURNING cnpj"
+).execution_options(consulta="operadoras:lote_delete")
+
+def ler_linha_lote(linha):
+    try:
+        return orjson.loads(linha)
+    except orjson.JSONDecodeError as e:
+        return e
+
+async def ler_lote(request):
+    if "ndjson" not in request.headers.get("content-type", ""):
+        return orjson.loads(await request.body())
+    itens, resto = [], b""
+    async for parte in request.stream():
+        linhas = (resto + parte).split(b"\n")
+        resto = linhas.pop()
+        itens.extend(ler_linha_lote(linha) for linha in linhas if linha.strip())
+    if resto.strip():
+        itens.append(ler_linha_lote(resto))
+    return itens
+
+def validar_lote(itens):
+    validas, resultados = [], []
+    for linha, item in enumerate(itens):
+        operacao = item.get("operacao", "upsert") if isinstance(item, dict) else None
+        resultado = {"linha": linha, "operacao": operacao, "status": "invalida", "chave": None, "erros": []}
+        resultados.append(resultado)
+        if isinstance(item, orjson.JSONDecodeError):
+            resultado["erros"].append(f"JSON inválido: {item}")
+            continue
+        if not isinstance(operacao, str) or operacao not in OPERACOES_LOTE:
+            resultado["erros"].append(f"Operação inválida: {operacao}" if isinstance(item, dict) else "Linha não é um objeto JSON")
+            continue
+        try:
+            dados = OPERACOES_LOTE[operacao][0].model_validate(item)
+        except ValidationError as e:
+            resultado["erros"].extend(f"{'.'.join(map(str, erro['loc']))}: {erro['msg']}" for erro in e.errors())
+            continue
+        resultado["chave"] = str(dados.registro_operadora) if operacao == "upsert" else dados.cnpj
+        validas.append((resultado, dados))
+    return validas, resultados
+
+def agrupar_lote(validas):
+    grupo, chaves = [], set()
+    for resultado, dados in validas:
+        if grupo and (resultado["operacao"] != grupo[0][0]["operacao"] or resultado["chave"] in chaves or len(grupo) >= ESCRITA_LOTE):
+            yield grupo
+            grupo, chaves = [], set()
+        grupo.append((resultado, dados))
+        chaves.add(resultado["chave"])
+    if grupo:
+        yield grupo
+
+async def upsert_operadoras(db, grupo):
+    params = {
+        "regs": [r["chave"] for r, _ in grupo],
+        "rs": [d.razao_social for _, d in grupo],
+        "cnpjs": [d.cnpj for _, d in grupo],
+        "ufs": [d.uf for _, d in grupo],
+    }
+    inseridas = {l.registro_operadora: l.inserida for l in await db.execute(UPSERT_OPERADORAS, params)}
+    for resultado, _ in grupo:
+        resultado["status"] = "criada" if inseridas[resultado["chave"]] else "atualizada"
+
+async def atualizar_operadoras(db, grupo):
+    params = {
+        "cnpjs": [d.cnpj for _, d in grupo],
+        "rs": [d.razao_social for _, d in grupo],
+        "ufs": [d.uf for _, d in grupo],
+    }
+    alteradas = set((await db.execute(ATUALIZA_OPERADORAS, params)).scalars())
+    for resultado, _ in grupo:
+        resultado["status"] = "atualizada" if resultado["chave"] in alteradas else "nao_encontrada"
+
+async def excluir_operadoras(db, grupo):
+    excluidas = set((await db.execute(EXCLUI_OPERADORAS, {"cnpjs": [d.cnpj for _, d in grupo]})).scalars())
+    for resultado, _ in grupo:
+        resultado["status"] = "excluida" if resultado["chave"] in excluidas else "nao_encontrada"
+
+OPERACOES_LOTE = {
+    "upsert": (schemas.OperadoraCreate, upsert_operadoras),
+    "update": (schemas.OperadoraAtualizacaoLote, atualizar_operadoras),
+    "delete": (schemas.OperadoraExclusao, excluir_operadoras),
+}
+
+@app.post("/api/operadoras/lote", response_model=schemas.ResultadoLote)
+async def aplicar_lote_operadoras(request: Request, db: AsyncSession = Depends(get_async_db)):
+    try:
+        itens = await ler_lote(request)
+    except orjson.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Corpo inválido: envie um array JSON ou NDJSON")
+    if not isinstance(itens, list):
+        raise HTTPException(status_code=400, detail="Corpo inválido: envie um array JSON ou NDJSON")
+
+    validas, resultados = validar_lote(itens)
+    if validas:
+        try:
+            for grupo in agrupar_lote(validas):
+                await OPERACOES_LOTE[grupo[0][0]["operacao"]][1](db, grupo)
+            await analises.atualizar_views_operadoras(db)
+            await db.execute(INCREMENTA_VERSAO)
+            await db.commit()
+        except sqlalchemy.exc.DBAPIError as e:
+            await db.rollback()
+            raise HTTPException(status_code=409, detail=f"Lote rejeitado pelo banco, nenhuma alteração aplicada: {e.orig}")
+        await cache.invalidar("operadoras:", "analise:", "versao:")
+        await busca.carregar(db)
+
+    return resposta_json({
+        "total": len(resultados),
+        "resumo": dict(Counter(r["status"] for r in resultados)),
+        "resultados": resultados,
+    })
+
+RESOLVE_IDENTIFICADORES = sqlalchemy.text("""
+    SELECT cnpj, registro_operadora FROM operadoras WHERE cnpj = ANY(:ids)
+    UNION
+    SELECT cnpj, registro_operadora FROM operadoras WHERE registro_operadora = ANY(:ids)
+""")
+
+HISTORICO_DESPESAS = sqlalchemy.text("""
+    SELECT 'registro' AS origem, registro_ans AS chave, ano, trimestre, SUM(valordespesas) AS valordespesas
+    FROM despesas_consolidadas
+    WHERE registro_ans = ANY(:regs)
+    GROUP BY registro_ans, ano, trimestre
+    UNION ALL
+    SELECT 'identificador' AS origem, cnpj AS chave, ano, trimestre, SUM(valordespesas) AS valordespesas
+    FROM despesas_consolidadas
+    WHERE cnpj = ANY(:ids) AND registro_ans IS NULL
+    GROUP BY cnpj, ano, trimestre
+""")
+
+async def resolver_identificadores(db, identificadores):
+    linhas = (await db.execute(RESOLVE_IDENTIFICADORES, {"ids": identificadores})).mappings().all()
+    return {
+        identificador: sorted({l["registro_operadora"] for l in linhas if identificador in (l["cnpj"], l["registro_operadora"])})
+        for identificador in identificadores
+    }
+
+async def historico_despesas(db, identificadores):
+    resolvidos = await resolver_identificadores(db, identificadores)
+    regs = sorted({reg for lista in resolvidos.values() for reg in lista})
+    linhas = (await db.execute(HISTORICO_DESPESAS, {"regs": regs, "ids": identificadores})).mappings().all()
+
+    series = {}
+    for linha in linhas:
+        series.setdefault((linha["origem"], linha["chave"]), []).append(linha)
+
+    historicos = {}
+    for identificador in identificadores:
+        chaves = [("registro", reg) for reg in resolvidos[identificador]] + [("identificador", identificador)]
+        totais = {}
+        for linha in (l for chave in chaves for l in series.get(chave, [])):
+            periodo = (linha["ano"], linha["trimestre"])
+            atual, valor = totais.get(periodo), linha["valordespesas"]
+            totais[periodo] = valor if atual is None else (atual if valor is None else atual + valor)
+        historicos[identificador] = [
+            {"ano": ano, "trimestre": trimestre, "valordespesas": totais[(ano, trimestre)]}
+            for ano, trimestre in sorted(totais, reverse=True)
+        ]
+    return resolvidos, historicos
+
+@app.post("/api/operadoras/despesas", response_model=List[schemas.DespesasOperadora])
+async def get_despesas_historico_lote(data: schemas.DespesasLoteRequest, db: AsyncSession = Depends(get_async_db)):
+    identificadores = list(dict.fromkeys(data.identificadores))
+    if BACKEND_COLUNAR:
+        resolvidos, historicos = colunar.historico_despesas(identificadores)
+    else:
+        resolvidos, historicos = await historico_despesas(db, identificadores)
+    return resposta_json([
+        {"identificador": i, "registros_ans": resolvidos[i], "despesas": historicos[i]}
+        for i in identificadores
+    ])
+
 @app.get("/api/operadoras/{identificador}/despesas", response_model=List[schemas.DespesaResponse])
-def get_despesas_historico(identificador: str, db: Session = Depends(get_db)):
-    query = sqlalchemy.text("""
-        SELECT ano, trimestre, SUM(valordespesas) as valordespesas
-        FROM despesas_consolidadas 
-        WHERE cnpj = :id OR registro_ans = :id 
-        GROUP BY ano, trimestre 
-        ORDER BY ano DESC, trimestre DESC
-    """)
-    result = db.execute(query, {"id": identificador}).mappings().all()
-    return result
+async def get_despesas_historico(identificador: str, db: AsyncSession = Depends(get_async_db)):
+    if BACKEND_COLUNAR:
+        return resposta_json(colunar.historico_despesas([identificador])[1][identificador])
+
+    async def carregar():
+        _, historicos = await historico_despesas(db, [identificador])
+        return historicos[identificador]
+
+    return resposta_json(await cache.obter(cache.chave("despesas:historico", id=identificador), carregar))
+
+COLUNAS_EXPORTACAO = ["registro_ans", "cnpj", "razao_social", "uf", "ano", "trimestre", "valordespesas", "descricao_conta"]
+
+FORMATOS_EXPORTACAO = {
+    "csv": ("text/csv; charset=utf-8", "despesas.csv"),
+    "ndjson": ("application/x-ndjson", "despesas.ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "despesas.parquet"),
+}
+
+class SaidaParquet:
+    def __init__(self):
+        self.partes = []
+        self.posicao = 0
+        self.closed = False
+
+    def write(self, dados):
+        self.partes.append(bytes(dados))
+        self.posicao += len(dados)
+        return len(dados)
+
+    def tell(self):
+        return self.posicao
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drenar(self):
+        dados, self.partes = b"".join(self.partes), []
+        return dados
+
+def codificar_csv(lote, cabecalho):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=";", lineterminator="\n")
+    if cabecalho:
+        writer.writerow(COLUNAS_EXPORTACAO)
+    writer.writerows(lote)
+    return buffer.getvalue().encode("utf-8")
+
+def codificar_ndjson(lote):
+    return b"".join(orjson.dumps(dict(zip(COLUNAS_EXPORTACAO, linha)), default=float) + b"\n" for linha in lote)
+
+async def exportar_lotes(formato, ano, trimestre, uf, operadora):
+    filtros = []
+    params = {}
+    if ano is not None:
+        filtros.append("d.ano = :ano")
+        params["ano"] = ano
+    if trimestre is not None:
+        filtros.append("d.trimestre = :trimestre")
+        params["trimestre"] = trimestre
+    if uf:
+        filtros.append("o.uf = :uf")
+        params["uf"] = uf.upper()
+
+    async with AsyncSessionLocal() as db:
+        if operadora:
+            resolvidos = await resolver_identificadores(db, [operadora])
+            filtros.append("(d.registro_ans = ANY(:regs) OR (d.registro_ans IS NULL AND d.cnpj = :operadora))")
+            params["regs"] = resolvidos[operadora]
+            params["operadora"] = operadora
+
+        where_clause = f"WHERE {' AND '.join(filtros)}" if filtros else ""
+        query = sqlalchemy.text(f"""
+            SELECT d.registro_ans, d.cnpj, o.razao_social, o.uf, d.ano, d.trimestre, d.valordespesas, d.descricao_conta
+            FROM despesas_consolidadas d
+            LEFT JOIN operadoras o ON o.registro_operadora = d.registro_ans
+            {where_clause}
+        """)
+        resultado = await db.stream(query, params, execution_options={"yield_per": EXPORTACAO_LOTE})
+
+        if formato == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            schema = pa.schema([
+                ("registro_ans", pa.string()), ("cnpj", pa.string()), ("razao_social", pa.string()),
+                ("uf", pa.string()), ("ano", pa.int32()), ("trimestre", pa.int32()),
+                ("valordespesas", pa.decimal128(18, 2)), ("descricao_conta", pa.string()),
+            ])
+            saida = SaidaParquet()
+            pendentes = []
+            with pq.ParquetWriter(saida, schema) as writer:
+                async for lote in resultado.partitions(EXPORTACAO_LOTE):
+                    colunas = list(zip(*lote))
+                    pendentes.append(pa.Table.from_arrays([pa.array(c, type=t) for c, t in zip(colunas, schema.types)], schema=schema))
+                    if sum(t.num_rows for t in pendentes) >= EXPORTACAO_GRUPO_PARQUET:
+                        writer.write_table(pa.concat_tables(pendentes))
+                        pendentes = []
+                        yield saida.drenar()
+                if pendentes:
+                    writer.write_table(pa.concat_tables(pendentes))
+            yield saida.drenar()
+            return
+
+        cabecalho = True
+        if formato == "csv":
+            yield codificar_csv([], cabecalho)
+            cabecalho = False
+        async for lote in resultado.partitions(EXPORTACAO_LOTE):
+            yield codificar_csv(lote, cabecalho) if formato == "csv" else codificar_ndjson(lote)
+
+@app.get("/api/despesas/exportar")
+async def exportar_despesas(
+    formato: Literal["csv", "ndjson", "parquet"] = "csv",
+    ano: Optional[int] = None,
+    trimestre: Optional[int] = None,
+    uf: Optional[str] = None,
+    operadora: Optional[str] = None,
+):
+    if formato == "parquet" and not PARQUET_DISPONIVEL:
+        raise HTTPException(status_code=400, detail="Exportação em Parquet requer o pacote pyarrow")
+
+    media_type, arquivo = FORMATOS_EXPORTACAO[formato]
+    return StreamingResponse(
+        exportar_lotes(formato, ano, trimestre, uf, operadora),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{arquivo}"'},
+    )
 
 @app.get("/api/estatisticas", response_model=schemas.EstatisticasResponse)
-def get_estatisticas(db: Session = Depends(get_db)):
-    global cache_data, cache_timestamp
-    
-    if cache_data and cache_timestamp:
-        if datetime.now() - cache_timestamp < timedelta(minutes=CACHE_TTL_MINUTES):
-            return cache_data
-            
-    agg_query = sqlalchemy.text("SELECT SUM(valordespesas) as total, AVG(valordespesas) as media FROM despesas_consolidadas")
-    agg_res = db.execute(agg_query).mappings().first()
-    
-    top_query = sqlalchemy.text("""
-        SELECT o.razao_social, SUM(d.valordespesas) as total_despesa
-        FROM despesas_consolidadas d
-        JOIN operadoras o ON o.registro_operadora = d.registro_ans
-        GROUP BY o.razao_social
-        ORDER BY total_despesa DESC LIMIT 5
-    """)
-    top_5 = db.execute(top_query).mappings().all()
-    
-    result = {
-        "total_geral": agg_res["total"],
-        "media_geral": agg_res["media"],
-        "top_5": top_5
-    }
+async def get_estatisticas(db: AsyncSession = Depends(get_async_db)):
+    if BACKEND_COLUNAR:
+        return resposta_json(colunar.estatisticas())
 
-    cache_data = result
-    cache_timestamp = datetime.now()
-    
-    return result
+    async def carregar():
+        agg_res = (await db.execute(analises.consulta("estatisticas"))).mappings().first()
+        top_5 = [dict(r) for r in (await db.execute(analises.consulta("top_operadoras"))).mappings()]
+        return {
+            "total_geral": agg_res["total"],
+            "media_geral": agg_res["media"],
+            "top_5": top_5
+        }
+
+    return resposta_json(await cache.obter(cache.chave("analise:estatisticas", modo=analises.MODO), carregar))
 
 @app.get("/api/analise/despesas-por-uf", response_model=List[schemas.DespesaUF])
-def get_despesas_por_uf(db: Session = Depends(get_db)):
-    query = sqlalchemy.text("""
-        SELECT 
-            o.uf,
-            SUM(d.valordespesas) AS total_despesa,
-            AVG(d.valordespesas) AS media_por_operadora
-        FROM despesas_consolidadas d
-        JOIN operadoras o ON o.registro_operadora = d.registro_ans
-        GROUP BY o.uf
-        ORDER BY total_despesa DESC
-        LIMIT 10
-    """)
-    result = db.execute(query).mappings().all()
-    return result
+async def get_despesas_por_uf(db: AsyncSession = Depends(get_async_db)):
+    if BACKEND_COLUNAR:
+        return resposta_json(colunar.despesas_por_uf())
+
+    async def carregar():
+        return [dict(r) for r in (await db.execute(analises.consulta("despesas_por_uf"))).mappings()]
+
+    return resposta_json(await cache.obter(cache.chave("analise:despesas-por-uf", modo=analises.MODO), carregar))
 
 @app.get("/api/analise/acima-da-media")
-def get_operadoras_acima_da_media(db: Session = Depends(get_db)):
-    query = sqlalchemy.text("""
-        WITH media_geral AS (
-            SELECT AVG(valordespesas) as media FROM despesas_consolidadas
-        ),
-        despesas_trimestre AS (
-            SELECT 
-                registro_ans,
-                ano,
-                trimestre,
-                SUM(valordespesas) as total_trimestre
-            FROM despesas_consolidadas
-            GROUP BY registro_ans, ano, trimestre
-        ),
-        contagem_acima AS (
-            SELECT 
-                dt.registro_ans,
-                COUNT(*) as trimestres_acima
-            FROM despesas_trimestre dt, media_geral mg
-            WHERE dt.total_trimestre > mg.media
-            GROUP BY dt.registro_ans
-            HAVING COUNT(*) >= 2
-        )
-        SELECT COUNT(*) as total_operadoras FROM contagem_acima
-    """)
-    result = db.execute(query).mappings().first()
-    return result
+async def get_operadoras_acima_da_media(db: AsyncSession = Depends(get_async_db)):
+    if BACKEND_COLUNAR:
+        return colunar.acima_da_media()
+
+    async def carregar():
+        return dict((await db.execute(analises.consulta("acima_da_media"))).mappings().first())
+
+    return await cache.obter(cache.chave("analise:acima-da-media", modo=analises.MODO), carregar)
 
 @app.get("/api/analise/crescimento", response_model=List[schemas.CrescimentoOperadora])
-def get_crescimento_despesas(db: Session = Depends(get_db)):
-    query = sqlalchemy.text("""
-        WITH despesas_inicio AS (
-            SELECT registro_ans as reg_ans, SUM(valordespesas) as total 
-            FROM despesas_consolidadas 
-            WHERE ano = 2023 
-            GROUP BY registro_ans
-        ),
-        despesas_fim AS (
-            SELECT registro_ans as reg_ans, SUM(valordespesas) as total 
-            FROM despesas_consolidadas 
-            WHERE ano = 2024 OR ano = 2025
-            GROUP BY registro_ans
-        )
-        SELECT 
-            o.razao_social,
-            ((u.total - p.total) / NULLIF(p.total, 0)) * 100 as crescimento
-        FROM despesas_inicio p
-        JOIN despesas_fim u ON p.reg_ans = u.reg_ans
-        JOIN operadoras o ON o.registro_operadora = p.reg_ans
-        WHERE p.total > 0
-        ORDER BY crescimento DESC
-        LIMIT 5
-    """)
-    result = db.execute(query).mappings().all()
-    return result
\ No newline at end of file
+async def get_crescimento_despesas(db: AsyncSession = Depends(get_async_db)):
+    if BACKEND_COLUNAR:
+        return colunar.crescimento()
+
+    async def carregar():
+        return [dict(r) for r in (await db.execute(analises.consulta("crescimento"))).mappings()]
+
+    return await cache.obter(cache.chave("analise:crescimento", modo=analises.MODO), carregar)
\ No newline at end of file
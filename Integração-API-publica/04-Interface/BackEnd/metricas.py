@@ -0,0 +1,118 @@
+import re
+import time
+from functools import lru_cache
+from fastapi import Response
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, ProcessCollector, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from sqlalchemy import event
+from starlette.routing import Match
+import cache
+
+BUCKETS_SEGUNDOS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+ROTA_DESCONHECIDA = "desconhecida"
+COMANDO_SQL = re.compile(r"^\s*(\w+)")
+TABELA_SQL = re.compile(r"\b(?:FROM|INTO|UPDATE)\s+([a-z_][a-z0-9_.]*)", re.IGNORECASE)
+
+registro = CollectorRegistry()
+ProcessCollector(registry=registro)
+
+REQUISICOES = Counter(
+    "api_requisicoes", "Requisições HTTP atendidas, por rota, método e status",
+    ["metodo", "rota", "status"], registry=registro,
+)
+LATENCIA = Histogram(
+    "api_requisicao_duracao_segundos", "Latência das requisições HTTP até o início da resposta, por rota",
+    ["metodo", "rota"], buckets=BUCKETS_SEGUNDOS, registry=registro,
+)
+SQL = Histogram(
+    "sql_execucao_duracao_segundos", "Tempo de execução de cada comando SQL no banco",
+    ["consulta"], buckets=BUCKETS_SEGUNDOS, registry=registro,
+)
+
+class ColetorCache:
+    def collect(self):
+        metrica = CounterMetricFamily("api_cache_consultas", "Consultas ao cache da API por prefixo da chave e resultado", labels=["prefixo", "resultado"])
+        for (prefixo, resultado), total in list(cache.consultas.items()):
+            metrica.add_metric([prefixo, resultado], total)
+        yield metrica
+
+class ColetorPool:
+    def __init__(self, engine):
+        self.engine = engine
+
+    def collect(self):
+        pool = self.engine.pool
+        medidas = {
+            "db_pool_tamanho": ("Conexões permanentes configuradas no pool", pool.size()),
+            "db_pool_em_uso": ("Conexões emprestadas pelo pool no momento", pool.checkedout()),
+            "db_pool_livres": ("Conexões abertas e ociosas no pool", pool.checkedin()),
+            "db_pool_overflow": ("Conexões abertas além do tamanho do pool", max(pool.overflow(), 0)),
+        }
+        for nome, (descricao, valor) in medidas.items():
+            yield GaugeMetricFamily(nome, descricao, value=valor)
+
+@lru_cache(maxsize=512)
+def rotulo_sql(comando):
+    verbo = COMANDO_SQL.match(comando)
+    tabela = TABELA_SQL.search(comando)
+    return " ".join(p for p in (verbo and verbo.group(1).upper(), tabela and tabela.group(1).lower()) if p) or "outro"
+
+def antes_do_comando(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metricas_inicio", []).append(time.perf_counter())
+
+def depois_do_comando(conn, cursor, statement, parameters, context, executemany):
+    inicio = conn.info["metricas_inicio"].pop()
+    SQL.labels(context.execution_options.get("consulta") or rotulo_sql(statement)).observe(time.perf_counter() - inicio)
+
+def erro_no_comando(contexto):
+    inicios = contexto.connection.info.get("metricas_inicio") if contexto.connection is not None else None
+    if inicios:
+        inicios.pop()
+
+def rota_da_requisicao(rotas, scope):
+    endpoint = scope.get("endpoint")
+    for rota in rotas:
+        if endpoint is not None and getattr(rota, "endpoint", None) is endpoint:
+            return rota.path
+    if endpoint is None:
+        for rota in rotas:
+            if rota.matches(scope)[0] == Match.FULL:
+                return rota.path
+    return ROTA_DESCONHECIDA
+
+class MedidorRequisicoes:
+    def __init__(self, app, rotas):
+        self.app = app
+        self.rotas = rotas
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        inicio = time.perf_counter()
+        resposta = {}
+
+        async def enviar(mensagem):
+            if mensagem["type"] == "http.response.start":
+                resposta.update(status=mensagem["status"], segundos=time.perf_counter() - inicio)
+            await send(mensagem)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            rota = rota_da_requisicao(self.rotas, scope)
+            LATENCIA.labels(scope["method"], rota).observe(resposta.get("segundos", time.perf_counter() - inicio))
+            REQUISICOES.labels(scope["method"], rota, str(resposta.get("status", 500))).inc()
+
+def instalar(app, async_engine):
+    engine = async_engine.sync_engine
+    event.listen(engine, "before_cursor_execute", antes_do_comando)
+    event.listen(engine, "after_cursor_execute", depois_do_comando)
+    event.listen(engine, "handle_error", erro_no_comando)
+    registro.register(ColetorCache())
+    registro.register(ColetorPool(engine))
+    app.add_middleware(MedidorRequisicoes, rotas=app.routes)
+
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        return Response(generate_latest(registro), media_type=CONTENT_TYPE_LATEST)
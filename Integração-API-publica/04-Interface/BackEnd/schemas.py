@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 class OperadoraBase(BaseModel):
     razao_social: str
@@ -13,23 +13,53 @@ class OperadoraUpdate(BaseModel):
     razao_social: Optional[str] = None
     uf: Optional[str] = None
 
+class OperadoraAtualizacaoLote(OperadoraUpdate):
+    cnpj: str
+
+class OperadoraExclusao(BaseModel):
+    cnpj: str
+
+class ResultadoOperacaoLote(BaseModel):
+    linha: int
+    operacao: Optional[str] = None
+    status: str
+    chave: Optional[str] = None
+    erros: List[str] = []
+
+class ResultadoLote(BaseModel):
+    total: int
+    resumo: Dict[str, int]
+    resultados: List[ResultadoOperacaoLote]
+
 class OperadoraResponse(OperadoraBase):
     registro_ans: int
 
     class Config:
         from_attributes = True
 
+class OperadoraSugestao(OperadoraResponse):
+    nome_fantasia: Optional[str] = None
+
 class PaginatedOperadoras(BaseModel):
     data: List[OperadoraResponse]
-    total: int
-    page: int
+    total: Optional[int] = None
+    page: Optional[int] = None
     limit: int
+    next_cursor: Optional[str] = None
 
 class DespesaResponse(BaseModel):
     ano: int
     trimestre: int
     valordespesas: float
 
+class DespesasLoteRequest(BaseModel):
+    identificadores: List[str] = Field(..., min_length=1, max_length=500)
+
+class DespesasOperadora(BaseModel):
+    identificador: str
+    registros_ans: List[int]
+    despesas: List[DespesaResponse]
+
 class TopOperadora(BaseModel):
     razao_social: str
     total_despesa: float
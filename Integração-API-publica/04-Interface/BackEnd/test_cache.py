@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+import cache
+
+
+@pytest.fixture(autouse=True)
+def backend_local(monkeypatch):
+    monkeypatch.setattr(cache, "backend", cache.CacheLocal(max_itens=2))
+    monkeypatch.setattr(cache, "em_voo", {})
+
+
+def test_lru_evicts_least_recently_used_and_ttl_expires():
+    async def cenario():
+        await cache.backend.set("a", 1, 60)
+        await cache.backend.set("b", 2, 60)
+        assert await cache.backend.get("a") == 1
+        await cache.backend.set("c", 3, 60)
+        assert await cache.backend.get("b") is cache.AUSENTE
+        assert await cache.backend.get("a") == 1
+
+        await cache.backend.set("d", 4, -1)
+        assert await cache.backend.get("d") is cache.AUSENTE
+
+    asyncio.run(cenario())
+
+
+def test_concurrent_misses_run_a_single_query():
+    chamadas = []
+
+    async def carregar():
+        chamadas.append(1)
+        await asyncio.sleep(0.01)
+        return {"total": 42}
+
+    async def cenario():
+        chave = cache.chave("analise:teste", modo="x")
+        resultados = await asyncio.gather(*(cache.obter(chave, carregar) for _ in range(20)))
+        assert resultados == [{"total": 42}] * 20
+        assert await cache.obter(chave, carregar) == {"total": 42}
+
+    asyncio.run(cenario())
+    assert len(chamadas) == 1
+    assert cache.em_voo == {}
+
+
+def test_invalidation_drops_prefix_and_discards_in_flight_result():
+    async def cenario():
+        await cache.obter("operadoras:a", lambda: asyncio.sleep(0, result=1))
+        await cache.obter("despesas:a", lambda: asyncio.sleep(0, result=2))
+        await cache.invalidar("operadoras:")
+        assert await cache.backend.get("operadoras:a") is cache.AUSENTE
+        assert await cache.backend.get("despesas:a") == 2
+
+        liberar = asyncio.Event()
+
+        async def carregar_lento():
+            await liberar.wait()
+            return "antigo"
+
+        pendente = asyncio.ensure_future(cache.obter("operadoras:b", carregar_lento))
+        await asyncio.sleep(0)
+        await cache.invalidar("operadoras:")
+        liberar.set()
+        assert await pendente == "antigo"
+        assert await cache.backend.get("operadoras:b") is cache.AUSENTE
+
+    asyncio.run(cenario())
+
+
+def test_cache_key_is_independent_of_parameter_order():
+    assert cache.chave("operadoras:lista", page=1, search="x") == cache.chave("operadoras:lista", search="x", page=1)
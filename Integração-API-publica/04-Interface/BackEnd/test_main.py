@@ -1,9 +1,17 @@
 from fastapi.testclient import TestClient
-from main import app
+from main import app, get_async_db
+import analises
 import pytest
+import io
+import json
 
 client = TestClient(app)
 
+@pytest.fixture(scope="module", autouse=True)
+def lifespan():
+    with client:
+        yield
+
 def test_read_operadoras_pagination():
     response = client.get("/api/operadoras?page=1&limit=5")
     assert response.status_code == 200
@@ -12,10 +20,50 @@ def test_read_operadoras_pagination():
     assert "total" in data
     assert len(data["data"]) <= 5
 
+def test_cursor_pagination_matches_page_mode():
+    paginas = []
+    cursor = ""
+    while cursor is not None:
+        data = client.get("/api/operadoras", params={"limit": 200, "cursor": cursor}).json()
+        assert data["total"] is None
+        paginas.extend(data["data"])
+        cursor = data["next_cursor"]
+
+    total = client.get("/api/operadoras?page=1&limit=1").json()["total"]
+    offset = []
+    for page in range(1, total // 200 + 2):
+        offset.extend(client.get("/api/operadoras", params={"page": page, "limit": 200}).json()["data"])
+
+    assert len(paginas) == total
+    assert paginas == offset
+
+def test_cursor_pagination_with_search_and_estimate():
+    data = client.get("/api/operadoras", params={"search": "SAÚDE", "limit": 3, "cursor": "", "contagem": "estimada"}).json()
+    assert len(data["data"]) == 3
+    assert data["total"] > 0
+    seguinte = client.get("/api/operadoras", params={"search": "SAÚDE", "limit": 3, "cursor": data["next_cursor"]}).json()
+    assert str(seguinte["data"][0]["registro_ans"]) > str(data["data"][-1]["registro_ans"])
+
+def test_invalid_cursor():
+    assert client.get("/api/operadoras?cursor=xyz").status_code == 400
+    assert client.get("/api/operadoras?cursor=&limit=0").status_code == 422
+    assert client.get("/api/operadoras?search=saude&cursor=&limit=0").status_code == 422
+
 def test_get_invalid_operadora():
     response = client.get("/api/operadoras/00000000000000")
     assert response.status_code == 404
 
+def test_batch_despesas_matches_single_routes():
+    identificadores = ["344915", "326305", "00000000000000"]
+    response = client.post("/api/operadoras/despesas", json={"identificadores": identificadores + ["344915"]})
+    assert response.status_code == 200
+    data = response.json()
+
+    assert [item["identificador"] for item in data] == identificadores
+    assert data[2] == {"identificador": "00000000000000", "registros_ans": [], "despesas": []}
+    for item in data:
+        assert item["despesas"] == client.get(f"/api/operadoras/{item['identificador']}/despesas").json()
+
 def test_create_operadora_validation():
     invalid_data = {
         "registro_operadora": 12345,
@@ -45,3 +93,219 @@ def test_cache_performance():
     duration_2 = time.time() - start_2
     
     assert duration_2 <= duration_1 or duration_2 < 0.01
+
+def test_analises_materializadas_batem_com_adhoc(monkeypatch):
+    rotas = ["/api/estatisticas", "/api/analise/despesas-por-uf", "/api/analise/acima-da-media", "/api/analise/crescimento"]
+
+    materializado = [client.get(rota).json() for rota in rotas]
+
+    monkeypatch.setattr(analises, "MODO", "adhoc")
+    adhoc = [client.get(rota).json() for rota in rotas]
+
+    assert materializado == adhoc
+
+def test_write_routes_invalidate_cached_reads():
+    params = {"search": "OPERADORA CACHE TESTE"}
+    assert client.get("/api/operadoras", params=params).json()["total"] == 0
+    assert client.get("/api/operadoras/999002").status_code == 404
+
+    nova = {"registro_operadora": 999002, "razao_social": "OPERADORA CACHE TESTE", "cnpj": "99999999000272", "uf": "SP"}
+    assert client.post("/api/operadoras", json=nova).status_code == 200
+    try:
+        assert client.get("/api/operadoras", params=params).json()["total"] == 1
+        assert client.get("/api/operadoras/999002").json()["uf"] == "SP"
+
+        client.put("/api/operadoras/99999999000272", json={"razao_social": "OPERADORA CACHE TESTE", "uf": "RJ"})
+        assert client.get("/api/operadoras/999002").json()["uf"] == "RJ"
+    finally:
+        client.delete("/api/operadoras/99999999000272")
+
+    assert client.get("/api/operadoras", params=params).json()["total"] == 0
+
+def test_conditional_get_returns_304_until_data_changes():
+    primeira = client.get("/api/estatisticas")
+    etag = primeira.headers["etag"]
+    assert primeira.headers["last-modified"]
+
+    repetida = client.get("/api/estatisticas", headers={"If-None-Match": etag})
+    assert repetida.status_code == 304
+    assert repetida.content == b""
+    assert client.get("/api/analise/despesas-por-uf", headers={"If-Modified-Since": primeira.headers["last-modified"]}).status_code == 304
+    def sem_banco():
+        raise AssertionError("rota executada para responder 304")
+    app.dependency_overrides[get_async_db] = sem_banco
+    try:
+        assert client.get("/api/estatisticas", headers={"If-None-Match": etag}).status_code == 304
+        assert client.get("/api/operadoras/344915/despesas", headers={"If-None-Match": etag}).status_code == 304
+    finally:
+        app.dependency_overrides.clear()
+    inexistente = client.get("/api/operadoras/naoexiste", headers={"If-None-Match": etag})
+    assert inexistente.status_code == 404
+    assert "etag" not in inexistente.headers
+    assert client.get("/api/despesas/exportar", params={"operadora": "344915", "formato": "csv"}, headers={"If-None-Match": etag}).status_code == 304
+
+    nova = {"registro_operadora": 999003, "razao_social": "OPERADORA ETAG TESTE", "cnpj": "99999999000353", "uf": "SP"}
+    client.post("/api/operadoras", json=nova)
+    try:
+        alterada = client.get("/api/estatisticas", headers={"If-None-Match": etag})
+        assert alterada.status_code == 200
+        assert alterada.headers["etag"] != etag
+    finally:
+        client.delete("/api/operadoras/99999999000353")
+
+def test_large_responses_are_compressed():
+    response = client.get("/api/operadoras?limit=100", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert len(response.json()["data"]) == 100
+
+def test_export_formats_stream_the_same_rows():
+    params = {"operadora": "344915", "ano": 2025}
+    csv_rows = client.get("/api/despesas/exportar", params={**params, "formato": "csv"}).text.splitlines()
+    assert csv_rows[0] == "registro_ans;cnpj;razao_social;uf;ano;trimestre;valordespesas;descricao_conta"
+
+    ndjson_rows = [json.loads(l) for l in client.get("/api/despesas/exportar", params={**params, "formato": "ndjson"}).text.splitlines()]
+    assert len(ndjson_rows) == len(csv_rows) - 1
+    assert {r["registro_ans"] for r in ndjson_rows} == {"344915"}
+
+    historico = client.get("/api/operadoras/344915/despesas").json()
+    assert sum(r["valordespesas"] for r in ndjson_rows) == pytest.approx(sum(h["valordespesas"] for h in historico))
+
+    pq = pytest.importorskip("pyarrow.parquet")
+    response = client.get("/api/despesas/exportar", params={**params, "formato": "parquet"})
+    assert pq.read_table(io.BytesIO(response.content)).num_rows == len(ndjson_rows)
+
+def test_backend_colunar_responde_igual_ao_postgres(monkeypatch):
+    colunar = pytest.importorskip("colunar")
+    rotas = ["/api/estatisticas", "/api/analise/despesas-por-uf", "/api/analise/acima-da-media",
+             "/api/analise/crescimento", "/api/operadoras/344915/despesas", "/api/operadoras/999999/despesas"]
+    lote = {"identificadores": ["344915", "326305", "999999"]}
+    esperado = [client.get(rota).json() for rota in rotas]
+    esperado_lote = client.post("/api/operadoras/despesas", json=lote).json()
+
+    monkeypatch.setattr("main.BACKEND_COLUNAR", True)
+    monkeypatch.setattr("main.colunar", colunar, raising=False)
+    monkeypatch.setattr(colunar, "_dados", None)
+    assert [client.get(rota).json() for rota in rotas] == esperado
+    assert client.post("/api/operadoras/despesas", json=lote).json() == esperado_lote
+    indisponivel = client.get("/api/operadoras", headers={"Origin": "http://localhost:5173"})
+    assert indisponivel.status_code == 503
+    assert indisponivel.headers["access-control-allow-origin"] == "*"
+    assert colunar.carregado()
+
+def test_metrics_expose_route_sql_cache_and_pool():
+    client.get("/api/operadoras/00000000000000")
+    client.get("/api/estatisticas")
+    client.get("/api/estatisticas")
+    etag = client.get("/api/analise/despesas-por-uf").headers["ETag"]
+    assert client.get("/api/analise/despesas-por-uf", headers={"If-None-Match": etag}).status_code == 304
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    texto = response.text
+    assert 'api_requisicoes_total{metodo="GET",rota="/api/operadoras/{identificador}",status="404"}' in texto
+    assert 'api_requisicoes_total{metodo="GET",rota="/api/analise/despesas-por-uf",status="304"}' in texto
+    assert 'api_requisicao_duracao_segundos_bucket{le="0.0005",metodo="GET",rota="/api/estatisticas"}' in texto
+    assert 'sql_execucao_duracao_segundos_count{consulta="analise:estatisticas"}' in texto
+    assert 'sql_execucao_duracao_segundos_count{consulta="SELECT operadoras"}' in texto
+    assert 'api_cache_consultas_total{prefixo="analise:estatisticas",resultado="acerto"}' in texto
+    assert "db_pool_em_uso 0.0" in texto
+
+def test_search_index_ignores_accents_and_matches_sql():
+    import busca
+    com_acento = client.get("/api/operadoras", params={"search": "SAÚDE", "limit": 500}).json()
+    sem_acento = client.get("/api/operadoras", params={"search": "saude", "limit": 500}).json()
+    assert com_acento["total"] == sem_acento["total"] > 0
+    assert com_acento["data"] == sem_acento["data"]
+
+    todas = client.get("/api/operadoras", params={"limit": 5000}).json()["data"]
+    pela_razao = {o["registro_ans"] for o in todas if "saude" in busca.normalizar(o["razao_social"])}
+    varredura = {int(r) for r, d in busca.indice.documentos.items() if "saude" in d.texto}
+    assert pela_razao <= {o["registro_ans"] for o in com_acento["data"]} == varredura
+
+    por_cnpj = client.get("/api/operadoras", params={"search": com_acento["data"][0]["cnpj"][:8]}).json()
+    assert com_acento["data"][0]["cnpj"] in [o["cnpj"] for o in por_cnpj["data"]]
+
+def test_autocomplete_ranks_prefix_matches_first():
+    sugestoes = client.get("/api/operadoras/autocomplete", params={"q": "unimed", "limit": 5}).json()
+    assert 0 < len(sugestoes) <= 5
+    assert all(s["razao_social"].upper().startswith("UNIMED") for s in sugestoes)
+    assert client.get("/api/operadoras/autocomplete", params={"q": "   "}).json() == []
+    assert client.get("/api/operadoras/autocomplete", params={"q": "unimed", "limit": 0}).status_code == 422
+    assert client.get("/api/operadoras/autocomplete", params={"q": "unimed", "limit": 51}).status_code == 422
+
+    nova = {"registro_operadora": 999004, "razao_social": "ÔMEGA AUTOCOMPLETE TESTE", "cnpj": "99999999000434", "uf": "SP"}
+    client.post("/api/operadoras", json=nova)
+    try:
+        sugestoes = client.get("/api/operadoras/autocomplete", params={"q": "omega autocomp"}).json()
+        assert [s["registro_ans"] for s in sugestoes] == [999004]
+    finally:
+        client.delete("/api/operadoras/99999999000434")
+    assert client.get("/api/operadoras/autocomplete", params={"q": "omega autocomp"}).json() == []
+
+def test_bulk_upsert_applies_batch_in_one_transaction():
+    linhas = [{"registro_operadora": 999100 + i, "razao_social": f"OPERADORA LOTE TESTE {i}", "cnpj": f"999999990{i:05d}", "uf": "SP"} for i in range(3)]
+    linhas += [
+        {"registro_operadora": 999100, "razao_social": "OPERADORA LOTE TESTE 0", "cnpj": "99999999000000", "uf": "MG"},
+        {"operacao": "update", "cnpj": "99999999000001", "uf": "RJ"},
+        {"operacao": "delete", "cnpj": "99999999000002"},
+        {"operacao": "delete", "cnpj": "00000000000000"},
+        {"registro_operadora": "abc", "cnpj": "1"},
+        {"operacao": "renomear"},
+        {"operacao": ["x"]},
+        "linha",
+    ]
+    ndjson = "\n".join(json.dumps(l) for l in linhas)
+    response = client.post("/api/operadoras/lote", content=ndjson, headers={"Content-Type": "application/x-ndjson"})
+    try:
+        assert response.status_code == 200
+        data = response.json()
+        assert [r["status"] for r in data["resultados"]] == [
+            "criada", "criada", "criada", "atualizada", "atualizada", "excluida", "nao_encontrada", "invalida", "invalida", "invalida", "invalida"
+        ]
+        assert data["resumo"] == {"criada": 3, "atualizada": 2, "excluida": 1, "nao_encontrada": 1, "invalida": 4}
+        assert client.get("/api/operadoras/999100").json()["uf"] == "MG"
+        assert client.get("/api/operadoras/999101").json()["uf"] == "RJ"
+        assert client.get("/api/operadoras/999101").json()["razao_social"] == "OPERADORA LOTE TESTE 1"
+        assert client.get("/api/operadoras/999102").status_code == 404
+        assert client.get("/api/operadoras", params={"search": "operadora lote teste"}).json()["total"] == 2
+
+        rejeitado = client.post("/api/operadoras/lote", json=[
+            {"operacao": "delete", "cnpj": "99999999000000"},
+            {"registro_operadora": 999103, "razao_social": "UF INVÁLIDA", "cnpj": "99999999000003", "uf": "SPX"},
+        ])
+        assert rejeitado.status_code == 409
+        assert client.get("/api/operadoras/999100").status_code == 200
+    finally:
+        client.post("/api/operadoras/lote", json=[{"operacao": "delete", "cnpj": f"999999990{i:05d}"} for i in range(3)])
+
+    assert client.get("/api/operadoras", params={"search": "operadora lote teste"}).json()["total"] == 0
+    assert client.post("/api/operadoras/lote", content="{", headers={"Content-Type": "application/json"}).status_code == 400
+
+def test_bulk_ndjson_reports_malformed_line_and_applies_the_rest():
+    linhas = [json.dumps({"registro_operadora": 999110 + i, "razao_social": f"OPERADORA NDJSON TESTE {i}", "cnpj": f"999999991{i:05d}", "uf": "SP"}) for i in range(2)]
+    linhas.insert(1, '{"registro_operadora": 999119, "cnpj": ')
+    response = client.post("/api/operadoras/lote", content="\n".join(linhas), headers={"Content-Type": "application/x-ndjson"})
+    try:
+        assert response.status_code == 200
+        resultados = response.json()["resultados"]
+        assert [(r["linha"], r["status"]) for r in resultados] == [(0, "criada"), (1, "invalida"), (2, "criada")]
+        assert resultados[1]["erros"][0].startswith("JSON inválido")
+        assert client.get("/api/operadoras/999111").status_code == 200
+    finally:
+        client.post("/api/operadoras/lote", json=[{"operacao": "delete", "cnpj": f"999999991{i:05d}"} for i in range(2)])
+
+def test_write_routes_refresh_materialized_analyses(monkeypatch):
+    rotas = ["/api/estatisticas", "/api/analise/despesas-por-uf", "/api/analise/crescimento"]
+    lider = client.get("/api/estatisticas").json()["top_5"][0]["razao_social"]
+    original = next(o for o in client.get("/api/operadoras", params={"search": lider, "limit": 50}).json()["data"] if o["razao_social"] == lider)
+
+    client.put(f"/api/operadoras/{original['cnpj']}", json={"razao_social": lider + " RENOMEADA", "uf": "ZZ"})
+    try:
+        materializado = [client.get(rota).json() for rota in rotas]
+        assert materializado[0]["top_5"][0]["razao_social"] == lider + " RENOMEADA"
+        assert "ZZ" in [u["uf"] for u in materializado[1]]
+
+        monkeypatch.setattr(analises, "MODO", "adhoc")
+        assert [client.get(rota).json() for rota in rotas] == materializado
+    finally:
+        client.put(f"/api/operadoras/{original['cnpj']}", json={"razao_social": lider, "uf": original["uf"]})
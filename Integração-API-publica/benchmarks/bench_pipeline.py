@@ -0,0 +1,232 @@
+import os
+import io
+import sys
+import glob
+import json
+import time
+import shutil
+import zipfile
+import argparse
+import resource
+import tempfile
+import threading
+import statistics
+import subprocess
+import contextlib
+import importlib.util
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import comum
+import gerar_dados
+
+CONSOLIDACAO_DIR = os.path.join(comum.RAIZ, "01-Consolidação")
+VALIDACAO_DIR = os.path.join(comum.RAIZ, "02-Validação")
+BANCO_DIR = os.path.join(comum.RAIZ, "03-BancoDeDados")
+PREPARADO = "preparado"
+SCHEMA_BENCHMARK = "benchmark"
+AMOSTRA_CNPJ = int(os.getenv("BENCH_AMOSTRA_CNPJ", "200000"))
+
+def importar(diretorio, arquivo, nome):
+    if diretorio not in sys.path:
+        sys.path.insert(0, diretorio)
+    spec = importlib.util.spec_from_file_location(nome, os.path.join(diretorio, arquivo))
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    return modulo
+
+class SiteSilencioso(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+@contextlib.contextmanager
+def servir_site(diretorio):
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), partial(SiteSilencioso, directory=diretorio))
+    thread = threading.Thread(target=servidor.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{servidor.server_address[1]}/"
+    finally:
+        servidor.shutdown()
+
+def zips(dados):
+    return sorted(glob.glob(os.path.join(dados, "site", "*", "*.zip")))
+
+def contar_linhas_csv(caminho):
+    with open(caminho, 'rb') as f:
+        return max(sum(1 for _ in f) - 1, 0)
+
+def copiar_preparado(dados, *nomes):
+    for nome in nomes:
+        shutil.copy(os.path.join(dados, PREPARADO, nome), nome)
+
+def caso_process_file(dados):
+    consolidacao = importar(CONSOLIDACAO_DIR, "main.py", "consolidacao")
+    linhas = 0
+    for caminho in zips(dados):
+        url = "http://bench/" + os.path.relpath(caminho, os.path.join(dados, "site")).replace(os.sep, "/")
+        with zipfile.ZipFile(caminho) as zip_ref:
+            for membro in zip_ref.namelist():
+                df = consolidacao.process_file(membro, url, zip_ref=zip_ref)
+                linhas += 0 if df is None else len(df)
+    return {'linhas': linhas}
+
+def consolidar(dados, *argumentos):
+    consolidacao = importar(CONSOLIDACAO_DIR, "main.py", "consolidacao")
+    with servir_site(os.path.join(dados, "site")) as url:
+        consolidacao.BASE_URL = url
+        consolidacao.main(["--limit", str(len(zips(dados))), *argumentos])
+    if os.path.exists(consolidacao.OUTPUT_FILE):
+        return {'linhas': contar_linhas_csv(consolidacao.OUTPUT_FILE)}
+    manifesto = consolidacao.load_ingestion_manifest()
+    return {'linhas': sum(entrada['linhas'] for entrada in manifesto.values())}
+
+def caso_validar_cnpj(dados):
+    import pandas as pd
+    validacao = importar(VALIDACAO_DIR, "validacao.py", "validacao")
+    valores = pd.read_csv(os.path.join(dados, PREPARADO, "consolidado_despesas.csv"), sep=';', encoding='utf-8-sig',
+                          usecols=['CNPJ'], dtype=str, nrows=AMOSTRA_CNPJ)['CNPJ']
+    valores.map(validacao.validar_cnpj)
+    return {'linhas': len(valores)}
+
+def caso_validar_cnpj_lote(dados):
+    import pandas as pd
+    validacao = importar(VALIDACAO_DIR, "validacao.py", "validacao")
+    valores = pd.read_csv(os.path.join(dados, PREPARADO, "consolidado_despesas.csv"), sep=';', encoding='utf-8-sig',
+                          usecols=['CNPJ'], dtype=str, nrows=AMOSTRA_CNPJ)['CNPJ']
+    validacao.validar_cnpj_lote(valores)
+    return {'linhas': len(valores)}
+
+def transformar(dados, streaming):
+    validacao = importar(VALIDACAO_DIR, "validacao.py", "validacao")
+    if not os.path.exists(validacao.CONSOLIDADO_CSV):
+        copiar_preparado(dados, validacao.CONSOLIDADO_CSV)
+    shutil.copy(os.path.join(dados, "cadastro_operadoras.csv"), validacao.CADASTRO_CSV)
+    validacao.processar_transformacao(streaming=streaming)
+    return {'linhas': contar_linhas_csv(validacao.CONSOLIDADO_CSV)}
+
+def caso_carga_banco(dados):
+    import psycopg2
+    carga_dados = importar(BANCO_DIR, "carga_dados.py", "carga_dados")
+    try:
+        conn = carga_dados.conectar()
+    except psycopg2.OperationalError as e:
+        return {'ignorado': f"PostgreSQL indisponível: {e}".strip()}
+
+    with open(os.path.join(BANCO_DIR, "queries_analiticas.sql"), encoding='utf-8') as f:
+        ddl = f.read().split("-- Query 1")[0]
+    try:
+        with conn, conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA_BENCHMARK} CASCADE; CREATE SCHEMA {SCHEMA_BENCHMARK}")
+            cur.execute(f"SET search_path TO {SCHEMA_BENCHMARK}")
+            cur.execute(ddl)
+        inicio = time.perf_counter()
+        resumo = carga_dados.carregar(
+            os.path.join(dados, PREPARADO, "consolidado_despesas.csv"),
+            os.path.join(dados, PREPARADO, "despesas_agregadas.csv"),
+            os.path.join(dados, "cadastro_operadoras.csv"),
+            conn=conn,
+        )
+        return {'linhas': resumo.get('despesas_consolidadas', 0), 'segundos': time.perf_counter() - inicio}
+    finally:
+        with conn, conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA_BENCHMARK} CASCADE")
+        conn.close()
+
+CASOS = {
+    'process_file': caso_process_file,
+    'consolidacao': lambda dados: consolidar(dados),
+    'consolidacao_streaming': lambda dados: consolidar(dados, "--streaming"),
+    'consolidacao_incremental': lambda dados: consolidar(dados, "--incremental", "--csv"),
+    'validar_cnpj': caso_validar_cnpj,
+    'validar_cnpj_lote': caso_validar_cnpj_lote,
+    'transformacao': lambda dados: transformar(dados, streaming=False),
+    'transformacao_streaming': lambda dados: transformar(dados, streaming=True),
+    'carga_banco': caso_carga_banco,
+}
+
+def executar_caso(caso, dados, trabalho):
+    os.chdir(trabalho)
+    inicio = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        resultado = CASOS[caso](dados)
+    resultado.setdefault('segundos', time.perf_counter() - inicio)
+    resultado['pico_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps(resultado))
+
+def rodar_isolado(caso, dados, trabalho):
+    processo = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--executar", caso, "--dados", dados, "--trabalho", trabalho],
+        capture_output=True, text=True,
+    )
+    if processo.returncode != 0:
+        raise RuntimeError(f"{caso} falhou:\n{processo.stderr}")
+    return json.loads(processo.stdout.strip().splitlines()[-1])
+
+def preparar(dados):
+    pasta = os.path.join(dados, PREPARADO)
+    if os.path.exists(os.path.join(pasta, "despesas_agregadas.csv")):
+        return
+    os.makedirs(pasta, exist_ok=True)
+    rodar_isolado('consolidacao', dados, pasta)
+    rodar_isolado('transformacao', dados, pasta)
+
+def medir(caso, dados, repeticoes):
+    execucoes = []
+    for _ in range(repeticoes):
+        trabalho = tempfile.mkdtemp(prefix=f"bench-{caso}-")
+        try:
+            execucoes.append(rodar_isolado(caso, dados, trabalho))
+        finally:
+            shutil.rmtree(trabalho, ignore_errors=True)
+
+    if 'ignorado' in execucoes[0]:
+        return {'ignorado': execucoes[0]['ignorado']}
+    segundos = [e['segundos'] for e in execucoes]
+    mediana = statistics.median(segundos)
+    return {
+        'segundos': segundos,
+        'mediana': mediana,
+        'minimo': min(segundos),
+        'pico_mb': max(e['pico_mb'] for e in execucoes),
+        'linhas': execucoes[0]['linhas'],
+        'linhas_por_segundo': execucoes[0]['linhas'] / mediana if mediana else None,
+    }
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks do pipeline (consolidação, validação e carga) com dados sintéticos")
+    parser.add_argument("--dados", help="Diretório gerado por gerar_dados.py (gera um temporário se omitido)")
+    parser.add_argument("--escala", type=float, default=1.0, help="Escala usada quando os dados são gerados aqui")
+    parser.add_argument("--trimestres", type=int, default=3)
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--caso", action="append", choices=sorted(CASOS), help="Casos a rodar (padrão: todos)")
+    parser.add_argument("--saida", help="Arquivo JSON de resultado (padrão: resultados/pipeline-<data>.json)")
+    parser.add_argument("--executar", choices=sorted(CASOS), help=argparse.SUPPRESS)
+    parser.add_argument("--trabalho", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.executar:
+        return executar_caso(args.executar, args.dados, args.trabalho)
+
+    dados = os.path.abspath(args.dados or tempfile.mkdtemp(prefix="bench-dados-"))
+    if not zips(dados):
+        resumo = gerar_dados.gerar(dados, args.escala, args.trimestres)
+        print(f"Dados sintéticos: {resumo['linhas']} linhas em {dados}")
+    preparar(dados)
+
+    resultados = {}
+    for caso in args.caso or list(CASOS):
+        resultados[caso] = medir(caso, dados, args.repeticoes)
+        r = resultados[caso]
+        if 'ignorado' in r:
+            print(f"{caso:26s} ignorado ({r['ignorado']})")
+        else:
+            print(f"{caso:26s} mediana {r['mediana']:8.3f}s  {r['linhas']:>10} linhas  pico {r['pico_mb']:7.1f} MB")
+
+    parametros = {'dados': dados, 'escala': args.escala, 'trimestres': args.trimestres, 'repeticoes': args.repeticoes}
+    print(f"Resultados salvos em {comum.salvar('pipeline', parametros, resultados, args.saida)}")
+
+if __name__ == "__main__":
+    main()
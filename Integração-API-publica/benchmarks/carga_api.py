@@ -0,0 +1,155 @@
+import os
+import sys
+import time
+import socket
+import asyncio
+import argparse
+import statistics
+import subprocess
+import contextlib
+import httpx
+
+import comum
+
+BACKEND_DIR = os.path.join(comum.RAIZ, "04-Interface", "BackEnd")
+ROTAS_PADRAO = [
+    ("GET", "/api/operadoras?page=1&limit=10", None),
+    ("GET", "/api/operadoras?limit=100&cursor=", None),
+    ("GET", "/api/operadoras?page=1&limit=10&search=saude", None),
+    ("GET", "/api/operadoras/{cnpj}", None),
+    ("GET", "/api/operadoras/{cnpj}/despesas", None),
+    ("POST", "/api/operadoras/despesas", {"identificadores": "{cnpjs}"}),
+    ("GET", "/api/estatisticas", None),
+    ("GET", "/api/analise/despesas-por-uf", None),
+    ("GET", "/api/analise/acima-da-media", None),
+    ("GET", "/api/analise/crescimento", None),
+]
+
+def porta_livre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+@contextlib.contextmanager
+def iniciar_servidor(workers=1, espera=30):
+    porta = porta_livre()
+    processo = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(porta), "--workers", str(workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+    )
+    url = f"http://127.0.0.1:{porta}"
+    try:
+        limite = time.monotonic() + espera
+        while True:
+            if processo.poll() is not None:
+                raise RuntimeError(f"uvicorn terminou com código {processo.returncode}")
+            try:
+                if httpx.get(url + "/docs", timeout=1).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if time.monotonic() > limite:
+                raise RuntimeError("uvicorn não respondeu a tempo")
+            time.sleep(0.2)
+        yield url
+    finally:
+        processo.terminate()
+        processo.wait(timeout=10)
+
+def percentil(ordenadas, p):
+    if len(ordenadas) == 1:
+        return ordenadas[0]
+    return statistics.quantiles(ordenadas, n=100, method='inclusive')[p - 1]
+
+def resumir(latencias, erros, duracao):
+    ordenadas = sorted(latencias)
+    return {
+        'requisicoes': len(latencias),
+        'erros': erros,
+        'p50_ms': percentil(ordenadas, 50) * 1000,
+        'p95_ms': percentil(ordenadas, 95) * 1000,
+        'p99_ms': percentil(ordenadas, 99) * 1000,
+        'media_ms': statistics.fmean(ordenadas) * 1000,
+        'max_ms': ordenadas[-1] * 1000,
+        'vazao_rps': len(latencias) / duracao if duracao else None,
+    }
+
+async def medir_rota(cliente, metodo, caminho, corpo, requisicoes, concorrencia):
+    latencias, erros = [], 0
+    pendentes = iter(range(requisicoes))
+
+    async def trabalhador():
+        nonlocal erros
+        for _ in pendentes:
+            inicio = time.perf_counter()
+            try:
+                resposta = await cliente.request(metodo, caminho, json=corpo)
+                erros += resposta.status_code >= 400
+            except httpx.HTTPError:
+                erros += 1
+            latencias.append(time.perf_counter() - inicio)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(trabalhador() for _ in range(concorrencia)))
+    return resumir(latencias, erros, time.perf_counter() - inicio)
+
+async def descobrir_cnpjs(cliente, quantidade=20):
+    resposta = await cliente.get("/api/operadoras", params={"page": 1, "limit": quantidade})
+    resposta.raise_for_status()
+    return [o["cnpj"] for o in resposta.json()["data"]]
+
+def montar_rotas(rotas, cnpjs):
+    montadas = []
+    for metodo, caminho, corpo in rotas:
+        if corpo == {"identificadores": "{cnpjs}"}:
+            corpo = {"identificadores": cnpjs}
+        montadas.append((f"{metodo} {caminho}", metodo, caminho.replace("{cnpj}", cnpjs[0]), corpo))
+    return montadas
+
+async def executar(url, rotas, requisicoes, concorrencia, aquecimento):
+    limites = httpx.Limits(max_connections=concorrencia, max_keepalive_connections=concorrencia)
+    async with httpx.AsyncClient(base_url=url, limits=limites, timeout=60) as cliente:
+        rotas = montar_rotas(rotas, await descobrir_cnpjs(cliente))
+        resultados = {}
+        for nome, metodo, caminho, corpo in rotas:
+            for _ in range(aquecimento):
+                await cliente.request(metodo, caminho, json=corpo)
+            resultados[nome] = await medir_rota(cliente, metodo, caminho, corpo, requisicoes, concorrencia)
+            r = resultados[nome]
+            print(f"{nome:60s} p50 {r['p50_ms']:8.2f}ms  p95 {r['p95_ms']:8.2f}ms  p99 {r['p99_ms']:8.2f}ms  "
+                  f"{r['vazao_rps']:8.1f} req/s  erros {r['erros']}")
+        return resultados
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Teste de carga local das rotas da API com latência p50/p95/p99 por rota")
+    parser.add_argument("--url", help="API já em execução (ex.: http://127.0.0.1:8000)")
+    parser.add_argument("--iniciar", action="store_true", help="Sobe um uvicorn local em porta livre para o teste")
+    parser.add_argument("--workers", type=int, default=1, help="Workers do uvicorn iniciado com --iniciar")
+    parser.add_argument("--requisicoes", type=int, default=500, help="Requisições medidas por rota")
+    parser.add_argument("--concorrencia", type=int, default=20)
+    parser.add_argument("--aquecimento", type=int, default=10, help="Requisições descartadas por rota antes da medição")
+    parser.add_argument("--rota", action="append", help="Rota GET a medir no lugar das padrão (pode repetir)")
+    parser.add_argument("--saida", help="Arquivo JSON de resultado (padrão: resultados/api-<data>.json)")
+    args = parser.parse_args(argv)
+    if not args.url and not args.iniciar:
+        parser.error("informe --url ou --iniciar")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    rotas = [("GET", r, None) for r in args.rota] if args.rota else ROTAS_PADRAO
+    with (iniciar_servidor(args.workers) if args.iniciar else contextlib.nullcontext(args.url)) as url:
+        resultados = asyncio.run(executar(url, rotas, args.requisicoes, args.concorrencia, args.aquecimento))
+
+    parametros = {
+        'url': None if args.iniciar else args.url,
+        'workers': args.workers if args.iniciar else None,
+        'requisicoes': args.requisicoes,
+        'concorrencia': args.concorrencia,
+        'aquecimento': args.aquecimento,
+        'backend_dados': os.getenv("BACKEND_DADOS", "postgres"),
+    }
+    print(f"Resultados salvos em {comum.salvar('api', parametros, resultados, args.saida)}")
+
+if __name__ == "__main__":
+    main()
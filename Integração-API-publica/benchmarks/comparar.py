@@ -0,0 +1,39 @@
+import sys
+import argparse
+
+import comum
+
+METRICAS = {'pipeline': 'mediana', 'api': 'p95_ms'}
+
+def comparar(base, novo, metrica=None, tolerancia=0.10):
+    if base['tipo'] != novo['tipo']:
+        raise ValueError(f"Resultados de tipos diferentes: {base['tipo']} x {novo['tipo']}")
+    metrica = metrica or METRICAS[base['tipo']]
+
+    linhas = []
+    for nome in base['resultados']:
+        antes, depois = base['resultados'][nome].get(metrica), novo['resultados'].get(nome, {}).get(metrica)
+        if not antes or depois is None:
+            continue
+        razao = depois / antes
+        linhas.append({'nome': nome, 'antes': antes, 'depois': depois, 'razao': razao, 'regressao': razao > 1 + tolerancia})
+    return metrica, linhas
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compara dois resultados JSON de benchmark e aponta regressões")
+    parser.add_argument("base")
+    parser.add_argument("novo")
+    parser.add_argument("--metrica", help="Métrica comparada (padrão: mediana no pipeline, p95_ms na API)")
+    parser.add_argument("--tolerancia", type=float, default=0.10, help="Piora relativa aceita antes de acusar regressão")
+    args = parser.parse_args(argv)
+
+    base, novo = comum.carregar(args.base), comum.carregar(args.novo)
+    metrica, linhas = comparar(base, novo, args.metrica, args.tolerancia)
+    print(f"{base['tipo']}: {metrica} de {base.get('commit')} para {novo.get('commit')}")
+    for l in linhas:
+        marca = "REGRESSÃO" if l['regressao'] else ""
+        print(f"  {l['nome']:60s} {l['antes']:10.3f} -> {l['depois']:10.3f}  x{l['razao']:.2f}  {marca}")
+    return 1 if any(l['regressao'] for l in linhas) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
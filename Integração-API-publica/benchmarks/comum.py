@@ -0,0 +1,38 @@
+import os
+import json
+import platform
+import subprocess
+from datetime import datetime, timezone
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RAIZ = os.path.dirname(BASE_DIR)
+RESULTADOS_DIR = os.path.join(BASE_DIR, "resultados")
+
+def commit_atual():
+    try:
+        saida = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, capture_output=True, text=True, timeout=10)
+        return saida.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def metadados():
+    return {
+        'data': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': commit_atual(),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+def salvar(tipo, parametros, resultados, saida=None):
+    if saida is None:
+        os.makedirs(RESULTADOS_DIR, exist_ok=True)
+        carimbo = datetime.now().strftime("%Y%m%d-%H%M%S")
+        saida = os.path.join(RESULTADOS_DIR, f"{tipo}-{carimbo}.json")
+    with open(saida, 'w', encoding='utf-8') as f:
+        json.dump({'tipo': tipo, **metadados(), 'parametros': parametros, 'resultados': resultados}, f, indent=2, ensure_ascii=False)
+    return saida
+
+def carregar(caminho):
+    with open(caminho, 'r', encoding='utf-8') as f:
+        return json.load(f)
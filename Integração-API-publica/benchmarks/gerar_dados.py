@@ -0,0 +1,139 @@
+import os
+import io
+import csv
+import zipfile
+import argparse
+import numpy as np
+import pandas as pd
+
+LINHAS_BASE = 48806
+OPERADORAS_BASE = 1100
+BLOCO = 100000
+FRACAO_ZERADA = 0.05
+FRACAO_SEM_CADASTRO = 0.02
+ULTIMO_PERIODO = (2025, 3)
+
+CABECALHO_DEMONSTRACAO = ["DATA", "REG_ANS", "CD_CONTA_CONTABIL", "DESCRICAO", "VL_SALDO_INICIAL", "VL_SALDO_FINAL"]
+CABECALHO_CADASTRO = [
+    "REGISTRO_OPERADORA", "CNPJ", "Razao_Social", "Nome_Fantasia", "Modalidade", "Logradouro", "Numero", "Complemento",
+    "Bairro", "Cidade", "UF", "CEP", "DDD", "Telefone", "Fax", "Endereco_eletronico", "Representante",
+    "Cargo_Representante", "Regiao_de_Comercializacao", "Data_Registro_ANS",
+]
+CONTAS = [
+    ("411111", "EVENTOS INDENIZÁVEIS LÍQUIDOS / SINISTROS RETIDOS"),
+    ("411121", "EVENTOS CONHECIDOS OU AVISADOS - CONSULTAS MÉDICAS"),
+    ("411211", "EXAMES E TERAPIAS - REDE CONTRATADA"),
+    ("4121", "VARIAÇÃO DA PROVISÃO DE EVENTOS OCORRIDOS E NÃO AVISADOS"),
+    ("431", "DESPESAS DE COMERCIALIZAÇÃO"),
+    ("46", "DESPESAS ADMINISTRATIVAS"),
+    ("1277", "DESPESAS ASSISTENCIAIS - INTERNAÇÕES"),
+]
+MODALIDADES = [
+    "Medicina de Grupo", "Cooperativa Médica", "Odontologia de Grupo", "Autogestão", "Administradora de Benefícios",
+    "Seguradora Especializada em Saúde", "Filantropia", "Cooperativa Odontológica",
+]
+UFS = [
+    "AC", "AL", "AM", "AP", "BA", "CE", "DF", "ES", "GO", "MA", "MG", "MS", "MT", "PA", "PB", "PE", "PI", "PR", "RJ",
+    "RN", "RO", "RR", "RS", "SC", "SE", "SP", "TO",
+]
+PESOS_CNPJ_1 = np.array([5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2])
+PESOS_CNPJ_2 = np.array([6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2])
+
+def digito_verificador(digitos, pesos):
+    resto = (digitos @ pesos) % 11
+    return np.where(resto < 2, 0, 11 - resto)
+
+def gerar_cnpjs(rng, quantidade):
+    digitos = rng.integers(0, 10, size=(quantidade, 12))
+    digitos[:, 8:12] = [0, 0, 0, 1]
+    digitos = np.column_stack([digitos, digito_verificador(digitos, PESOS_CNPJ_1)])
+    digitos = np.column_stack([digitos, digito_verificador(digitos, PESOS_CNPJ_2)])
+    return ["".join(map(str, d)) for d in digitos]
+
+def periodos(trimestres):
+    ano, tri = ULTIMO_PERIODO
+    saida = []
+    for _ in range(trimestres):
+        saida.append((ano, tri))
+        ano, tri = (ano, tri - 1) if tri > 1 else (ano - 1, 4)
+    return saida
+
+def gerar_cadastro(caminho, registros, rng):
+    n = len(registros)
+    cadastro = pd.DataFrame({coluna: [""] * n for coluna in CABECALHO_CADASTRO})
+    cadastro["REGISTRO_OPERADORA"] = registros.astype(str)
+    cadastro["CNPJ"] = gerar_cnpjs(rng, n)
+    cadastro["Razao_Social"] = [f"OPERADORA SINTÉTICA {r} SAÚDE LTDA" for r in registros]
+    cadastro["Modalidade"] = rng.choice(MODALIDADES, n)
+    cadastro["Cidade"] = "São Paulo"
+    cadastro["UF"] = rng.choice(UFS, n, p=np.linspace(1, 3, len(UFS)) / np.linspace(1, 3, len(UFS)).sum())
+    cadastro["Regiao_de_Comercializacao"] = rng.integers(1, 7, n).astype(str)
+    cadastro["Data_Registro_ANS"] = "2015-05-19"
+    with open(caminho, "w", encoding="utf-8", newline="") as f:
+        f.write(";".join(CABECALHO_CADASTRO) + "\n")
+        for linha in cadastro.itertuples(index=False):
+            f.write(";".join(f'"{v}"' if v else "" for v in linha) + "\n")
+    return cadastro
+
+def gerar_trimestre(caminho, ano, tri, linhas, registros, pesos, rng):
+    nome = f"{tri}T{ano}.csv"
+    sem_cadastro = np.arange(900000, 900000 + max(1, len(registros) // 50))
+    with zipfile.ZipFile(caminho, "w", zipfile.ZIP_DEFLATED) as z, z.open(nome, "w") as bruto, \
+            io.TextIOWrapper(bruto, encoding="latin1", newline="") as f:
+        for inicio in range(0, linhas, BLOCO):
+            n = min(BLOCO, linhas - inicio)
+            reg = rng.choice(registros, n, p=pesos)
+            orfaos = rng.random(n) < FRACAO_SEM_CADASTRO
+            reg[orfaos] = rng.choice(sem_cadastro, orfaos.sum())
+            contas = rng.integers(len(CONTAS), size=n)
+            inicial = np.round(rng.lognormal(11, 2.5, n), 2)
+            inicial[rng.random(n) < FRACAO_ZERADA] = 0
+            bloco = pd.DataFrame({
+                "DATA": f"{ano}-{3 * tri - 2:02d}-01",
+                "REG_ANS": reg.astype(str),
+                "CD_CONTA_CONTABIL": np.array([c for c, _ in CONTAS])[contas],
+                "DESCRICAO": np.array([d for _, d in CONTAS])[contas],
+                "VL_SALDO_INICIAL": inicial,
+                "VL_SALDO_FINAL": np.round(inicial * rng.uniform(0.8, 1.3, n), 2),
+            }, columns=CABECALHO_DEMONSTRACAO)
+            bloco.to_csv(f, sep=";", index=False, header=(inicio == 0), decimal=",", float_format="%.2f",
+                         quoting=csv.QUOTE_ALL, lineterminator="\n")
+    return nome
+
+def gerar(destino, escala=1.0, trimestres=3, operadoras=OPERADORAS_BASE, semente=42):
+    rng = np.random.default_rng(semente)
+    os.makedirs(destino, exist_ok=True)
+    registros = np.sort(rng.choice(np.arange(300000, 800000), operadoras, replace=False))
+    gerar_cadastro(os.path.join(destino, "cadastro_operadoras.csv"), registros, rng)
+
+    pesos = 1 / np.arange(1, operadoras + 1) ** 0.8
+    pesos = rng.permutation(pesos / pesos.sum())
+    por_trimestre = int(np.ceil(LINHAS_BASE * escala / trimestres))
+
+    arquivos = []
+    for ano, tri in periodos(trimestres):
+        pasta = os.path.join(destino, "site", str(ano))
+        os.makedirs(pasta, exist_ok=True)
+        caminho = os.path.join(pasta, f"{tri}T{ano}.zip")
+        gerar_trimestre(caminho, ano, tri, por_trimestre, registros, pesos, rng)
+        arquivos.append(caminho)
+
+    return {
+        'destino': destino,
+        'escala': escala,
+        'trimestres': trimestres,
+        'operadoras': operadoras,
+        'linhas': por_trimestre * trimestres,
+        'arquivos': arquivos,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gera ZIPs trimestrais e cadastro sintéticos no layout da ANS")
+    parser.add_argument("destino", help="Diretório de saída (site/ANO/TTANO.zip e cadastro_operadoras.csv)")
+    parser.add_argument("--escala", type=float, default=1.0, help=f"Múltiplo das ~{LINHAS_BASE} linhas da amostra real")
+    parser.add_argument("--trimestres", type=int, default=3, help="Quantidade de trimestres, a partir de 3T2025 para trás")
+    parser.add_argument("--operadoras", type=int, default=OPERADORAS_BASE)
+    parser.add_argument("--semente", type=int, default=42)
+    args = parser.parse_args()
+    resumo = gerar(args.destino, args.escala, args.trimestres, args.operadoras, args.semente)
+    print(f"{resumo['linhas']} linhas em {len(resumo['arquivos'])} trimestres geradas em {resumo['destino']}")
@@ -0,0 +1,44 @@
+import os
+import zipfile
+
+import pandas as pd
+
+import bench_pipeline
+import comparar
+import gerar_dados
+
+
+def test_gerar_dados_produz_layout_lido_pelo_pipeline(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    resumo = gerar_dados.gerar(str(tmp_path), escala=0.02, trimestres=5, operadoras=40)
+
+    assert [os.path.relpath(a, tmp_path) for a in resumo['arquivos']] == [
+        os.path.join("site", "2025", "3T2025.zip"), os.path.join("site", "2025", "2T2025.zip"),
+        os.path.join("site", "2025", "1T2025.zip"), os.path.join("site", "2024", "4T2024.zip"),
+        os.path.join("site", "2024", "3T2024.zip"),
+    ]
+    with zipfile.ZipFile(resumo['arquivos'][0]) as z:
+        assert z.namelist() == ["3T2025.csv"]
+        assert z.read("3T2025.csv").startswith(b'"DATA";"REG_ANS";"CD_CONTA_CONTABIL";"DESCRICAO";"VL_SALDO_INICIAL"')
+
+    consolidacao = bench_pipeline.importar(bench_pipeline.CONSOLIDACAO_DIR, "main.py", "consolidacao")
+    with zipfile.ZipFile(resumo['arquivos'][-1]) as z:
+        df = consolidacao.process_file("3T2024.csv", "http://bench/2024/3T2024.zip", zip_ref=z)
+    assert 0.9 * resumo['linhas'] / 5 < len(df) <= resumo['linhas'] / 5
+    assert set(df['Ano']) == {2024} and set(df['Trimestre']) == {3}
+
+    validacao = bench_pipeline.importar(bench_pipeline.VALIDACAO_DIR, "validacao.py", "validacao")
+    cadastro = pd.read_csv(tmp_path / "cadastro_operadoras.csv", sep=';', dtype=str)
+    assert len(cadastro) == 40
+    assert validacao.validar_cnpj_lote(cadastro['CNPJ']).all()
+    assert df['CNPJ'].astype(str).isin(cadastro['REGISTRO_OPERADORA']).mean() > 0.9
+
+
+def test_comparar_aponta_regressoes_acima_da_tolerancia():
+    base = {'tipo': 'api', 'resultados': {'GET /a': {'p95_ms': 10.0}, 'GET /b': {'p95_ms': 10.0}}}
+    novo = {'tipo': 'api', 'resultados': {'GET /a': {'p95_ms': 10.5}, 'GET /b': {'p95_ms': 13.0}}}
+
+    metrica, linhas = comparar.comparar(base, novo, tolerancia=0.10)
+
+    assert metrica == 'p95_ms'
+    assert [(l['nome'], l['regressao']) for l in linhas] == [('GET /a', False), ('GET /b', True)]